@@ -1,7 +1,7 @@
 # SymbolGeneration/Agent/baseline.py
 from __future__ import annotations
 from pathlib import Path
-from SymbolGeneration.Agent.agents.generator_agent import run_generator
+from SymbolGeneration.Agent.agents.generator_agent import run_generator, sample_index
 
 BASELINE_DIR = Path(__file__).resolve().parent / "outputs" / "baseline"
 BASELINE_DIR.mkdir(parents=True, exist_ok=True)
@@ -24,7 +24,7 @@ def run_baseline(user_text: str):
     if not paths:
         raise RuntimeError("Baseline generation failed")
     # 拷贝/重命名到 baseline 专用目录，方便后续统计
-    src = Path(paths[0])
+    src = Path(min(paths, key=sample_index))   # 按样本序号取第一张，而不是最先返回的那张
     dst = BASELINE_DIR / src.name
     if src != dst:
         dst.write_bytes(src.read_bytes())
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# SymbolGeneration/Agent/agents/clients.py
+"""
+进程内共享的网络客户端（首次使用时才创建）：
+  - get_client():  OpenAI 客户端，底层 httpx 连接池 keep-alive；装了 h2 时走 HTTP/2
+  - get_session(): requests.Session，给参考图下载等同步调用复用连接
+  - get_async_client() / get_async_http(): 协程版（AsyncOpenAI / httpx.AsyncClient），
+    连接池绑定事件循环，因此每个 loop 各一份；loop 结束前用 aclose_async_clients() 关闭
+  - run_sync(): 同步入口把协程交给进程内常驻的后台事件循环执行，多次调用共用同一套异步连接池
+各 agent 不再在 import 时各自 new 一个 OpenAI(...)，调用也不必每次重新 TLS 握手。
+"""
+from __future__ import annotations
+import asyncio, atexit, contextvars, os, threading, weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Awaitable, Dict, Optional, TypeVar
+
+from ..config import OPENAI_API_KEY, CLIENTS
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+    from openai import AsyncOpenAI, OpenAI
+
+T = TypeVar("T")
+
+_client: Optional["OpenAI"] = None
+_session: Optional["requests.Session"] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+_bg_loop: Optional[asyncio.AbstractEventLoop] = None
+_bg_thread: Optional[threading.Thread] = None
+_bg_pid: Optional[int] = None
+
+
+def _http2_available() -> bool:
+    if not CLIENTS.get("http2"):
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _httpx_options() -> Dict[str, Any]:
+    import httpx
+    return dict(
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=CLIENTS["max_connections"],
+            max_keepalive_connections=CLIENTS["max_keepalive"],
+            keepalive_expiry=CLIENTS["keepalive_expiry"],
+        ),
+        timeout=httpx.Timeout(CLIENTS["timeout"], connect=CLIENTS["connect_timeout"]),
+    )
+
+
+def get_client() -> "OpenAI":
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import httpx
+                from openai import OpenAI
+                _client = OpenAI(api_key=OPENAI_API_KEY, http_client=httpx.Client(**_httpx_options()),
+                                 max_retries=CLIENTS["max_retries"])
+    return _client
+
+
+def get_session() -> "requests.Session":
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=CLIENTS["session_pools"],
+                                      pool_maxsize=CLIENTS["session_pool_size"])
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                _session = s
+    return _session
+
+
+def _loop_clients() -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        return _async_clients.setdefault(loop, {})
+
+
+def get_async_client() -> "AsyncOpenAI":
+    """当前事件循环上的 AsyncOpenAI（须在协程内调用）"""
+    clients = _loop_clients()
+    if "openai" not in clients:
+        import httpx
+        from openai import AsyncOpenAI
+        clients["openai"] = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=httpx.AsyncClient(**_httpx_options()),
+                                        max_retries=CLIENTS["max_retries"])
+    return clients["openai"]
+
+
+def get_async_http() -> "httpx.AsyncClient":
+    """当前事件循环上的 httpx.AsyncClient，给 Grounder 检索 / 图片下载（须在协程内调用）"""
+    clients = _loop_clients()
+    if "http" not in clients:
+        import httpx
+        clients["http"] = httpx.AsyncClient(follow_redirects=True, **_httpx_options())
+    return clients["http"]
+
+
+async def aclose_async_clients():
+    """关闭当前事件循环上创建的异步客户端"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.pop(loop, None) or {}
+    for c in clients.values():
+        try:
+            await (c.aclose() if hasattr(c, "aclose") else c.close())
+        except Exception:
+            pass
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """run_sync 用的常驻事件循环（守护线程）；fork 出的子进程里重新创建"""
+    global _bg_loop, _bg_thread, _bg_pid
+    with _lock:
+        if _bg_loop is None or _bg_pid != os.getpid() or not _bg_thread.is_alive():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="agent-sync-loop", daemon=True)
+            thread.start()
+            _bg_loop, _bg_thread, _bg_pid = loop, thread, os.getpid()
+    return _bg_loop
+
+
+def _shutdown_background_loop():
+    loop = _bg_loop
+    if loop is None or _bg_pid != os.getpid() or not loop.is_running():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(aclose_async_clients(), loop).result(timeout=5)
+    except Exception:
+        pass
+    loop.call_soon_threadsafe(loop.stop)
+
+
+atexit.register(_shutdown_background_loop)
+
+
+def _run_in_new_loop(coro: Awaitable[T]) -> T:
+    """在临时线程里用一次性事件循环执行，结束时关闭本次创建的异步客户端"""
+    async def _main():
+        try:
+            return await coro
+        finally:
+            await aclose_async_clients()
+    ctx = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        return ex.submit(ctx.run, asyncio.run, _main()).result()
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """
+    同步执行协程（同步包装函数用）：提交到后台常驻事件循环并阻塞等待结果，
+    连接池和 keep-alive 连接在多次调用间复用；调用方的 contextvar（限流优先级、tracing 工单）随之带过去。
+    调用方线程里有运行中的 loop 也能用（会阻塞该线程）；若调用方本身就在后台 loop 上，
+    直接等会死锁，退回到临时线程里执行。
+    """
+    loop = _background_loop()
+    if threading.current_thread() is _bg_thread:
+        return _run_in_new_loop(coro)
+    fut = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return fut.result()
+    except BaseException:
+        # Ctrl-C 等：别让协程在后台继续跑
+        fut.cancel()
+        raise
@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 # SymbolGeneration/Agent/agents/designer_agent.py
-from openai import OpenAI
-from ..config import MODELS, OPENAI_API_KEY
+from ..config import MODELS
 from ..utils import log, save_json, extract_json
+from .clients import get_async_client, get_client
+from .llm_cache import acached_chat, cached_chat
 import json
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 STYLE_SCHEMA_HINT = """
 Output ONLY a JSON object. Include fields like:
@@ -60,9 +60,9 @@ def _sanitize_style_json(style_str: str, structure_spec) -> str:
     except Exception:
         return style_str
 
-def run_designer(landmark_json: str, schema: str, structure_spec=None) -> str:
+def _design_request(landmark_json: str, schema: str, structure_spec=None) -> dict:
     spec_text = json.dumps(structure_spec, ensure_ascii=False) if structure_spec else "{}"
-    resp = client.chat.completions.create(
+    return dict(
         model=MODELS["LLM_MODEL"],
         temperature=0.0,
         response_format={"type": "json_object"},
@@ -80,15 +80,10 @@ def run_designer(landmark_json: str, schema: str, structure_spec=None) -> str:
              )}
         ]
     )
-    content = resp.choices[0].message.content
-    log("SymbolDesigner_raw", content)
-    content = _sanitize_style_json(content, structure_spec)
-    save_json("SymbolDesigner_json", extract_json(content) or {})
-    return content
 
-def refine_designer(prev_style_json: str, review_data: dict, structure_spec=None) -> str:
+def _refine_request(prev_style_json: str, review_data: dict, structure_spec=None) -> dict:
     spec_text = json.dumps(structure_spec, ensure_ascii=False) if structure_spec else "{}"
-    resp = client.chat.completions.create(
+    return dict(
         model=MODELS["LLM_MODEL"],
         temperature=0.0,
         response_format={"type": "json_object"},
@@ -102,8 +97,25 @@ def refine_designer(prev_style_json: str, review_data: dict, structure_spec=None
             {"role": "user", "content": STYLE_SCHEMA_HINT}
         ]
     )
-    content = resp.choices[0].message.content
-    log("SymbolDesigner_refined_raw", content)
+
+def _finish(content: str, structure_spec, tag: str) -> str:
+    log(f"{tag}_raw", content)
     content = _sanitize_style_json(content, structure_spec)
-    save_json("SymbolDesigner_refined_json", extract_json(content) or {})
+    save_json(f"{tag}_json", extract_json(content) or {})
     return content
+
+def run_designer(landmark_json: str, schema: str, structure_spec=None) -> str:
+    content = cached_chat(get_client(), **_design_request(landmark_json, schema, structure_spec))
+    return _finish(content, structure_spec, "SymbolDesigner")
+
+def refine_designer(prev_style_json: str, review_data: dict, structure_spec=None) -> str:
+    content = cached_chat(get_client(), **_refine_request(prev_style_json, review_data, structure_spec))
+    return _finish(content, structure_spec, "SymbolDesigner_refined")
+
+async def arun_designer(landmark_json: str, schema: str, structure_spec=None) -> str:
+    content = await acached_chat(get_async_client(), **_design_request(landmark_json, schema, structure_spec))
+    return _finish(content, structure_spec, "SymbolDesigner")
+
+async def arefine_designer(prev_style_json: str, review_data: dict, structure_spec=None) -> str:
+    content = await acached_chat(get_async_client(), **_refine_request(prev_style_json, review_data, structure_spec))
+    return _finish(content, structure_spec, "SymbolDesigner_refined")
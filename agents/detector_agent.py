@@ -1,19 +1,19 @@
 # -*- coding: utf-8 -*-
 # agents/detector_agent.py
 from __future__ import annotations
-import base64, mimetypes, time
+import asyncio
+import time
 import json
 from pathlib import Path
 from typing import Dict, Any, Optional
 
-import cv2
-from openai import OpenAI
-
-from ..config import MODELS, OPENAI_API_KEY
+from ..config import MODELS
 # [修改点 1] 增加导入 extract_json 用于解析模型返回的 JSON
 from ..utils import log, extract_json
+from .clients import get_async_client, get_client
+from .llm_cache import acached_chat, cached_chat
+from .image_payload import photo_data_url
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 # [修改点 2] 这是一个全新的、强化的 System Prompt
 # 目的：强迫视觉模型忽略“情感/意义”，专注于“几何/姿态/构图”
@@ -49,28 +49,13 @@ Your goal is NOT to describe the "meaning" or "emotion" of the image, but to ext
 
 
 def _to_data_url(image_path: str | Path) -> str:
-    """读取本地图像并转为 data URL（自动识别 jpg/png 等 MIME）"""
-    p = Path(image_path)
-    img_bytes = p.read_bytes()
-    mime = mimetypes.guess_type(p.name)[0] or "image/png"
-    b64 = base64.b64encode(img_bytes).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
-
-
-# [修改点 3] 修改了返回类型提示，增强了处理逻辑
-def run_detector(image_path: str, schema: str = "") -> Dict[str, Any]:
-    """
-    识别地标对象（把图片作为 data URL 发送给多模态模型）
-    并提取关键的几何与姿态特征。
-    """
-    p = Path(image_path)
-    if not p.exists():
-        raise FileNotFoundError(f"[LandmarkDetector] 图像不存在：{p}")
+    """读取本地图像并转为 data URL（按 IMAGE_PAYLOAD["photo"] 缩放/重编码，结果有缓存）"""
+    return photo_data_url(image_path)
 
-    data_url = _to_data_url(p)
 
+def _request(data_url: str) -> Dict[str, Any]:
     # [修改点 4] 使用新的 SYSTEM_PROMPT 和 response_format
-    resp = client.chat.completions.create(
+    return dict(
         model=MODELS["VISION_MODEL"],
         response_format={"type": "json_object"},
         messages=[
@@ -81,9 +66,17 @@ def run_detector(image_path: str, schema: str = "") -> Dict[str, Any]:
             ]}
         ]
     )
-    content = resp.choices[0].message.content
-    log("LandmarkDetector", content)
 
+
+def _check_path(image_path: str) -> Path:
+    p = Path(image_path)
+    if not p.exists():
+        raise FileNotFoundError(f"[LandmarkDetector] 图像不存在：{p}")
+    return p
+
+
+def _parse(content: str) -> Dict[str, Any]:
+    log("LandmarkDetector", content)
     # [修改点 5] 解析并重组数据
     # 将 "posture" 和 "composition" 这种关键信息提取出来，
     # 强制插入到 shape_features 的最前面，确保 PromptPlanner 能看到。
@@ -124,8 +117,25 @@ def run_detector(image_path: str, schema: str = "") -> Dict[str, Any]:
         return {}
 
 
+# [修改点 3] 修改了返回类型提示，增强了处理逻辑
+def run_detector(image_path: str, schema: str = "") -> Dict[str, Any]:
+    """
+    识别地标对象（把图片作为 data URL 发送给多模态模型）
+    并提取关键的几何与姿态特征。
+    """
+    data_url = _to_data_url(_check_path(image_path))
+    return _parse(cached_chat(get_client(), **_request(data_url)))
+
+
+async def arun_detector(image_path: str, schema: str = "") -> Dict[str, Any]:
+    """run_detector 的协程版；图片缩放编码在线程里做"""
+    data_url = await asyncio.to_thread(_to_data_url, _check_path(image_path))
+    return _parse(await acached_chat(get_async_client(), **_request(data_url)))
+
+
 def run_extractor(image_path: str) -> str:
     """提取地标轮廓（Canny + 细化），返回保存的轮廓图路径。"""
+    import cv2   # 延迟导入：只做识别的调用不加载 OpenCV
     p = Path(image_path)
     if not p.exists():
         raise FileNotFoundError(f"[OutlineExtractor] 图像不存在：{p}")
@@ -1,8 +1,9 @@
-import cv2, os
+import os
 from ..utils import log
 
 def run_extractor(image_path):
     """提取地标轮廓（OpenCV 边缘检测）"""
+    import cv2   # 延迟导入
     img = cv2.imread(image_path)
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     edges = cv2.Canny(gray, 100, 200)
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+# SymbolGeneration/Agent/agents/gazetteer.py
+"""
+本地地名库（SQLite）：地标名 / 别名 / 位置 / entity_type / 结构提示 / 参考图路径。
+Grounder 先查这里：有结构提示的条目直接出 spec（不调模型、不上网）；只有摘要的条目，
+带参考图和百科信息栏时拿摘要代替网络检索，否则仍走在线检索。
+
+建库来源（优先级 manual > baike > wiki，低优先级的数据只补别名、不覆盖）：
+  - 检索缓存（lookup_cache）里查到过的百度百科 / 维基摘要，只收查询词是确认过的实体名 /
+    search_focus 的条目（用户原句拆出来的片段不收）；维基搜索词记为别名
+  - 手工条目：JSON 数组或 JSONL，每条 {name, aliases, location, entity_type, structure, constraints, summary, reference_image}
+来自检索缓存的条目记 fetched_at，超过 GROUNDER_CACHE["ttl_hit"] 就当作未命中；手工条目不过期。
+
+别名表整个加载进内存，查询要求整个查询词（规范化后）等于名称或某个别名，不做子串匹配。
+用法：
+    python -m Agent.agents.gazetteer build --manual landmarks.json
+    python -m Agent.agents.gazetteer lookup 兰州中山桥
+"""
+from __future__ import annotations
+import argparse, json, sqlite3, sys, threading, time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from ..config import GAZETTEER, GROUNDER_CACHE
+from ..utils import OUTPUT_DIR
+from .lookup_cache import cached_hits, entity_names, normalize_query
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS landmarks (
+    id              INTEGER PRIMARY KEY,
+    key             TEXT NOT NULL UNIQUE,
+    name            TEXT NOT NULL,
+    location        TEXT,
+    entity_type     TEXT,
+    structure       TEXT,
+    constraints     TEXT,
+    summary         TEXT,
+    reference_image TEXT,
+    source          TEXT NOT NULL,
+    fetched_at      REAL,
+    updated_at      REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias       TEXT PRIMARY KEY,
+    landmark_id INTEGER NOT NULL REFERENCES landmarks(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_aliases_landmark ON aliases(landmark_id);
+"""
+
+_SOURCE_RANK = {"manual": 0, "baike": 1, "wiki": 2}
+_JSON_FIELDS = ("structure", "constraints")
+
+# 由名称猜 entity_type（与 SYSTEM_TO_SPEC 的取值一致）
+_TYPE_HINTS = (
+    ("bridge", ("桥", "bridge")),
+    ("tower", ("塔", "tower", "pagoda")),
+    ("statue", ("像", "雕塑", "statue", "sculpture", "monument")),
+    ("building", ("楼", "阁", "寺", "殿", "宫", "馆", "building", "temple", "palace", "hall")),
+)
+_LOCATION_KEYS = ("地理位置", "所在地", "位置", "所属地区")
+
+
+def _guess_type(name: str) -> str:
+    low = name.lower()
+    for t, words in _TYPE_HINTS:
+        if any(w in low for w in words):
+            return t
+    return "other"
+
+
+def _baike_location(summary: str) -> Optional[str]:
+    for line in summary.splitlines():
+        k, sep, v = line.partition(":")
+        if sep and k.strip() in _LOCATION_KEYS and v.strip():
+            return v.strip()
+    return None
+
+
+class Gazetteer:
+    """线程安全；别名索引首次查询时加载进内存，add() 时同步更新"""
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        # 旧库没有 fetched_at 列
+        if "fetched_at" not in {r["name"] for r in self._conn.execute("PRAGMA table_info(landmarks)")}:
+            self._conn.execute("ALTER TABLE landmarks ADD COLUMN fetched_at REAL")
+        self._conn.commit()
+        self._aliases: Optional[Dict[str, int]] = None
+
+    # ---- 写入 ----
+    def add(self, name: str, aliases: Iterable[str] = (), source: str = "manual",
+            fetched_at: Optional[float] = None, **fields: Any) -> int:
+        """
+        新增或合并一个地标；fields 取 location / entity_type / structure / constraints / summary / reference_image。
+        已有更高优先级来源的条目时只补别名；同级或更低时用非空字段覆盖。
+        fetched_at：检索结果的抓取时间（手工条目为 None，不过期）。
+        """
+        key = normalize_query(name)
+        values = {k: fields.get(k) for k in ("location", "entity_type", "structure", "constraints",
+                                             "summary", "reference_image")}
+        for k in _JSON_FIELDS:
+            if values[k] is not None:
+                values[k] = json.dumps(values[k], ensure_ascii=False)
+        with self._lock:
+            row = self._conn.execute("SELECT id, source FROM landmarks WHERE key = ?", (key,)).fetchone()
+            if row is not None and _SOURCE_RANK.get(source, 9) > _SOURCE_RANK.get(row["source"], 9):
+                lid = row["id"]
+            else:
+                self._conn.execute(
+                    "INSERT INTO landmarks (key, name, location, entity_type, structure, constraints, summary, "
+                    "reference_image, source, fetched_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET name = excluded.name, "
+                    + ", ".join(f"{k} = COALESCE(excluded.{k}, {k})" for k in values)
+                    + ", source = excluded.source, fetched_at = excluded.fetched_at, updated_at = excluded.updated_at",
+                    (key, name, *values.values(), source, fetched_at, time.time()))
+                lid = self._conn.execute("SELECT id FROM landmarks WHERE key = ?", (key,)).fetchone()["id"]
+            # 自己的名字总是指向自己；其余别名先到先得
+            self._conn.execute("INSERT OR REPLACE INTO aliases (alias, landmark_id) VALUES (?, ?)", (key, lid))
+            for a in aliases:
+                a = normalize_query(a)
+                if len(a) >= 2:
+                    self._conn.execute("INSERT OR IGNORE INTO aliases (alias, landmark_id) VALUES (?, ?)", (a, lid))
+            self._conn.commit()
+            self._aliases = None
+        return lid
+
+    def add_alias(self, alias: str, name: str) -> bool:
+        """给已有地标补一个别名；地标不存在返回 False"""
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM landmarks WHERE key = ?", (normalize_query(name),)).fetchone()
+            a = normalize_query(alias)
+            if row is None or len(a) < 2:
+                return False
+            self._conn.execute("INSERT OR IGNORE INTO aliases (alias, landmark_id) VALUES (?, ?)", (a, row["id"]))
+            self._conn.commit()
+            self._aliases = None
+        return True
+
+    # ---- 查询 ----
+    def _alias_index(self) -> Dict[str, int]:
+        with self._lock:
+            if self._aliases is None:
+                self._aliases = dict(self._conn.execute("SELECT alias, landmark_id FROM aliases").fetchall())
+            return self._aliases
+
+    def match(self, text: str) -> Optional[int]:
+        """规范化后整体等于名称或别名才算命中；"兰州中山桥附近的餐厅" 之类含地名的句子不算"""
+        return self._alias_index().get(normalize_query(text))
+
+    def get(self, landmark_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM landmarks WHERE id = ?", (landmark_id,)).fetchone()
+            if row is None:
+                return None
+            aliases = [r[0] for r in self._conn.execute(
+                "SELECT alias FROM aliases WHERE landmark_id = ? AND alias != ?", (landmark_id, row["key"]))]
+        entry = {k: row[k] for k in row.keys() if k not in ("id", "key", "updated_at")}
+        for k in _JSON_FIELDS:
+            entry[k] = json.loads(entry[k]) if entry[k] else None
+        entry["aliases"] = aliases
+        return entry
+
+    def lookup(self, text: str) -> Optional[Dict[str, Any]]:
+        lid = self.match(text) if text else None
+        return self.get(lid) if lid is not None else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM landmarks").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_source = dict(self._conn.execute("SELECT source, COUNT(*) FROM landmarks GROUP BY source").fetchall())
+            n_alias = self._conn.execute("SELECT COUNT(*) FROM aliases").fetchone()[0]
+        return {"landmarks": sum(by_source.values()), "aliases": n_alias, "by_source": by_source, "path": str(self.path)}
+
+
+# ----------------- 建库 -----------------
+def build_from_cache(gaz: Gazetteer) -> int:
+    """
+    把检索缓存里查到过的百科 / 维基摘要导入；返回导入的地标数。
+    只收查询词是确认过的实体名的条目：Grounder 会把用户原句拆成片段逐个检索，
+    片段（"艺术化风格"之类）查到的百科页不是要找的地标。
+    """
+    names = entity_names()
+    n = 0
+    for query, hit, fetched_at in cached_hits("baike"):
+        summary = (hit or {}).get("summary")
+        if summary and query in names:
+            gaz.add(query, source="baike", fetched_at=fetched_at or 0.0, summary=summary,
+                    reference_image=hit.get("image"), location=_baike_location(summary),
+                    entity_type=_guess_type(query))
+            n += 1
+    for lang in ("zh", "en"):
+        # 维基搜索词 → 标题：实体名搜到的标题可收，搜索词正好是别名
+        titles: Dict[str, List[str]] = {}
+        for query, title, _ in cached_hits(f"wiki_search:{lang}"):
+            if query in names and title:
+                titles.setdefault(normalize_query(title), []).append(query)
+        for title_key, data, fetched_at in cached_hits(f"wiki_summary:{lang}"):
+            if not data or (title_key not in titles and title_key not in names):
+                continue
+            title = data.get("title") or title_key
+            image = (data.get("thumbnail") or {}).get("source") or (data.get("originalimage") or {}).get("source")
+            gaz.add(title, titles.get(title_key, ()), source="wiki", fetched_at=fetched_at or 0.0,
+                    summary=data.get("extract"), reference_image=image, entity_type=_guess_type(title))
+            n += 1
+    return n
+
+
+def load_manual(gaz: Gazetteer, path: Union[str, Path]) -> int:
+    """JSON 数组或 JSONL；reference_image 的相对路径按清单文件所在目录解析"""
+    path = Path(path)
+    text = path.read_text(encoding="utf-8").strip()
+    items = json.loads(text) if text.startswith("[") else [json.loads(ln) for ln in text.splitlines() if ln.strip()]
+    for item in items:
+        fields = dict(item)
+        name = fields.pop("name")
+        aliases = fields.pop("aliases", None) or []
+        ref = fields.get("reference_image")
+        if ref and "://" not in ref and not Path(ref).is_absolute():
+            fields["reference_image"] = str((path.parent / ref).resolve())
+        gaz.add(name, aliases, source="manual", **fields)
+    return len(items)
+
+
+# ----------------- 查询入口 -----------------
+_gaz: Optional[Gazetteer] = None
+_gaz_lock = threading.Lock()
+
+
+def _path() -> Path:
+    return Path(GAZETTEER.get("path") or OUTPUT_DIR / "cache" / "gazetteer.sqlite")
+
+
+def get_gazetteer(create: bool = False) -> Optional[Gazetteer]:
+    """库文件不存在时返回 None（查询路径不建空库），create=True 时新建"""
+    global _gaz
+    if _gaz is None:
+        with _gaz_lock:
+            if _gaz is None and (create or _path().exists()):
+                _gaz = Gazetteer(_path())
+    return _gaz
+
+
+def _expired(entry: Dict[str, Any]) -> bool:
+    """来自检索缓存的条目与缓存同一个 TTL；手工条目（fetched_at 为空）不过期"""
+    ttl = GROUNDER_CACHE.get("ttl_hit")
+    fetched_at = entry.get("fetched_at")
+    return ttl is not None and fetched_at is not None and time.time() - fetched_at > ttl
+
+
+def lookup(*texts: Optional[str]) -> Optional[Dict[str, Any]]:
+    """按顺序查，返回第一个命中且未过期的条目"""
+    if not GAZETTEER.get("enabled", True):
+        return None
+    gaz = get_gazetteer()
+    if gaz is None:
+        return None
+    for t in texts:
+        entry = gaz.lookup(t) if t else None
+        if entry is not None and not _expired(entry):
+            return entry
+    return None
+
+
+def has_basic_info(entry: Dict[str, Any]) -> bool:
+    """有位置，或摘要里带百科信息栏（"字段: 值" 行）"""
+    if entry.get("location"):
+        return True
+    return any(k.strip() and sep and v.strip() and len(k.strip()) <= 8
+               for k, sep, v in (ln.partition(": ") for ln in (entry.get("summary") or "").splitlines()))
+
+
+def entry_to_spec(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """有结构提示的条目直接转成 Grounder spec（同 SYSTEM_TO_SPEC 的 schema）"""
+    spec: Dict[str, Any] = {
+        "entity": {"name": entry["name"], "location": entry.get("location") or ""},
+        "entity_type": entry.get("entity_type") or "other",
+        "structure": dict(entry.get("structure") or {}),
+        "constraints": dict(entry.get("constraints") or {}),
+    }
+    spec["constraints"].setdefault("must", [])
+    spec["constraints"].setdefault("must_not", [])
+    if entry.get("reference_image"):
+        spec["reference_image_url"] = entry["reference_image"]
+    return spec
+
+
+def entry_snippet(entry: Dict[str, Any]) -> str:
+    """只有摘要的条目：拼成与网络检索同样格式的摘要片段"""
+    head = f"[Gazetteer] {entry['name']}"
+    if entry.get("location"):
+        head += f" ({entry['location']})"
+    return f"{head}\n{entry.get('summary') or ''}".strip()
+
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description="Grounder 本地地名库")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="从检索缓存和手工清单导入")
+    b.add_argument("--manual", action="append", default=[], metavar="FILE", help="手工条目（JSON / JSONL），可多次指定")
+    b.add_argument("--no-cache", action="store_true", help="不导入检索缓存")
+    q = sub.add_parser("lookup", help="查询")
+    q.add_argument("text")
+    sub.add_parser("stats")
+    args = ap.parse_args(argv)
+
+    gaz = get_gazetteer(create=args.cmd == "build")
+    if gaz is None:
+        print(f"⚠️ 地名库不存在: {_path()}")
+        return 1
+    if args.cmd == "build":
+        if not args.no_cache:
+            print(f"📥 检索缓存导入 {build_from_cache(gaz)} 条")
+        for f in args.manual:
+            print(f"📥 {f}: 导入 {load_manual(gaz, f)} 条")
+    elif args.cmd == "lookup":
+        t0 = time.perf_counter()
+        entry = gaz.lookup(args.text)
+        print(json.dumps(entry, ensure_ascii=False, indent=2) if entry else "(未命中)")
+        print(f"⏱ {(time.perf_counter() - t0) * 1000:.3f} ms")
+    print(f"📦 {gaz.stats()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,51 @@
 # -*- coding: utf-8 -*-
 # SymbolGeneration/Agent/agents/generator_agent.py
+import asyncio
 import base64
+import contextvars
+import os
+import threading
 import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Callable, Iterator, List, Optional, Tuple
 
-import requests
-from openai import OpenAI
-from ..config import MODELS, OPENAI_API_KEY, IMAGE_SIZE, CREATIVE_SAMPLES
+from ..config import MODELS, IMAGE_SIZE, CREATIVE_SAMPLES, GENERATION
+from ..core import tracing
 from ..utils import log
+from .clients import get_async_client, get_async_http, get_client, get_session
 from .prompt_planner import compile_prompt
-from PIL import Image
+from .rate_limiter import arate_limited, no_sdk_retry, rate_limited
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 SUPPORTED_SIZES = {"1024x1024", "1024x1536", "1536x1024", "auto"}
 
+OUT_DIR = (Path(__file__).resolve().parents[1] / "outputs")
+IMG_DIR = OUT_DIR / "images"
+
+
+class GenerationCancelled(Exception):
+    """所在批次已取消（提前达标），请求不再发出 / 结果不再落盘"""
+
+
+def _guarded(fn: Callable[[], Any], cancel: Optional[threading.Event]) -> Callable[[], Any]:
+    """在限流器排到号、真正发请求前再看一眼批次是否已取消"""
+    def call():
+        if cancel is not None and cancel.is_set():
+            raise GenerationCancelled()
+        return fn()
+    return call
+
+
+def _batch_stamp() -> str:
+    # 时间戳 + 短随机后缀：多个工单同一秒内并发生成也不会互相覆盖文件
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
 
 def _download_with_retry(url: str, out_path: Path, tries: int = 3, timeout: int = 20) -> bool:
     for _ in range(tries):
         try:
-            r = requests.get(url, timeout=timeout, stream=True)
+            r = get_session().get(url, timeout=timeout, stream=True)
             r.raise_for_status()
             out_path.write_bytes(r.content)
             return True
@@ -28,95 +54,327 @@ def _download_with_retry(url: str, out_path: Path, tries: int = 3, timeout: int
     return False
 
 
+async def _adownload_with_retry(url: str, out_path: Path, tries: int = 3, timeout: int = 20) -> bool:
+    for _ in range(tries):
+        try:
+            r = await get_async_http().get(url, timeout=timeout)
+            r.raise_for_status()
+            out_path.write_bytes(r.content)
+            return True
+        except Exception:
+            pass
+    return False
+
+
+def _prepare_candidate(i: int, ts: str, style_json: str, user_text: str, structure_spec) -> Tuple[str, Path]:
+    """编译第 i 个候选的提示词并落盘，返回 (prompt, 输出路径)"""
+    variation = f"Encourage variation #{i+1}: explore composition/texture diversity while preserving recognizability."
+    prompt = compile_prompt(
+        user_text=user_text,
+        style_json=style_json,
+        structure_spec=structure_spec,
+        variation_note=variation
+    )
+
+    # 记录提示词
+    (OUT_DIR / f"IconGenerator_prompt_{ts}_{i + 1}.txt").write_text(prompt, encoding="utf-8")
+    return prompt, IMG_DIR / f"candidate_{ts}_{i + 1}.png"
+
+
+def sample_index(path: str) -> int:
+    """candidate_{ts}_{n}.png → n（第几个候选，从 1 起）；并发生成按完成顺序返回，需要固定顺序时用它排序"""
+    return int(Path(path).stem.rsplit("_", 1)[1])
+
+
+def _edit_call(images):
+    # 兼容两种命名：edits / edit
+    return getattr(images, "edits", None) or getattr(images, "edit", None)
+
+
+def _edit_kwargs(prompt: str, size: str, base_image: str, mask_image: str, timeout: Optional[float]) -> dict:
+    # 以 (文件名, bytes) 上传：429 重排时可直接重发，同步/异步客户端通用
+    return dict(
+        model=MODELS["IMAGE_MODEL"],
+        image=(Path(base_image).name, Path(base_image).read_bytes()),
+        mask=(Path(mask_image).name, Path(mask_image).read_bytes()),
+        prompt=prompt,
+        size=size,
+        n=1,
+        timeout=timeout
+    )
+
+
+def _generate_kwargs(prompt: str, size: str, timeout: Optional[float]) -> dict:
+    return dict(model=MODELS["IMAGE_MODEL"], prompt=prompt, size=size, n=1, timeout=timeout)
+
+
+def _edit_span(base_image: str, mask_image: str):
+    return tracing.span(f"image.edit.{MODELS['IMAGE_MODEL']}", cat="image",
+                        bytes_out=os.path.getsize(base_image) + os.path.getsize(mask_image))
+
+
+def _generate_span(prompt: str):
+    return tracing.span(f"image.generate.{MODELS['IMAGE_MODEL']}", cat="image",
+                        bytes_out=len(prompt.encode("utf-8")))
+
+
+def _save_output(resp, out_path: Path) -> Tuple[Optional[str], Optional[str]]:
+    """优先 b64 直接落盘 → (路径, None)；只有 URL 时返回 (None, url) 由调用方下载"""
+    datum = getattr(resp, "data", [None])[0]
+    b64 = getattr(datum, "b64_json", None)
+    url = getattr(datum, "url", None)
+
+    if isinstance(b64, str) and b64:
+        out_path.write_bytes(base64.b64decode(b64))
+        print(f"🖼️ 已保存本地图片: {out_path}")
+        return str(out_path), None
+    if isinstance(url, str) and url:
+        return None, url
+    print("⚠️ 无可用图像数据")
+    return None, None
+
+
+def _downloaded(out_path: Path, ok: bool) -> Optional[str]:
+    if ok:
+        print(f"🖼️ 已保存本地图片(回退URL): {out_path}")
+        return str(out_path)
+    print("⚠️ URL 下载失败")
+    return None
+
+
+def _generate_one(i: int,
+                  ts: str,
+                  size: str,
+                  style_json: str,
+                  user_text: str,
+                  structure_spec,
+                  base_image: Optional[str],
+                  mask_image: Optional[str],
+                  timeout: Optional[float],
+                  cancel: Optional[threading.Event] = None) -> Optional[str]:
+    """生成第 i 个候选并落盘，返回本地路径；失败或批次已取消（cancel 被 set）返回 None。"""
+    if cancel is not None and cancel.is_set():
+        return None
+    prompt, out_path = _prepare_candidate(i, ts, style_json, user_text, structure_spec)
+    client = no_sdk_retry(get_client())
+    resp = None
+
+    # 1) 如可编辑且传入了底图+蒙版，先试编辑；失败则回退纯生成
+    edits_call = _edit_call(client.images)
+    if base_image and mask_image and edits_call:
+        try:
+            with _edit_span(base_image, mask_image):
+                kwargs = _edit_kwargs(prompt, size, base_image, mask_image, timeout)
+                resp = rate_limited(MODELS["IMAGE_MODEL"], _guarded(lambda: edits_call(**kwargs), cancel))
+        except GenerationCancelled:
+            return None
+        except Exception as e:
+            print(f"⚠️ images.edits 调用失败，将回退 generate：{e}")
+
+    # 2) 首次或回退：纯生成
+    if resp is None:
+        try:
+            with _generate_span(prompt):
+                resp = rate_limited(MODELS["IMAGE_MODEL"], _guarded(
+                    lambda: client.images.generate(**_generate_kwargs(prompt, size, timeout)), cancel))
+        except GenerationCancelled:
+            return None
+        except Exception as e:
+            print(f"⚠️ images.generate 失败：{e}")
+            return None
+
+    # 请求在途时批次被取消：结果丢弃，不再落盘 / 下载
+    if cancel is not None and cancel.is_set():
+        return None
+
+    # 3) 保存输出（优先 b64，其次 URL）
+    path, url = _save_output(resp, out_path)
+    if url:
+        path = _downloaded(out_path, _download_with_retry(url, out_path))
+    return path
+
+
+async def _agenerate_one(i: int,
+                         ts: str,
+                         size: str,
+                         style_json: str,
+                         user_text: str,
+                         structure_spec,
+                         base_image: Optional[str],
+                         mask_image: Optional[str],
+                         timeout: Optional[float]) -> Optional[str]:
+    """_generate_one 的协程版（AsyncOpenAI），流程相同"""
+    prompt, out_path = _prepare_candidate(i, ts, style_json, user_text, structure_spec)
+    client = no_sdk_retry(get_async_client())
+    resp = None
+
+    edits_call = _edit_call(client.images)
+    if base_image and mask_image and edits_call:
+        try:
+            with _edit_span(base_image, mask_image):
+                kwargs = _edit_kwargs(prompt, size, base_image, mask_image, timeout)
+                resp = await arate_limited(MODELS["IMAGE_MODEL"], lambda: edits_call(**kwargs))
+        except Exception as e:
+            print(f"⚠️ images.edits 调用失败，将回退 generate：{e}")
+
+    if resp is None:
+        try:
+            with _generate_span(prompt):
+                resp = await arate_limited(MODELS["IMAGE_MODEL"],
+                                           lambda: client.images.generate(**_generate_kwargs(prompt, size, timeout)))
+        except Exception as e:
+            print(f"⚠️ images.generate 失败：{e}")
+            return None
+
+    path, url = _save_output(resp, out_path)
+    if url:
+        path = _downloaded(out_path, await _adownload_with_retry(url, out_path))
+    return path
+
+
+def _batch_setup(timeout: Optional[float]) -> Tuple[str, int, Optional[float], str]:
+    """一轮生成的公共参数：(size, 样本数, 超时, 批次时间戳)，并确保输出目录存在"""
+    size = IMAGE_SIZE if IMAGE_SIZE in SUPPORTED_SIZES else "1024x1024"
+    n_samples = max(1, int(CREATIVE_SAMPLES))
+    timeout = timeout if timeout is not None else GENERATION["timeout"]
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    IMG_DIR.mkdir(parents=True, exist_ok=True)
+    return size, n_samples, timeout, _batch_stamp()
+
+
+class GenerationBatch:
+    """
+    一轮并发生成：futures 与样本序号一一对应，结果为本地路径或 None。
+    cancel()：排队中的请求直接取消；已在线程里的请求发出前 / 落盘前检查 cancelled，不再发请求、不写 PNG。
+    """
+    def __init__(self, pool: ThreadPoolExecutor, futures: List[Future], cancelled: threading.Event):
+        self.pool = pool
+        self.futures = futures
+        self.cancelled = cancelled
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def start_generation(outline_path: Optional[str],
+                     style_json: str,
+                     user_text: str = "",
+                     structure_spec=None,
+                     base_image: Optional[str] = None,
+                     mask_image: Optional[str] = None,
+                     max_in_flight: Optional[int] = None,
+                     timeout: Optional[float] = None) -> GenerationBatch:
+    """
+    CREATIVE_SAMPLES 个请求同时提交（最多 max_in_flight 个在途，默认 GENERATION["early_stop_in_flight"]），立即返回。
+    调用方自行 wait/as_completed，用完务必 cancel()。
+    """
+    size, n_samples, timeout, ts = _batch_setup(timeout)
+    max_in_flight = max(1, int(max_in_flight or GENERATION["early_stop_in_flight"]))
+
+    cancelled = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=min(max_in_flight, n_samples), thread_name_prefix="imagegen")
+    futures = [
+        pool.submit(contextvars.copy_context().run, _generate_one, i, ts, size, style_json, user_text,
+                    structure_spec, base_image, mask_image, timeout, cancelled)
+        for i in range(n_samples)
+    ]
+    return GenerationBatch(pool, futures, cancelled)
+
+
+def iter_generator(outline_path: Optional[str],
+                   style_json: str,
+                   user_text: str = "",
+                   structure_spec=None,
+                   base_image: Optional[str] = None,
+                   mask_image: Optional[str] = None,
+                   max_in_flight: Optional[int] = None,
+                   timeout: Optional[float] = None) -> Iterator[str]:
+    """
+    并发版生成器：按完成顺序逐个 yield 本地 PNG 路径。
+    调用方提前停止迭代（break / close()）时，尚未发出的请求取消，在途请求的结果不再落盘。
+    """
+    batch = start_generation(outline_path, style_json, user_text, structure_spec,
+                             base_image, mask_image, max_in_flight=max_in_flight, timeout=timeout)
+    try:
+        for fut in as_completed(batch.futures):
+            path = fut.result()
+            if path:
+                yield path
+    finally:
+        batch.cancel()
+
+
 def run_generator(outline_path: Optional[str],
                   style_json: str,
                   user_text: str = "",
                   structure_spec=None,
                   base_image: Optional[str] = None,   # ← 新增，可选
-                  mask_image: Optional[str] = None    # ← 新增，可选
+                  mask_image: Optional[str] = None,   # ← 新增，可选
+                  parallel: bool = True,
+                  max_in_flight: Optional[int] = None,
+                  timeout: Optional[float] = None
                   ) -> List[str]:
     """
     生成器（兼容原有调用）。
     - 若传入 base_image+mask_image，则优先尝试 images.edits（蒙版编辑）；
       否则回退 images.generate（纯文本）。
+    - parallel=True（默认）：各候选并发请求，返回顺序为完成顺序；
+      parallel=False：逐个请求（旧行为）。
     - 输出：本地 PNG 路径列表。
     """
-    size = IMAGE_SIZE if IMAGE_SIZE in SUPPORTED_SIZES else "1024x1024"
-    n_samples = max(1, int(CREATIVE_SAMPLES))
+    if parallel:
+        # 要全部结果、不会提前停，在途上限用 max_in_flight
+        saved = list(iter_generator(outline_path, style_json, user_text, structure_spec, base_image, mask_image,
+                                    max_in_flight=max_in_flight or GENERATION["max_in_flight"], timeout=timeout))
+    else:
+        size, n_samples, timeout, ts = _batch_setup(timeout)
+        saved = []
+        for i in range(n_samples):
+            path = _generate_one(i, ts, size, style_json, user_text, structure_spec,
+                                 base_image, mask_image, timeout)
+            if path:
+                saved.append(path)
+            time.sleep(0.15)
 
-    OUT_DIR = (Path(__file__).resolve().parents[1] / "outputs")
-    IMG_DIR = OUT_DIR / "images"
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
-    IMG_DIR.mkdir(parents=True, exist_ok=True)
+    return _finish(saved)
+
+
+async def arun_generator(outline_path: Optional[str],
+                         style_json: str,
+                         user_text: str = "",
+                         structure_spec=None,
+                         base_image: Optional[str] = None,
+                         mask_image: Optional[str] = None,
+                         max_in_flight: Optional[int] = None,
+                         timeout: Optional[float] = None
+                         ) -> List[str]:
+    """
+    run_generator 的协程版：各候选在当前事件循环上并发请求（最多 max_in_flight 个在途），
+    返回顺序为完成顺序；被取消时一并取消尚未完成的请求。
+    """
+    size, n_samples, timeout, ts = _batch_setup(timeout)
+    sem = asyncio.Semaphore(max(1, int(max_in_flight or GENERATION["max_in_flight"])))
+
+    async def _one(i: int) -> Optional[str]:
+        async with sem:
+            return await _agenerate_one(i, ts, size, style_json, user_text, structure_spec,
+                                        base_image, mask_image, timeout)
+
+    tasks = [asyncio.ensure_future(_one(i)) for i in range(n_samples)]
+    saved = []
+    try:
+        for fut in asyncio.as_completed(tasks):
+            path = await fut
+            if path:
+                saved.append(path)
+    finally:
+        for t in tasks:
+            t.cancel()
+    return _finish(saved)
 
-    ts = time.strftime("%Y%m%d-%H%M%S")
-    saved: List[str] = []
-
-    for i in range(n_samples):
-        variation = f"Encourage variation #{i+1}: explore composition/texture diversity while preserving recognizability."
-        prompt = compile_prompt(
-            user_text=user_text,
-            style_json=style_json,
-            structure_spec=structure_spec,
-            variation_note=variation
-        )
-
-        # 记录提示词
-        (OUT_DIR / f"IconGenerator_prompt_{ts}_{i + 1}.txt").write_text(prompt, encoding="utf-8")
-        out_path = IMG_DIR / f"candidate_{ts}_{i + 1}.png"
-
-        resp = None
-        # —— 判断是否支持编辑接口
-        supports_edits = hasattr(client.images, "edits") or hasattr(client.images, "edit")
-        # 1) 如可编辑且传入了底图+蒙版，先试编辑；失败则回退纯生成
-        if base_image and mask_image and supports_edits:
-            try:
-                # 兼容两种命名：edits / edit
-                edits_call = getattr(client.images, "edits", None) or getattr(client.images, "edit", None)
-                resp = edits_call(
-                    model=MODELS["IMAGE_MODEL"],
-                    image=open(base_image, "rb"),
-                    mask=open(mask_image, "rb"),
-                    prompt=prompt,
-                    size=size,
-                    n=1
-                )
-            except Exception as e:
-                print(f"⚠️ images.edits 调用失败，将回退 generate：{e}")
-
-        # 2) 首次或回退：纯生成
-        if resp is None:
-            try:
-                resp = client.images.generate(
-                    model=MODELS["IMAGE_MODEL"],
-                    prompt=prompt,
-                    size=size,
-                    n=1
-                )
-            except Exception as e:
-                print(f"⚠️ images.generate 失败：{e}")
-                continue
-
-        # 3) 保存输出（优先 b64，其次 URL）
-        datum = getattr(resp, "data", [None])[0]
-        b64 = getattr(datum, "b64_json", None)
-        url = getattr(datum, "url", None)
-
-        if isinstance(b64, str) and b64:
-            out_path.write_bytes(base64.b64decode(b64))
-            saved.append(str(out_path))
-            print(f"🖼️ 已保存本地图片: {out_path}")
-        elif isinstance(url, str) and url:
-            if _download_with_retry(url, out_path):
-                saved.append(str(out_path))
-                print(f"🖼️ 已保存本地图片(回退URL): {out_path}")
-            else:
-                print("⚠️ URL 下载失败")
-        else:
-            print("⚠️ 无可用图像数据")
-
-        time.sleep(0.15)
 
+def _finish(saved: List[str]) -> List[str]:
     if not saved:
         raise RuntimeError("Image API returned no usable images (b64/url).")
     log("IconGenerator", f"{len(saved)} local images\n" + "\n".join(saved))
@@ -3,11 +3,11 @@
 from __future__ import annotations
 import re, json
 from typing import Dict, Any, List
-from openai import OpenAI
-from ..config import OPENAI_API_KEY, MODELS
+from ..config import MODELS
 from ..utils import log, extract_json, save_json
+from .clients import get_client
+from .llm_cache import cached_chat
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 SURFACE_TO_SYSTEM = [
     (r"\btruss\b|桁架|桁梁|网架", "truss"),
@@ -70,13 +70,13 @@ def describe_geometry(user_text: str, grounded_blob: str = "") -> Dict[str, Any]
             {"type":"text","text":"Bridge icon preferred; use side_elevation or isometric."}
         ]}
     ]
-    resp = client.chat.completions.create(
+    raw = cached_chat(
+        get_client(),
         model=MODELS["LLM_MODEL"],
         temperature=0.0,
         response_format={"type":"json_object"},
         messages=msgs
     )
-    raw = resp.choices[0].message.content
     log("GeometryDescriptor_raw", raw)
     data = extract_json(raw) or {}
 
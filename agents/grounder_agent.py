@@ -1,284 +1,362 @@
 # -*- coding: utf-8 -*-
 # 文件路径: SymbolGeneration/Agent/agents/grounder_agent.py
+"""
+知识检索（百度百科 / 维基百科 / 百度图片）→ 结构化视觉 spec。
+检索走 httpx.AsyncClient（clients.get_async_http）；同步入口 ground_entity_to_spec 通过 run_sync 包装，
+多智能体运行时 / 编排器直接 await aground_entity_to_spec。
+各查询词并发检索，受 config.GROUNDER 的整体截止时间约束，够用即提前返回并取消其余请求。
+单次检索结果（含查无 / 被拦截）按来源 + 查询词落盘缓存（lookup_cache），重复地标不再走网络；
+预热：python -m Agent.agents.grounder_agent --warm 兰州中山桥 白塔山
+ground_entity_to_spec 先查本地地名库（gazetteer），命中则不走网络检索。
+"""
 from __future__ import annotations
-import json, re, requests
+import argparse, asyncio, json, re, sys
 from typing import Dict, Any, Optional, List, Tuple
-from bs4 import BeautifulSoup
-from openai import OpenAI
 
 from ..utils import log, save_json, extract_json
-from ..config import OPENAI_API_KEY, MODELS
+from ..config import MODELS, GROUNDER, GROUNDER_CACHE
+from ..core import tracing
+from . import gazetteer
+from .clients import get_async_client, get_async_http, get_client, run_sync
+from .llm_cache import acached_chat, cached_chat
+from .lookup_cache import Blocked, acached_lookup, remember_entities, stats as cache_stats
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 # --- Endpoints ---
 WIKI_SEARCH = "https://{lang}.wikipedia.org/w/api.php"
 WIKI_SUMMARY = "https://{lang}.wikipedia.org/api/rest_v1/page/summary/{title}"
+BAIDU_IMAGE_SEARCH = "https://image.baidu.com/search/acjson"
+BAIDU_BAIKE = "https://baike.baidu.com/item/{keyword}"
+
+BROWSER_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# 伪装成浏览器的滚动加载请求
+BAIDU_IMAGE_HEADERS = {
+    "User-Agent": BROWSER_UA,
+    "Accept": "text/plain, */*; q=0.01",
+    "Referer": "https://image.baidu.com/search/index",
+    "X-Requested-With": "XMLHttpRequest",
+}
+
+
+def _baidu_image_params(keyword: str) -> Dict[str, str]:
+    return {
+        "tn": "resultjson_com",
+        "logid": "8305096434442765369",
+        "ipn": "rj",
+        "ct": "201326592",
+        "is": "",
+        "fp": "result",
+        "queryWord": keyword,
+        "cl": "2",
+        "lm": "-1",
+        "ie": "utf-8",
+        "oe": "utf-8",
+        "adpicid": "",
+        "st": "-1",
+        "z": "",
+        "ic": "0",
+        "hd": "",
+        "latest": "",
+        "copyright": "",
+        "word": keyword,
+        "s": "",
+        "se": "",
+        "tab": "",
+        "width": "",
+        "height": "",
+        "face": "0",
+        "istype": "2",
+        "qc": "",
+        "nc": "1",
+        "fr": "",
+        "expermode": "",
+        "force": "",
+        "pn": "0",
+        "rn": "30",
+        "gsm": "1e",
+    }
+
+
+def _raise_for_block(resp) -> None:
+    """403/429/5xx 或被重定向到验证码页 → Blocked"""
+    if resp.status_code in (403, 429) or resp.status_code >= 500:
+        raise Blocked(f"HTTP {resp.status_code}")
+    if "wappass" in resp.url.host or "captcha" in str(resp.url):
+        raise Blocked("captcha")
+
+
+def _pick_baidu_image(text: str) -> Optional[str]:
+    """解析百度图片 acjson 的返回，挑一张图"""
+    # 处理非标准 JSON 的转义字符
+    json_str = text.replace(r"\'", "'")
+    data = json.loads(json_str)
+
+    if "data" not in data or not isinstance(data["data"], list):
+        return None
+
+    candidates = []
+
+    # 1. 收集候选图 (遍历所有返回的 30 张图)
+    for item in data["data"]:
+        if not isinstance(item, dict): continue
+
+        # 优先取 thumbURL (缩略图，链接稳定)
+        img_url = item.get("thumbURL") or item.get("middleURL")
+        if not img_url: continue
+
+        # 获取尺寸信息
+        w = int(item.get("width", 0) or 0)
+        h = int(item.get("height", 0) or 0)
+
+        if w > 200 and h > 200:
+            print(f"✅ [Baidu] 选中首张清晰图片: {img_url[:50]}...")
+            return img_url
+
+    # 2. [智能筛选] 优先找横构图 (长宽比 > 1.2)
+    # 这种图片通常是地标的全景照，能让 Detector 识别出"躺着"
+    best_match = None
+    for cand in candidates:
+        # 过滤太小的图
+        if cand["w"] < 200 or cand["h"] < 150: continue
+
+        # 关键条件：必须是横向的
+        if cand["ratio"] > 1.2:
+            best_match = cand["url"]
+            print(f"✅ [Smart Pick] 选中横向全景图 (W:{cand['w']} H:{cand['h']}): {best_match[:50]}...")
+            break
+
+    # 3. 兜底：如果全是竖图，没办法，只能用第一张
+    if not best_match and candidates:
+        best_match = candidates[0]["url"]
+        print(f"⚠️ [Fallback] 未找到完美构图，使用首张结果: {best_match[:50]}...")
+
+    return best_match
+
+
+async def _abaidu_image_request(keyword: str) -> Optional[str]:
+    print(f"🔎 [Baidu] 正在搜索图片: {keyword}")
+    res = await get_async_http().get(BAIDU_IMAGE_SEARCH, params=_baidu_image_params(keyword),
+                                     headers=BAIDU_IMAGE_HEADERS, timeout=8)
+    _raise_for_block(res)
+    if res.status_code != 200:
+        return None
+    try:
+        return _pick_baidu_image(res.text)
+    except Exception as e:
+        # 反爬时返回的不是 JSON
+        raise Blocked(f"百度返回数据解析失败: {e}")
 
 
 # [关键函数] 百度图片搜索 (JSON API 版)
-def _search_baidu_image(keyword: str) -> Optional[str]:
+async def _asearch_baidu_image(keyword: str) -> Optional[str]:
     """
     使用百度图片搜索的后台 JSON 接口 (acjson)。
     无需翻墙，解析稳定，直接返回图片 URL。
     """
-    print(f"🔎 [Baidu] 正在搜索图片: {keyword}")
     try:
-        url = "https://image.baidu.com/search/acjson"
-
-        # 伪装成浏览器的滚动加载请求
-        params = {
-            "tn": "resultjson_com",
-            "logid": "8305096434442765369",
-            "ipn": "rj",
-            "ct": "201326592",
-            "is": "",
-            "fp": "result",
-            "queryWord": keyword,
-            "cl": "2",
-            "lm": "-1",
-            "ie": "utf-8",
-            "oe": "utf-8",
-            "adpicid": "",
-            "st": "-1",
-            "z": "",
-            "ic": "0",
-            "hd": "",
-            "latest": "",
-            "copyright": "",
-            "word": keyword,
-            "s": "",
-            "se": "",
-            "tab": "",
-            "width": "",
-            "height": "",
-            "face": "0",
-            "istype": "2",
-            "qc": "",
-            "nc": "1",
-            "fr": "",
-            "expermode": "",
-            "force": "",
-            "pn": "0",
-            "rn": "30",
-            "gsm": "1e",
-        }
-
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Accept": "text/plain, */*; q=0.01",
-            "Referer": "https://image.baidu.com/search/index",
-            "X-Requested-With": "XMLHttpRequest",
-        }
-
-        res = requests.get(url, params=params, headers=headers, timeout=8)
-
-        if res.status_code == 200:
-            try:
-                # 处理非标准 JSON 的转义字符
-                json_str = res.text.replace(r"\'", "'")
-                data = json.loads(json_str)
-
-                if "data" not in data or not isinstance(data["data"], list):
-                    return None
-
-                candidates = []
-
-                # 1. 收集候选图 (遍历所有返回的 30 张图)
-                for item in data["data"]:
-                    if not isinstance(item, dict): continue
-
-                    # 优先取 thumbURL (缩略图，链接稳定)
-                    img_url = item.get("thumbURL") or item.get("middleURL")
-                    if not img_url: continue
-
-                    # 获取尺寸信息
-                    w = int(item.get("width", 0) or 0)
-                    h = int(item.get("height", 0) or 0)
-
-                    if w > 200 and h > 200:
-                        print(f"✅ [Baidu] 选中首张清晰图片: {img_url[:50]}...")
-                        return img_url
-
-                # 2. [智能筛选] 优先找横构图 (长宽比 > 1.2)
-                # 这种图片通常是地标的全景照，能让 Detector 识别出"躺着"
-                best_match = None
-                for cand in candidates:
-                    # 过滤太小的图
-                    if cand["w"] < 200 or cand["h"] < 150: continue
-
-                    # 关键条件：必须是横向的
-                    if cand["ratio"] > 1.2:
-                        best_match = cand["url"]
-                        print(f"✅ [Smart Pick] 选中横向全景图 (W:{cand['w']} H:{cand['h']}): {best_match[:50]}...")
-                        break
-
-                # 3. 兜底：如果全是竖图，没办法，只能用第一张
-                if not best_match and candidates:
-                    best_match = candidates[0]["url"]
-                    print(f"⚠️ [Fallback] 未找到完美构图，使用首张结果: {best_match[:50]}...")
-
-                return best_match
-
-            except Exception as e:
-                print(f"⚠️ 百度返回数据解析失败: {e}")
-                pass
-
+        return await acached_lookup("baidu_image", keyword, lambda: _abaidu_image_request(keyword))
     except Exception as e:
         print(f"⚠️ 百度搜图失败: {e}")
-
     return None
 
 
-def _gather_raw_knowledge(user_text: str, search_focus: str = None) -> Tuple[str, Optional[str]]:
-    queries = _expand_queries(user_text)
-    blobs = []
-    first_image = None
+def _search_baidu_image(keyword: str) -> Optional[str]:
+    return run_sync(_asearch_baidu_image(keyword))
 
-    # 如果有精准搜索词，把它加到查询列表的最前面！
-    if search_focus:
-        queries.insert(0, search_focus)
 
-    has_chinese = any('\u4e00' <= ch <= '\u9fff' for ch in user_text)
+# ----------------- Baidu Baike Helper -----------------
+# 百科页面只需要摘要、基本信息表和一张图：
+#   - 装了 lxml：C 解析器建树，只遍历 div / meta / dt / dd 这几类节点
+#   - 否则 bs4 + SoupStrainer，只为这几个节点建子树
+# 格式正常的页面上两条路径的输出与整页 html.parser 解析一致（bench_baike.py 校验并测速）；
+# dt/dd 不闭合之类的坏标签 lxml 按浏览器的方式修复，结果反而更准
+_BAIKE_DIVS = ("lemma-summary", "basic-info", "summary-pic")
+_TEXT_SKIP = ("script", "style", "template")   # bs4 的 get_text() 不取这些标签里的字符串
+_KEEP_WS = ("pre", "textarea")                 # bs4 不折叠这些标签里的空白
+_ASCII_SPACES = " \n\t\x0c\r"
+_use_lxml = True                               # 首次 import lxml 失败后不再尝试
+
+
+def _baike_result(texts: List[str], image_url: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    # html.parser 保留 \r，libxml2 会转成 \n；统一成 \n
+    summary_text = "\n".join(texts).replace("\r\n", "\n").replace("\r", "\n")
+    if not summary_text: return None, None
+
+    if image_url:
+        if image_url.startswith('//'):
+            image_url = "https:" + image_url
+        elif image_url.startswith('/'):
+            image_url = "https://baike.baidu.com" + image_url
+
+    return summary_text, image_url
+
+
+def _collapse_ws(text: str, keep: bool) -> str:
+    """bs4 建树时把只含 ASCII 空白的字符串折叠成一个换行或空格"""
+    if keep or text.strip(_ASCII_SPACES):
+        return text
+    return "\n" if "\n" in text else " "
+
+
+def _lxml_text(el, parts: Optional[List[str]] = None, keep: bool = False) -> str:
+    """同 bs4 get_text()：跳过注释和 script / style / template，空白折叠规则一致"""
+    top = parts is None
+    parts = [] if top else parts
+    if isinstance(el.tag, str) and el.tag not in _TEXT_SKIP:
+        keep = keep or el.tag in _KEEP_WS
+        if el.text:
+            parts.append(_collapse_ws(el.text, keep))
+        for child in el:
+            _lxml_text(child, parts, keep)
+            if child.tail:
+                parts.append(_collapse_ws(child.tail, keep))
+    return "".join(parts) if top else ""
+
+
+def _parse_baike_lxml(html: str) -> Tuple[Optional[str], Optional[str]]:
+    from lxml import html as lxml_html
+    doc = lxml_html.document_fromstring(html)
+
+    divs: Dict[str, Any] = {}
+    for div in doc.iter("div"):
+        for cls in (div.get("class") or "").split():
+            if cls in _BAIKE_DIVS:
+                divs.setdefault(cls, div)
+        if len(divs) == len(_BAIKE_DIVS):
+            break
+
+    texts = []
+    if "lemma-summary" in divs:
+        texts.append(_lxml_text(divs["lemma-summary"]).strip())
+    if "basic-info" in divs:
+        box = divs["basic-info"]
+        for n, v in zip(box.iter("dt"), box.iter("dd")):
+            texts.append(f"{_lxml_text(n).strip()}: {_lxml_text(v).strip()}")
+    if not "\n".join(texts):
+        return None, None
 
-    for q in queries:
-        # 1. 尝试百度百科
-        if has_chinese:
-            summary, img = _fetch_baidu_baike(q)
-            if summary:
-                blobs.append(f"[Baidu] {q}\n{summary}")
-                if not first_image and img: first_image = img
-
-                # 如果百科没图，用当前的 query (q) 去搜图
-                if not first_image:
-                    first_image = _search_baidu_image(q)
-                continue
-
-                # 2. 维基百科逻辑 (保持不变)
-        # ... (略，保持原代码) ...
-
-    # 3. [核心修改] 最终兜底：优先使用精准词搜图，而不是用长句子
-    if not first_image and has_chinese:
-        # 如果有 search_focus (如"兰州白塔山")，用它搜！
-        target_keyword = search_focus if search_focus else user_text
-        print(f"🔎 最终兜底：尝试使用关键词搜索图片: {target_keyword}")
-        first_image = _search_baidu_image(target_keyword)
+    image_url = next((m.get("content") for m in doc.iter("meta") if m.get("property") == "og:image"), None)
+    if not image_url and "summary-pic" in divs:
+        img = next(divs["summary-pic"].iter("img"), None)
+        if img is not None: image_url = img.get("src")
+    return _baike_result(texts, image_url)
 
-    text = "\n\n".join(blobs)
-    log("Grounder_raw", text if text else "(empty)")
 
-    return text, first_image
+def _baike_class(value: Optional[str]) -> bool:
+    # 只留需要的 div；没有 class 的也放行，og:image 那个 <meta> 就没有 class
+    return value is None or any(c in _BAIKE_DIVS for c in value.split())
 
 
-# [修改] 接口增加 search_focus
-def ground_entity_to_spec(user_text: str, search_focus: str = None) -> Dict[str, Any]:
-    # 传递 search_focus 给搜图逻辑
-    raw_text, ref_image_url = _gather_raw_knowledge(user_text, search_focus=search_focus)
+def _parse_baike_soup(html: str, strain: bool = True) -> Tuple[Optional[str], Optional[str]]:
+    from bs4 import BeautifulSoup, SoupStrainer   # 延迟导入：只有走百科解析时才加载 bs4
+    soup = BeautifulSoup(html, 'html.parser', parse_only=SoupStrainer(["div", "meta"], class_=_baike_class) if strain else None)
 
-    if not raw_text and not ref_image_url:
-        spec = {"entity": {"name": user_text}, "constraints": {"must_not": []}}
-        save_json("Grounder_spec", spec)
-        return spec
+    # 1. 提取文本
+    texts = []
+    summary_div = soup.find('div', class_='lemma-summary')
+    if summary_div:
+        texts.append(summary_div.get_text().strip())
 
-    # ... (中间 LLM 调用代码保持不变) ...
-    msg_user = [
-        {"type": "text", "text": f"User intent:\n{user_text}"},
-        {"type": "text", "text": f"Raw encyclopedia snippets:\n{raw_text}"}
-    ]
-    resp = client.chat.completions.create(
-        model=MODELS["LLM_MODEL"],
-        response_format={"type": "json_object"},
-        messages=[{"role": "system", "content": SYSTEM_TO_SPEC}, {"role": "user", "content": msg_user}]
-    )
-    spec = extract_json(resp.choices[0].message.content) or {"entity": {"name": user_text}}
+    basic_info = soup.find('div', class_='basic-info')
+    if basic_info:
+        names = basic_info.find_all('dt')
+        values = basic_info.find_all('dd')
+        for n, v in zip(names, values):
+            texts.append(f"{n.get_text().strip()}: {v.get_text().strip()}")
 
-    if not spec.get("constraints"): spec["constraints"] = {}
-    spec["constraints"].setdefault("must_not", [])
+    if not "\n".join(texts): return None, None
 
-    if ref_image_url:
-        spec["reference_image_url"] = ref_image_url
+    # 2. 尝试从百科提取图片 (仅作为尝试)
+    image_url = None
+    meta_img = soup.find('meta', property="og:image")
+    if meta_img:
+        image_url = meta_img.get("content")
 
-    save_json("Grounder_spec", spec)
-    return spec
+    if not image_url:
+        pic_div = soup.find('div', class_='summary-pic')
+        if pic_div:
+            img = pic_div.find('img')
+            if img: image_url = img.get('src')
 
+    return _baike_result(texts, image_url)
 
-# ----------------- Baidu Baike Helper -----------------
-def _fetch_baidu_baike(keyword: str) -> Tuple[Optional[str], Optional[str]]:
-    url = f"https://baike.baidu.com/item/{keyword}"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    try:
-        resp = requests.get(url, headers=headers, timeout=5, allow_redirects=True)
-        if resp.status_code != 200:
-            return None, None
-
-        resp.encoding = 'utf-8'
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        # 1. 提取文本
-        texts = []
-        summary_div = soup.find('div', class_='lemma-summary')
-        if summary_div:
-            texts.append(summary_div.get_text().strip())
-
-        basic_info = soup.find('div', class_='basic-info')
-        if basic_info:
-            names = basic_info.find_all('dt')
-            values = basic_info.find_all('dd')
-            for n, v in zip(names, values):
-                texts.append(f"{n.get_text().strip()}: {v.get_text().strip()}")
-
-        summary_text = "\n".join(texts)
-        if not summary_text: return None, None
-
-        # 2. 尝试从百科提取图片 (仅作为尝试)
-        image_url = None
-        meta_img = soup.find('meta', property="og:image")
-        if meta_img:
-            image_url = meta_img.get("content")
-
-        if not image_url:
-            pic_div = soup.find('div', class_='summary-pic')
-            if pic_div:
-                img = pic_div.find('img')
-                if img: image_url = img.get('src')
-
-        if image_url:
-            if image_url.startswith('//'):
-                image_url = "https:" + image_url
-            elif image_url.startswith('/'):
-                image_url = "https://baike.baidu.com" + image_url
-
-        return summary_text, image_url
 
+def _parse_baike_html(html: str) -> Tuple[Optional[str], Optional[str]]:
+    global _use_lxml
+    if not html.strip():
+        return None, None
+    if _use_lxml:
+        try:
+            return _parse_baike_lxml(html)
+        except ImportError:
+            _use_lxml = False
+        except Exception as e:
+            # 带 XML 编码声明的字符串、空文档等 lxml 不收，交给 bs4
+            print(f"⚠️ lxml 解析百科页面失败，改用 bs4: {e}")
+    return _parse_baike_soup(html)
+
+
+async def _abaike_request(keyword: str) -> Optional[Dict[str, Optional[str]]]:
+    resp = await get_async_http().get(BAIDU_BAIKE.format(keyword=keyword),
+                                      headers={"User-Agent": BROWSER_UA}, timeout=5)
+    _raise_for_block(resp)
+    if resp.status_code != 200:
+        return None
+
+    resp.encoding = 'utf-8'
+    # HTML 解析是纯 CPU 活，放到线程里，不卡事件循环
+    summary, image = await asyncio.to_thread(_parse_baike_html, resp.text)
+    return {"summary": summary, "image": image} if summary else None
+
+
+async def _afetch_baidu_baike(keyword: str) -> Tuple[Optional[str], Optional[str]]:
+    try:
+        hit = await acached_lookup("baike", keyword, lambda: _abaike_request(keyword))
     except Exception as e:
         print(f"⚠️ Baidu Baike fetch error: {e}")
         return None, None
+    if not hit:
+        return None, None
+    return hit["summary"], hit.get("image")
 
 
 # ----------------- Small Helpers (Wiki) -----------------
-def _wiki_search(q: str, lang="en") -> Optional[str]:
+async def _awiki_search_request(q: str, lang: str) -> Optional[str]:
+    params = {"action": "opensearch", "search": q, "limit": 1, "namespace": 0, "format": "json"}
+    r = await get_async_http().get(WIKI_SEARCH.format(lang=lang), params=params, timeout=5)
+    _raise_for_block(r)
+    if r.status_code == 200:
+        j = r.json()
+        if isinstance(j, list) and len(j) >= 2 and j[1]: return j[1][0]
+    return None
+
+
+async def _awiki_summary_request(title: str, lang: str) -> Optional[Dict[str, Any]]:
+    url = WIKI_SUMMARY.format(lang=lang, title=title.replace(" ", "_"))
+    r = await get_async_http().get(url, timeout=5, headers={"accept": "application/json"})
+    _raise_for_block(r)
+    if r.status_code != 200:
+        return None
+    data = r.json()
+    if not data.get("extract"):
+        return None
+    # 只留用得到的字段，缓存条目小一些
+    return {k: data[k] for k in ("title", "extract", "thumbnail", "originalimage") if k in data}
+
+
+async def _awiki_search(q: str, lang="en") -> Optional[str]:
     try:
-        params = {"action": "opensearch", "search": q, "limit": 1, "namespace": 0, "format": "json"}
-        r = requests.get(WIKI_SEARCH.format(lang=lang), params=params, timeout=5)
-        if r.status_code == 200:
-            j = r.json()
-            if isinstance(j, list) and len(j) >= 2 and j[1]: return j[1][0]
+        return await acached_lookup(f"wiki_search:{lang}", q, lambda: _awiki_search_request(q, lang))
     except Exception:
-        pass
-    return None
+        return None
 
 
-def _wiki_summary(title: str, lang="en") -> Optional[Dict[str, Any]]:
+async def _awiki_summary(title: str, lang="en") -> Optional[Dict[str, Any]]:
     try:
-        url = WIKI_SUMMARY.format(lang=lang, title=title.replace(" ", "_"))
-        r = requests.get(url, timeout=5, headers={"accept": "application/json"})
-        if r.status_code == 200:
-            return r.json()
+        return await acached_lookup(f"wiki_summary:{lang}", title, lambda: _awiki_summary_request(title, lang))
     except Exception:
-        pass
-    return None
+        return None
 
 
 def _expand_queries(user_text: str) -> List[str]:
@@ -294,51 +372,87 @@ def _langs_for(q: str, user_text: str) -> List[str]:
     return ["zh", "en"] if has_chinese else ["en", "zh"]
 
 
+async def _awiki_lookup(q: str, lang: str) -> Tuple[Optional[str], Optional[str]]:
+    """维基：搜索标题 → 摘要；返回 (blob, 缩略图)"""
+    title = await _awiki_search(q, lang)
+    if not title:
+        return None, None
+    data = await _awiki_summary(title, lang)
+    extract = (data or {}).get("extract")
+    if not extract:
+        return None, None
+    img_src = data.get("thumbnail", {}).get("source") or data.get("originalimage", {}).get("source")
+    return f"[Wiki-{lang}] {title}\n{extract}", img_src
+
+
 # ----------------- Main Logic -----------------
-def _gather_raw_knowledge(user_text: str) -> Tuple[str, Optional[str]]:
+async def _alookup_query(q: str, user_text: str, has_chinese: bool) -> Tuple[List[str], Optional[str]]:
+    """单个查询词：返回 ([blob], 参考图)"""
+    # 1. 尝试百度百科
+    if has_chinese:
+        summary, img = await _afetch_baidu_baike(q)
+        if summary:
+            # [关键] 如果百科有文但没图，调用百度图片搜索补救
+            if not img:
+                img = await _asearch_baidu_image(q)
+            return [f"[Baidu] {q}\n{summary}"], img
+
+    # 2. 尝试维基百科（各语言同时查，按语言优先级取第一条）
+    for blob, img in await asyncio.gather(*(_awiki_lookup(q, lang) for lang in _langs_for(q, user_text))):
+        if blob:
+            return [blob], img
+    return [], None
+
+
+async def _aimage_only(keyword: str) -> Tuple[List[str], Optional[str]]:
+    return [], await _asearch_baidu_image(keyword)
+
+
+async def _agather_raw_knowledge(user_text: str, search_focus: str = None) -> Tuple[str, Optional[str]]:
     queries = _expand_queries(user_text)
-    blobs = []
-    first_image = None
+
+    # 如果有精准搜索词，把它加到查询列表的最前面！
+    if search_focus and search_focus not in queries:
+        queries.insert(0, search_focus)
 
     has_chinese = any('\u4e00' <= ch <= '\u9fff' for ch in user_text)
 
-    for q in queries:
-        # 1. 尝试百度百科
-        if has_chinese:
-            summary, img = _fetch_baidu_baike(q)
-            if summary:
-                blobs.append(f"[Baidu] {q}\n{summary}")
-
-                # 如果百科有图，暂存
-                if not first_image and img:
-                    first_image = img
-
-                # [关键] 如果百科有文但没图，调用百度图片搜索补救
-                if not first_image:
-                    first_image = _search_baidu_image(q)
-
-                continue
-
-                # 2. 尝试维基百科
-        langs = _langs_for(q, user_text)
-        for lang in langs:
-            title = _wiki_search(q, lang)
-            if title:
-                data = _wiki_summary(title, lang)
-                if data:
-                    extract = data.get("extract")
-                    img_src = data.get("thumbnail", {}).get("source") or data.get("originalimage", {}).get("source")
-
-                    if extract:
-                        blobs.append(f"[Wiki-{lang}] {title}\n{extract}")
-                        if not first_image and img_src:
-                            first_image = img_src
-                        break
-
-    # 3. [最后兜底] 仍然没图？用原词去百度图片搜一把
-    if not first_image and has_chinese:
-        print(f"🔎 最终兜底：尝试使用百度搜索图片: {user_text}")
-        first_image = _search_baidu_image(user_text)
+    # 每个查询词一个 task；中文请求同时预先用精准词（没有则原句）搜一张兜底图，优先级排在最后
+    tasks = {asyncio.create_task(_alookup_query(q, user_text, has_chinese)): i for i, q in enumerate(queries)}
+    if has_chinese:
+        target_keyword = search_focus if search_focus else user_text
+        tasks[asyncio.create_task(_aimage_only(target_keyword))] = len(queries)
+
+    need = min(int(GROUNDER["min_snippets"]), len(queries))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + float(GROUNDER["deadline"])
+    results: Dict[int, Tuple[List[str], Optional[str]]] = {}
+    pending = set(tasks)
+    with tracing.span("grounder.gather", cat="net", queries=len(queries)) as sp:
+        try:
+            while pending:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    print(f"⏱ Grounder 检索到达截止时间，放弃 {len(pending)} 个未完成的查询")
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if not t.cancelled() and t.exception() is None:
+                        results[tasks[t]] = t.result()
+                n_snippets = sum(len(blobs) for blobs, _ in results.values())
+                if n_snippets >= need and any(img for _, img in results.values()):
+                    break
+        finally:
+            sp["cancelled"] = len(pending)
+            for t in pending:
+                t.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    # 按查询词顺序拼接；参考图取优先级最高的（靠前查询词的百科图 > 其搜图 > 维基缩略图 > 兜底搜图）
+    order = sorted(results)
+    blobs = [b for i in order for b in results[i][0]]
+    first_image = next((results[i][1] for i in order if results[i][1]), None)
 
     text = "\n\n".join(blobs)
     log("Grounder_raw", text if text else "(empty)")
@@ -349,7 +463,10 @@ def _gather_raw_knowledge(user_text: str) -> Tuple[str, Optional[str]]:
     return text, first_image
 
 
-# (SYSTEM_TO_SPEC 保持不变)
+def _gather_raw_knowledge(user_text: str, search_focus: str = None) -> Tuple[str, Optional[str]]:
+    return run_sync(_agather_raw_knowledge(user_text, search_focus=search_focus))
+
+
 SYSTEM_TO_SPEC = (
     "You are a visual knowledge extraction expert. "
     "Your task is to convert vague user intent and raw encyclopedia snippets into a STRICT visual structure spec.\n"
@@ -376,25 +493,29 @@ SYSTEM_TO_SPEC = (
 )
 
 
-def ground_entity_to_spec(user_text: str) -> Dict[str, Any]:
-    raw_text, ref_image_url = _gather_raw_knowledge(user_text)
+def _empty_spec(user_text: str) -> Dict[str, Any]:
+    spec = {"entity": {"name": user_text}, "constraints": {"must_not": []}}
+    save_json("Grounder_spec", spec)
+    return spec
 
-    if not raw_text and not ref_image_url:
-        spec = {"entity": {"name": user_text}, "constraints": {"must_not": []}}
-        save_json("Grounder_spec", spec)
-        return spec
 
+def _spec_request(user_text: str, raw_text: str) -> Dict[str, Any]:
     msg_user = [
         {"type": "text", "text": f"User intent:\n{user_text}"},
         {"type": "text", "text": f"Raw encyclopedia snippets:\n{raw_text}"}
     ]
-    resp = client.chat.completions.create(
+    return dict(
         model=MODELS["LLM_MODEL"],
         response_format={"type": "json_object"},
         messages=[{"role": "system", "content": SYSTEM_TO_SPEC}, {"role": "user", "content": msg_user}]
     )
-    spec = extract_json(resp.choices[0].message.content) or {"entity": {"name": user_text}}
 
+
+def _finish_spec(content: str, user_text: str, ref_image_url: Optional[str]) -> Dict[str, Any]:
+    return _complete_spec(extract_json(content) or {"entity": {"name": user_text}}, ref_image_url)
+
+
+def _complete_spec(spec: Dict[str, Any], ref_image_url: Optional[str]) -> Dict[str, Any]:
     if not spec.get("constraints"): spec["constraints"] = {}
     spec["constraints"].setdefault("must_not", [])
 
@@ -402,4 +523,111 @@ def ground_entity_to_spec(user_text: str) -> Dict[str, Any]:
         spec["reference_image_url"] = ref_image_url
 
     save_json("Grounder_spec", spec)
-    return spec
\ No newline at end of file
+    return spec
+
+
+def _from_gazetteer(user_text: str, search_focus: Optional[str]
+                    ) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[str, Optional[str]]]]:
+    """
+    查本地地名库：返回 (spec, None) 表示条目带结构提示、可直接用（缺参考图由下游自主搜图补）；
+    (None, (摘要, 参考图)) 表示用条目摘要代替网络检索；(None, None) 未命中，
+    或条目只有摘要却缺参考图 / 百科信息栏，仍走在线检索。
+    """
+    entry = gazetteer.lookup(search_focus, user_text)
+    if entry is None:
+        return None, None
+    if entry.get("structure"):
+        print(f"📚 [Gazetteer] 命中本地地名库: {entry['name']}")
+        return _complete_spec(gazetteer.entry_to_spec(entry), entry.get("reference_image")), None
+    if not entry.get("reference_image") or not gazetteer.has_basic_info(entry):
+        print(f"📚 [Gazetteer] {entry['name']} 缺参考图或信息栏，改走在线检索")
+        return None, None
+    print(f"📚 [Gazetteer] 命中本地地名库: {entry['name']}")
+    return None, (gazetteer.entry_snippet(entry), entry.get("reference_image"))
+
+
+def _entity_name(spec: Dict[str, Any]) -> Optional[str]:
+    entity = spec.get("entity")
+    return entity.get("name") if isinstance(entity, dict) else None
+
+
+# search_focus: Interpreter 提取的精准地标名（如"兰州白塔山"），优先用于检索与搜图
+def ground_entity_to_spec(user_text: str, search_focus: str = None) -> Dict[str, Any]:
+    spec, known = _from_gazetteer(user_text, search_focus)
+    if spec is not None:
+        return spec
+    raw_text, ref_image_url = known or _gather_raw_knowledge(user_text, search_focus=search_focus)
+    if not raw_text and not ref_image_url:
+        return _empty_spec(user_text)
+    content = cached_chat(get_client(), **_spec_request(user_text, raw_text))
+    spec = _finish_spec(content, user_text, ref_image_url)
+    if not known:
+        remember_entities(search_focus, _entity_name(spec))
+    return spec
+
+
+async def aground_entity_to_spec(user_text: str, search_focus: str = None) -> Dict[str, Any]:
+    spec, known = _from_gazetteer(user_text, search_focus)
+    if spec is not None:
+        return spec
+    raw_text, ref_image_url = known or await _agather_raw_knowledge(user_text, search_focus=search_focus)
+    if not raw_text and not ref_image_url:
+        return _empty_spec(user_text)
+    content = await acached_chat(get_async_client(), **_spec_request(user_text, raw_text))
+    spec = _finish_spec(content, user_text, ref_image_url)
+    if not known:
+        # 记下确认过的实体名，gazetteer 建库只收这些查询词的检索结果
+        await asyncio.to_thread(remember_entities, search_focus, _entity_name(spec))
+    return spec
+
+
+# ----------------- Cache Warm-up -----------------
+async def _awarm_one(name: str) -> int:
+    """不设截止、不提前返回，把该地标各查询词会用到的检索都跑一遍写进缓存；返回拿到的摘要条数"""
+    has_chinese = any('\u4e00' <= ch <= '\u9fff' for ch in name)
+    jobs = [_alookup_query(q, name, has_chinese) for q in _expand_queries(name)]
+    if has_chinese:
+        jobs.append(_aimage_only(name))
+    results = await asyncio.gather(*jobs, return_exceptions=True)
+    return sum(len(r[0]) for r in results if isinstance(r, tuple))
+
+
+async def awarm_cache(names: List[str], concurrency: int = 4) -> Dict[str, int]:
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(name: str) -> int:
+        async with sem:
+            n = await _awarm_one(name)
+        if n:
+            await asyncio.to_thread(remember_entities, name)
+        print(f"{'✅' if n else '⚠️'} {name}: {n} 条摘要")
+        return n
+
+    counts = await asyncio.gather(*(one(n) for n in names))
+    return dict(zip(names, counts))
+
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description="Grounder 检索缓存预热")
+    ap.add_argument("--warm", nargs="*", default=[], metavar="NAME", help="地标名，如 兰州中山桥 白塔山")
+    ap.add_argument("--file", help="地标清单，每行一个（# 开头为注释）")
+    ap.add_argument("--refresh", action="store_true", help="忽略已有缓存，重新检索并覆盖")
+    ap.add_argument("--concurrency", type=int, default=4)
+    args = ap.parse_args(argv)
+
+    names = list(args.warm)
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            names += [ln.strip() for ln in f if ln.strip() and not ln.lstrip().startswith("#")]
+    names = list(dict.fromkeys(names))
+    if args.refresh:
+        GROUNDER_CACHE["mode"] = "refresh"
+    if names:
+        counts = run_sync(awarm_cache(names, args.concurrency))
+        print(f"预热完成：{sum(1 for n in counts.values() if n)}/{len(counts)} 个地标有摘要")
+    print(f"📦 缓存: {cache_stats()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
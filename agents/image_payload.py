@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# SymbolGeneration/Agent/agents/image_payload.py
+"""
+视觉请求的图像载荷：缩放到 max_edge、可选灰度/二值化、重新编码为紧凑的 JPEG/PNG，
+结果 data URL 按「文件内容哈希 + 编码参数」做有界（按字节）LRU 缓存。
+Detector（照片）与 Reviewer（图标）共用。
+"""
+from __future__ import annotations
+import base64, hashlib, io, mimetypes, threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+from ..config import IMAGE_PAYLOAD
+
+_cache: "OrderedDict[Tuple, str]" = OrderedDict()
+_cache_bytes = 0
+_digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()   # (path, mtime_ns, size) -> sha256
+_lock = threading.Lock()
+
+
+def _file_digest(p: Path) -> Tuple[str, Optional[bytes]]:
+    """文件未变（路径+mtime+大小）时复用上次的哈希，避免重复读盘"""
+    st = p.stat()
+    sig = (str(p.resolve()), st.st_mtime_ns, st.st_size)
+    with _lock:
+        digest = _digests.get(sig)
+    if digest is not None:
+        return digest, None
+    raw = p.read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()
+    with _lock:
+        _digests[sig] = digest
+        while len(_digests) > 4096:
+            _digests.popitem(last=False)
+    return digest, raw
+
+
+def _encode(raw: bytes, src_name: str, max_edge: Optional[int], mode: str,
+            fmt: str, quality: int, threshold: int) -> str:
+    from PIL import Image, ImageOps   # 延迟导入：缓存命中时不需要 PIL
+    img = Image.open(io.BytesIO(raw))
+    img = ImageOps.exif_transpose(img)
+    resized = False
+    if max_edge and max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        resized = True
+
+    # 透明背景合成到白底（JPEG 不支持 alpha，灰度/二值化也需要实色背景）
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        bg = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(bg, img)
+    if mode == "gray":
+        img = img.convert("L")
+    elif mode == "binary":
+        img = img.convert("L").point(lambda v: 255 if v >= threshold else 0)
+    else:
+        img = img.convert("RGB")
+
+    if fmt == "auto":
+        fmt = "png" if mode in ("gray", "binary") else "jpeg"
+    buf = io.BytesIO()
+    if fmt == "jpeg":
+        img.save(buf, format="JPEG", quality=quality, optimize=True)
+        mime = "image/jpeg"
+    else:
+        img.save(buf, format="PNG", optimize=True)
+        mime = "image/png"
+    data = buf.getvalue()
+
+    # 未缩放且重编码反而更大（已是紧凑小图）：沿用原始字节
+    if not resized and mode == "color" and len(data) >= len(raw):
+        data = raw
+        mime = mimetypes.guess_type(src_name)[0] or "image/png"
+    return f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+def encode_image(image_path: Union[str, Path],
+                 max_edge: Optional[int] = None,
+                 mode: str = "color",          # color | gray | binary
+                 fmt: str = "auto",            # auto | jpeg | png
+                 quality: int = 85,
+                 threshold: int = 180) -> str:
+    """本地图像 → 压缩后的 data URL（带缓存）"""
+    global _cache_bytes
+    p = Path(image_path)
+    digest, raw = _file_digest(p)
+    key = (digest, max_edge, mode, fmt, quality, threshold)
+    with _lock:
+        url = _cache.get(key)
+        if url is not None:
+            _cache.move_to_end(key)
+            return url
+
+    url = _encode(raw if raw is not None else p.read_bytes(), p.name, max_edge, mode, fmt, quality, threshold)
+
+    with _lock:
+        if key not in _cache:
+            _cache[key] = url
+            _cache_bytes += len(url)
+            while _cache and _cache_bytes > IMAGE_PAYLOAD["cache_max_bytes"]:
+                _, old = _cache.popitem(last=False)
+                _cache_bytes -= len(old)
+    return url
+
+
+def photo_data_url(image_path: Union[str, Path]) -> str:
+    return encode_image(image_path, **IMAGE_PAYLOAD["photo"])
+
+
+def icon_data_url(image_path: Union[str, Path]) -> str:
+    return encode_image(image_path, **IMAGE_PAYLOAD["icon"])
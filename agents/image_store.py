@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# SymbolGeneration/Agent/agents/image_store.py
+"""
+参考图的内容寻址存储（自主搜图 / Grounder 给出的 reference_image_url → 本地文件）：
+  - 文件按 sha256 命名（blobs/ab/abcd….jpg），不同 URL 指向同一张图只存一份
+  - URL → sha256 的映射、ETag / Last-Modified 记在 index.sqlite；fresh_ttl 内直接用本地文件，
+    过期后带 If-None-Match / If-Modified-Since 重新验证，304 就不再下载
+  - 流式下载，边下边算哈希，超过 max_image_bytes 立即中止；过小的多半是防盗链占位图
+  - 总大小超过 max_total_bytes 时按最近使用时间淘汰；evict_grace 秒内用过的不淘汰（在途任务可能正要读）
+"""
+from __future__ import annotations
+import hashlib, os, sqlite3, tempfile, threading, time
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from ..config import REFERENCE_IMAGES
+from ..core import tracing
+from ..utils import OUTPUT_DIR
+from .clients import get_session
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256      TEXT PRIMARY KEY,
+    path        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    url           TEXT PRIMARY KEY,
+    sha256        TEXT NOT NULL REFERENCES blobs(sha256) ON DELETE CASCADE,
+    etag          TEXT,
+    last_modified TEXT,
+    checked_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_blobs_accessed ON blobs(accessed_at);
+CREATE INDEX IF NOT EXISTS idx_urls_sha ON urls(sha256);
+"""
+
+# 破解百度防盗链：带浏览器 UA 和 Referer
+DOWNLOAD_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Referer": "https://image.baidu.com/",
+}
+
+_EXT_BY_TYPE = {"image/jpeg": ".jpg", "image/jpg": ".jpg", "image/png": ".png",
+                "image/webp": ".webp", "image/gif": ".gif", "image/bmp": ".bmp"}
+_EXT_BY_MAGIC = ((b"\xff\xd8\xff", ".jpg"), (b"\x89PNG", ".png"), (b"GIF8", ".gif"), (b"BM", ".bmp"))
+
+
+def _ext(content_type: str, head: bytes) -> str:
+    ext = _EXT_BY_TYPE.get(content_type.split(";")[0].strip().lower())
+    if ext:
+        return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return next((e for magic, e in _EXT_BY_MAGIC if head.startswith(magic)), ".jpg")
+
+
+class ReferenceImageStore:
+    """线程安全；fetch() 是阻塞调用，协程里用 asyncio.to_thread"""
+    def __init__(self, root: Union[str, Path], max_image_bytes: int, min_image_bytes: int = 0,
+                 max_total_bytes: Optional[int] = None, fresh_ttl: float = 0, timeout: float = 15,
+                 evict_grace: float = 0):
+        self.root = Path(root)
+        (self.root / "tmp").mkdir(parents=True, exist_ok=True)
+        self.max_image_bytes = max_image_bytes
+        self.min_image_bytes = min_image_bytes
+        self.max_total_bytes = max_total_bytes
+        self.fresh_ttl = fresh_ttl
+        self.evict_grace = evict_grace
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / "index.sqlite"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def _known(self, url: str) -> Optional[Dict[str, Any]]:
+        """URL 已有记录且文件还在 → 记录；文件被删了则连同记录一起清掉"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT u.sha256, u.etag, u.last_modified, u.checked_at, b.path FROM urls u "
+                "JOIN blobs b ON b.sha256 = u.sha256 WHERE u.url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            sha, etag, last_modified, checked_at, path = row
+            if not Path(path).exists():
+                self._conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha,))
+                self._conn.commit()
+                return None
+        return {"sha256": sha, "etag": etag, "last_modified": last_modified, "checked_at": checked_at, "path": path}
+
+    def _touch(self, url: str, sha: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("UPDATE blobs SET accessed_at = ? WHERE sha256 = ?", (now, sha))
+            self._conn.execute(
+                "INSERT INTO urls (url, sha256, etag, last_modified, checked_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET sha256 = excluded.sha256, checked_at = excluded.checked_at, "
+                "etag = COALESCE(excluded.etag, etag), last_modified = COALESCE(excluded.last_modified, last_modified)",
+                (url, sha, etag, last_modified, now))
+            self._conn.commit()
+
+    def fetch(self, url: str) -> Optional[str]:
+        """返回本地文件路径；下载失败 / 不是图片 / 太大或太小时返回 None"""
+        known = self._known(url)
+        if known and time.time() - known["checked_at"] < self.fresh_ttl:
+            self._touch(url, known["sha256"])
+            return known["path"]
+
+        headers = dict(DOWNLOAD_HEADERS)
+        if known and known["etag"]:
+            headers["If-None-Match"] = known["etag"]
+        if known and known["last_modified"]:
+            headers["If-Modified-Since"] = known["last_modified"]
+
+        print(f"⬇️ 正在下载参考图: {url[:50]}...")
+        with tracing.span("refimage.fetch", cat="net") as sp:
+            try:
+                with get_session().get(url, headers=headers, timeout=self.timeout, stream=True) as resp:
+                    sp["status"] = resp.status_code
+                    if resp.status_code == 304 and known:
+                        self._touch(url, known["sha256"])
+                        return known["path"]
+                    if resp.status_code != 200:
+                        print(f"⚠️ 下载失败，状态码: {resp.status_code}")
+                        # 重新验证失败时旧文件照样能用
+                        return known["path"] if known else None
+                    ctype = resp.headers.get("Content-Type", "")
+                    if ctype and not ctype.lower().startswith(("image/", "application/octet-stream")):
+                        print(f"⚠️ 返回的不是图片 ({ctype})，可能是防盗链页面")
+                        return known["path"] if known else None
+                    path = self._save_stream(url, resp, ctype, sp)
+            except Exception as e:
+                print(f"⚠️ 下载异常: {e}")
+                return known["path"] if known else None
+        if path:
+            print(f"✅ 参考图已就绪: {path}")
+        return path
+
+    def _save_stream(self, url: str, resp, ctype: str, sp: Dict[str, Any]) -> Optional[str]:
+        h, size, head = hashlib.sha256(), 0, b""
+        fd, tmp = tempfile.mkstemp(dir=self.root / "tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in resp.iter_content(chunk_size=64 * 1024):
+                    size += len(chunk)
+                    if size > self.max_image_bytes:
+                        print(f"⚠️ 参考图超过 {self.max_image_bytes // 1024} KB 上限，放弃下载")
+                        return None
+                    if len(head) < 16:
+                        head += chunk[:16]
+                    h.update(chunk)
+                    f.write(chunk)
+            sp["bytes"] = size
+            if size < self.min_image_bytes:
+                print("⚠️ 下载图片过小，可能是防盗链占位图")
+                return None
+            sha = h.hexdigest()
+            with self._lock:
+                row = self._conn.execute("SELECT path FROM blobs WHERE sha256 = ?", (sha,)).fetchone()
+                if row and Path(row[0]).exists():
+                    path = row[0]
+                    sp["dedup"] = True
+                else:
+                    dest = self.root / "blobs" / sha[:2] / (sha + _ext(ctype, head))
+                    dest.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(tmp, dest)
+                    path = str(dest)
+                    self._conn.execute("INSERT OR REPLACE INTO blobs (sha256, path, size, accessed_at) "
+                                       "VALUES (?, ?, ?, ?)", (sha, path, size, time.time()))
+                    self._conn.commit()
+            self._touch(url, sha, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+            self._evict(keep=sha)
+            return path
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _evict(self, keep: Optional[str] = None):
+        """
+        总大小超过上限时按最近使用时间删最旧的文件（连同指向它的 URL 记录）。
+        evict_grace 内访问过的跳过：fetch() 刚把路径交给别的任务，删掉它对方就读不到了；
+        因此总大小可能暂时超出上限，等这些图冷下来后的下一次淘汰再收回。
+        """
+        if self.max_total_bytes is None:
+            return
+        cutoff = time.time() - self.evict_grace
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_total_bytes:
+                return
+            victims = []
+            for sha, path, size in self._conn.execute(
+                    "SELECT sha256, path, size FROM blobs WHERE accessed_at < ? ORDER BY accessed_at ASC", (cutoff,)):
+                if total <= self.max_total_bytes:
+                    break
+                if sha == keep:
+                    continue
+                victims.append((sha, path))
+                total -= size
+            for sha, path in victims:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self._conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha,))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            n_urls = self._conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        return {"images": n, "urls": n_urls, "bytes": size, "path": str(self.root)}
+
+
+_store: Optional[ReferenceImageStore] = None
+_store_lock = threading.Lock()
+
+
+def get_image_store() -> ReferenceImageStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReferenceImageStore(
+                    REFERENCE_IMAGES.get("dir") or OUTPUT_DIR / "cache" / "ref_images",
+                    max_image_bytes=REFERENCE_IMAGES["max_image_bytes"],
+                    min_image_bytes=REFERENCE_IMAGES.get("min_image_bytes", 0),
+                    max_total_bytes=REFERENCE_IMAGES.get("max_total_bytes"),
+                    fresh_ttl=REFERENCE_IMAGES.get("fresh_ttl", 0),
+                    timeout=REFERENCE_IMAGES.get("timeout", 15),
+                    evict_grace=REFERENCE_IMAGES.get("evict_grace", 0),
+                )
+    return _store
+
+
+def fetch_reference_image(url: str) -> Optional[str]:
+    return get_image_store().fetch(url)
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 # SymbolGeneration/Agent/agents/interpreter_agent.py
-from openai import OpenAI
-from ..config import MODELS, OPENAI_API_KEY
+import json
+from typing import Optional
+
+from ..config import MODELS
 from ..utils import log
+from .clients import get_async_client, get_client
+from .llm_cache import acached_chat, cached_chat
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 SYSTEM = (
     "You convert a Chinese/English user request into a COMPACT JSON intent schema. "
@@ -20,8 +23,8 @@ SYSTEM = (
     "- If not clear, prefer high-level guesses (e.g., superstructure='unknown')."
 )
 
-def run_interpreter(user_text: str) -> str:
-    resp = client.chat.completions.create(
+def _request(user_text: str) -> dict:
+    return dict(
         model=MODELS["LLM_MODEL"],
         temperature=0.0,
         top_p=1,
@@ -31,6 +34,22 @@ def run_interpreter(user_text: str) -> str:
             {"role":"user","content":f"User request:\n{user_text}\nReturn JSON only."}
         ]
     )
-    content = resp.choices[0].message.content
+
+def run_interpreter(user_text: str) -> str:
+    content = cached_chat(get_client(), **_request(user_text))
     log("CommandInterpreter", content)
     return content
+
+async def arun_interpreter(user_text: str) -> str:
+    content = await acached_chat(get_async_client(), **_request(user_text))
+    log("CommandInterpreter", content)
+    return content
+
+def landmark_name(schema: Optional[str]) -> Optional[str]:
+    """从 Interpreter 的 Schema 中提取精准的地标名称（例如 "兰州白塔山"）"""
+    try:
+        if schema:
+            return json.loads(schema).get("entity", {}).get("name")
+    except Exception:
+        pass
+    return None
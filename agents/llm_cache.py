@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# SymbolGeneration/Agent/agents/llm_cache.py
+"""
+chat.completions 的内容寻址缓存。
+key = sha256(规范化 JSON{model, messages, response_format, 其余采样参数})，
+命中则直接返回上次的 message.content，不再请求模型。
+
+模式（config.LLM_CACHE["mode"]，环境变量 LLM_CACHE 可覆盖；单次调用可传 cache=...）：
+  - "on":      先查缓存，未命中再请求并写入
+  - "refresh": 跳过读取，强制请求并覆盖写入
+  - "off":     完全绕过
+"""
+from __future__ import annotations
+import asyncio, hashlib, json
+from typing import Any, Dict, Optional, Tuple
+
+from ..cache import DiskCache
+from ..config import LLM_CACHE
+from ..core import tracing
+from .rate_limiter import arate_limited, estimate_chat_tokens, no_sdk_retry, rate_limited
+from ..utils import OUTPUT_DIR
+
+_store: Optional[DiskCache] = None
+
+def _get_store() -> DiskCache:
+    global _store
+    if _store is None:
+        _store = DiskCache(
+            LLM_CACHE.get("path") or OUTPUT_DIR / "cache" / "llm_cache.sqlite",
+            max_entries=LLM_CACHE.get("max_entries"),
+            max_bytes=LLM_CACHE.get("max_bytes"),
+            default_ttl=LLM_CACHE.get("ttl"),
+        )
+    return _store
+
+def cache_key(**request: Any) -> str:
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _create(client, request: Dict[str, Any]):
+    # 经模型限流器排队；429 由限流器退避重排，不用 SDK 的重试
+    return rate_limited(
+        request.get("model"),
+        lambda: no_sdk_retry(client).chat.completions.create(**request),
+        tokens=estimate_chat_tokens(request),
+        usage=_usage,
+    )
+
+async def _acreate(client, request: Dict[str, Any]):
+    return await arate_limited(
+        request.get("model"),
+        lambda: no_sdk_retry(client).chat.completions.create(**request),
+        tokens=estimate_chat_tokens(request),
+        usage=_usage,
+    )
+
+def _usage(resp) -> Optional[int]:
+    return getattr(getattr(resp, "usage", None), "total_tokens", None)
+
+def _lookup(mode: str, request: Dict[str, Any], sp: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """返回 (key, 命中的 content)；mode="off" 时 key 为 None（不读不写）"""
+    if mode == "off":
+        return None, None
+    key = cache_key(**request)
+    if mode != "refresh":
+        hit: Optional[Dict[str, Any]] = _get_store().get(key)
+        if hit is not None:
+            sp["cache"] = "hit"
+            return key, hit["content"]
+    sp["bytes_out"] = len(json.dumps(request.get("messages"), ensure_ascii=False, default=str))
+    return key, None
+
+def _remember(key: Optional[str], request: Dict[str, Any], content: Optional[str]) -> None:
+    if key is not None and content:
+        _get_store().set(key, {"model": request.get("model"), "content": content})
+
+def cached_chat(client, cache: Optional[str] = None, **request: Any) -> str:
+    """
+    替代 client.chat.completions.create(**request).choices[0].message.content。
+    request 原样透传给 SDK，同时整体参与 key 计算。
+    """
+    mode = cache or LLM_CACHE.get("mode", "on")
+    with tracing.span(f"llm.{request.get('model')}", cat="llm") as sp:
+        key, hit = _lookup(mode, request, sp)
+        if hit is not None:
+            return hit
+        content = _create(client, request).choices[0].message.content
+        _remember(key, request, content)
+        return content
+
+async def acached_chat(client, cache: Optional[str] = None, **request: Any) -> str:
+    """cached_chat 的协程版（client 为 AsyncOpenAI）；与同步版共用缓存与限流。SQLite 读写放到线程里，不卡事件循环"""
+    mode = cache or LLM_CACHE.get("mode", "on")
+    with tracing.span(f"llm.{request.get('model')}", cat="llm") as sp:
+        key, hit = await asyncio.to_thread(_lookup, mode, request, sp)
+        if hit is not None:
+            return hit
+        content = (await _acreate(client, request)).choices[0].message.content
+        await asyncio.to_thread(_remember, key, request, content)
+        return content
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# SymbolGeneration/Agent/agents/lookup_cache.py
+"""
+Grounder 检索结果（百科摘要 / 维基标题与摘要 / 搜图 URL）的磁盘缓存。
+key = 来源 provider + 规范化查询词；值分三类，各自 TTL（config.GROUNDER_CACHE）：
+  - hit:     查到了
+  - miss:    明确查无此条（404、空结果），同样缓存，避免每次都去撞
+  - blocked: 被对方拒绝（403/429/5xx、验证码页），TTL 短，过后再试
+网络异常（超时、DNS 等）不写缓存。模式 on | refresh | off 与 LLM_CACHE 相同。
+离线部署（config.GROUNDER["offline"]）只读缓存，未命中直接当作查无，不发请求。
+另记一类 entity 条目：Grounder 确认过的实体名 / search_focus，gazetteer 建库只收这些查询词的结果。
+"""
+from __future__ import annotations
+import asyncio, re, time, unicodedata
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from ..cache import DiskCache
+from ..config import GROUNDER, GROUNDER_CACHE
+from ..core import tracing
+from ..utils import OUTPUT_DIR
+
+_store: Optional[DiskCache] = None
+_MISSING = object()
+
+
+class Blocked(Exception):
+    """检索请求被对方拒绝（限流 / 反爬），按 blocked 缓存"""
+
+
+def _get_store() -> DiskCache:
+    global _store
+    if _store is None:
+        _store = DiskCache(
+            GROUNDER_CACHE.get("path") or OUTPUT_DIR / "cache" / "grounder_cache.sqlite",
+            max_entries=GROUNDER_CACHE.get("max_entries"),
+            max_bytes=GROUNDER_CACHE.get("max_bytes"),
+        )
+    return _store
+
+
+def normalize_query(q: str) -> str:
+    """全角半角统一、去首尾空白、合并空白、大小写折叠"""
+    q = unicodedata.normalize("NFKC", q or "")
+    return re.sub(r"\s+", " ", q).strip().casefold()
+
+
+def lookup_key(provider: str, query: str) -> str:
+    return f"{provider}:{normalize_query(query)}"
+
+
+def _ttl(status: str) -> Optional[float]:
+    return GROUNDER_CACHE.get(f"ttl_{status}")
+
+
+async def acached_lookup(provider: str, query: str, fetch: Callable[[], Awaitable[Any]],
+                         mode: Optional[str] = None) -> Any:
+    """
+    先查缓存，未命中再 await fetch()。
+    fetch 返回值需可 JSON 序列化，假值视为 miss；抛 Blocked 视为 blocked（返回 None）。
+    """
+    mode = mode or GROUNDER_CACHE.get("mode", "on")
+    offline = bool(GROUNDER.get("offline"))
+    if mode == "off" and not offline:
+        try:
+            return await fetch()
+        except Blocked:
+            return None
+    key = lookup_key(provider, query)
+    with tracing.span(f"lookup.{provider.split(':')[0]}", cat="net") as sp:
+        if mode == "on" or offline:
+            hit: Dict[str, Any] = await asyncio.to_thread(_get_store().get, key, _MISSING)
+            if hit is not _MISSING:
+                sp["cache"] = hit["status"]
+                return hit["value"]
+        if offline:
+            sp["cache"] = "offline"
+            return None
+        try:
+            value = await fetch()
+            status = "hit" if value else "miss"
+        except Blocked as e:
+            print(f"🚫 [{provider}] {query}: {e}")
+            value, status = None, "blocked"
+        sp["status"] = status
+        await asyncio.to_thread(_get_store().set, key, {"status": status, "value": value or None,
+                                                         "fetched_at": time.time()}, ttl=_ttl(status))
+        return value or None
+
+
+def cached_hits(provider: str) -> List[Tuple[str, Any, Optional[float]]]:
+    """某来源下未过期的 hit 条目 [(规范化查询词, 值, 抓取时间)]，给 gazetteer 建库用"""
+    prefix = f"{provider}:"
+    return [(k[len(prefix):], v["value"], v.get("fetched_at"))
+            for k, v in _get_store().items(prefix) if v.get("status") == "hit"]
+
+
+def remember_entities(*names: Optional[str]) -> None:
+    """记下确认过的实体名（Interpreter 的 search_focus、Grounder spec 的 entity.name、预热清单）"""
+    if GROUNDER_CACHE.get("mode", "on") == "off":
+        return
+    for name in {normalize_query(n) for n in names if n}:
+        _get_store().set(lookup_key("entity", name), {"status": "hit", "value": name, "fetched_at": time.time()},
+                         ttl=None)
+
+
+def entity_names() -> Set[str]:
+    return {q for q, _, _ in cached_hits("entity")}
+
+
+def stats() -> Dict[str, Any]:
+    return _get_store().stats()
+
+
+def purge_expired() -> int:
+    return _get_store().purge_expired()
@@ -5,12 +5,8 @@ import json
 from pathlib import Path
 from typing import Dict, Any, Optional, Tuple, List
 
-import cv2
-import numpy as np
-from openai import OpenAI
-
-from ..config import OPENAI_API_KEY, MODELS
-from ..utils import log, save_json
+from ..config import MODELS
+from ..utils import lazy_module, log, save_json
 from .prompt_planner import compile_prompt
 from .grounder_agent import ground_entity_to_spec
 from .spec_infer_agent import infer_structure_spec
@@ -24,7 +20,9 @@ try:
 except Exception:
     png_to_svg = None  # 没有矢量化依赖也可以先跑 PNG
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
 
 
 # ---------- 1) 轮廓/蒙版 ----------
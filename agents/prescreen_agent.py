@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# SymbolGeneration/Agent/agents/prescreen_agent.py
+"""
+本地预筛（纯 OpenCV/NumPy，不调模型）：在送视觉模型评审前给候选图打一个快速分，
+把明显不可用的（几乎空白、照片质感、偏心、非二色调）挡在外面。
+
+各项指标都归一到 0–1（越高越好）：
+  ink_coverage    墨迹占比是否落在合理区间
+  palette         调色板熵低 / 前两种颜色占比高 → 接近二色调
+  stroke          笔画宽度一致性（距离变换脊线上的宽度变异系数）
+  centering       墨迹外接框中心与画布中心的偏移
+  balance         左右 / 上下墨迹分布的留白均衡
+  legibility      缩到 16–48 px 再放大后与原图的 IoU（小尺寸可读性）
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import PRESCREEN
+from ..utils import lazy_module, save_json
+from .vectorizer_agent import estimate_bg_mask_by_border
+
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
+_WORK_SIZE = 256
+_LEGIBILITY_SIZES = (16, 32, 48)
+_WEIGHTS = {
+    "ink_coverage": 0.20,
+    "palette": 0.20,
+    "stroke": 0.10,
+    "centering": 0.15,
+    "balance": 0.10,
+    "legibility": 0.25,
+}
+
+
+def _load_bgr(path: str) -> Optional[np.ndarray]:
+    img = cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+    if img is None:
+        return None
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    elif img.shape[-1] == 4:
+        # 透明处合成白底
+        bgr, alpha = img[:, :, :3], img[:, :, 3:4].astype(np.float32) / 255.0
+        img = (bgr.astype(np.float32) * alpha + 255.0 * (1 - alpha)).astype(np.uint8)
+    h, w = img.shape[:2]
+    scale = _WORK_SIZE / max(h, w)
+    if scale < 1:
+        img = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    return img
+
+
+def _ink_coverage_score(cov: float) -> float:
+    lo, hi = PRESCREEN["ink_range"]
+    if cov <= lo or cov >= hi:
+        return 0.0
+    # 5%–45% 视为理想区间，两端线性衰减
+    if cov < 0.05:
+        return (cov - lo) / (0.05 - lo)
+    if cov > 0.45:
+        return (hi - cov) / (hi - 0.45)
+    return 1.0
+
+
+def _palette_metrics(img: np.ndarray) -> Tuple[float, float]:
+    """返回 (调色板熵 bits, 前两种颜色占比)，颜色量化到每通道 4 bit"""
+    q = (img >> 4).astype(np.int32)
+    codes = (q[:, :, 0] << 8) | (q[:, :, 1] << 4) | q[:, :, 2]
+    counts = np.bincount(codes.ravel(), minlength=4096).astype(np.float64)
+    p = counts[counts > 0] / counts.sum()
+    entropy = float(-(p * np.log2(p)).sum())
+    top2 = float(np.sort(p)[-2:].sum())
+    return entropy, top2
+
+
+def _stroke_uniformity(ink: np.ndarray) -> float:
+    dist = cv2.distanceTransform(ink, cv2.DIST_L2, 3)
+    # 脊线：距离变换的局部极大值
+    ridge = (dist > 0) & (dist >= cv2.dilate(dist, np.ones((3, 3), np.uint8)))
+    widths = dist[ridge] * 2
+    if widths.size < 8:
+        return 0.0
+    cv = float(widths.std() / (widths.mean() + 1e-6))
+    return 1.0 / (1.0 + cv)
+
+
+def _centering(ink: np.ndarray) -> float:
+    ys, xs = np.nonzero(ink)
+    if xs.size == 0:
+        return 0.0
+    h, w = ink.shape
+    cx = (xs.min() + xs.max()) / 2 / w - 0.5
+    cy = (ys.min() + ys.max()) / 2 / h - 0.5
+    return float(max(0.0, 1.0 - 2 * max(abs(cx), abs(cy))))
+
+
+def _balance(ink: np.ndarray) -> float:
+    h, w = ink.shape
+    total = float(ink.sum()) + 1e-6
+    left = float(ink[:, : w // 2].sum())
+    top = float(ink[: h // 2, :].sum())
+    lr = 1.0 - abs(2 * left - total) / total
+    tb = 1.0 - abs(2 * top - total) / total
+    # 桥梁等横向地标上下天然不对称，左右权重更高
+    return 0.7 * lr + 0.3 * tb
+
+
+def _legibility(ink: np.ndarray) -> float:
+    h, w = ink.shape
+    ref = ink > 0
+    if not ref.any():
+        return 0.0
+    ious = []
+    for s in _LEGIBILITY_SIZES:
+        small = cv2.resize(ink.astype(np.float32), (s, s), interpolation=cv2.INTER_AREA)
+        back = cv2.resize((small > 0.5).astype(np.uint8), (w, h), interpolation=cv2.INTER_NEAREST) > 0
+        inter = np.logical_and(ref, back).sum()
+        union = np.logical_or(ref, back).sum()
+        ious.append(inter / union if union else 0.0)
+    return float(np.mean(ious))
+
+
+def score_image(path: str) -> Dict[str, Any]:
+    """单张候选的本地预筛分；usable=False 表示明显不可用，不必送模型评审"""
+    img = _load_bgr(path)
+    if img is None:
+        return {"path": str(path), "score": 0.0, "usable": False, "reason": "unreadable"}
+
+    bg = estimate_bg_mask_by_border(img)           # 255 = 背景
+    ink = (bg == 0).astype(np.uint8)
+    coverage = float(ink.mean())
+    entropy, top2 = _palette_metrics(img)
+
+    metrics = {
+        "ink_coverage": _ink_coverage_score(coverage),
+        "palette": 0.5 * max(0.0, min(1.0, 1 - (entropy - 1.5) / 4.5)) + 0.5 * top2,
+        "stroke": _stroke_uniformity(ink),
+        "centering": _centering(ink),
+        "balance": _balance(ink),
+        "legibility": _legibility(ink),
+    }
+    score = sum(_WEIGHTS[k] * v for k, v in metrics.items())
+
+    reason = None
+    lo, hi = PRESCREEN["ink_range"]
+    if coverage <= lo:
+        reason = "blank"
+    elif coverage >= hi:
+        reason = "flooded"
+    elif entropy > PRESCREEN["max_palette_entropy"]:
+        reason = "photo_texture"
+    elif score < PRESCREEN["min_score"]:
+        reason = "low_score"
+
+    return {
+        "path": str(path),
+        "score": round(score, 4),
+        "usable": reason is None,
+        "reason": reason,
+        "raw": {"ink_ratio": round(coverage, 4), "palette_entropy": round(entropy, 3), "top2_ratio": round(top2, 4)},
+        "metrics": {k: round(v, 4) for k, v in metrics.items()},
+    }
+
+
+def prescreen_candidates(paths: List[str], top_k: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    按预筛分排序，返回前 top_k 个 (path, metrics)；可用的排在前面。
+    全部不可用时仍保留分数最高的一张，保证后续评审至少有一个候选。
+    """
+    top_k = top_k if top_k is not None else PRESCREEN["top_k"]
+    scored = [(p, score_image(p)) for p in paths]
+    scored.sort(key=lambda x: (x[1]["usable"], x[1]["score"]), reverse=True)
+    save_json("Prescreen", [m for _, m in scored])
+
+    keep = [x for x in scored if x[1]["usable"]][:top_k] if top_k else [x for x in scored if x[1]["usable"]]
+    return keep or scored[:1]
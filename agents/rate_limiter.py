@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+# SymbolGeneration/Agent/agents/rate_limiter.py
+"""
+集中式请求调度：按模型的令牌桶（每分钟请求数 rpm / 每分钟 token 数 tpm）限流，
+超额的请求排队等待而不是直接失败；429 时按 Retry-After / 指数退避把该模型整体暂停后重新排队；
+5xx / 连接错误 / 超时只让该请求退避后重排（SDK 自带重试已由 no_sdk_retry 关闭）。
+
+排队顺序按优先级 (来源, 阶段)：
+  来源 origin:  interactive（交互） < batch（批量实验）
+  阶段 phase:   final（最后一轮生成/定稿） < normal < exploratory（探索性采样）
+用 request_priority(origin=..., phase=...) 设置（contextvar，随线程池 copy_context 传递）；
+多智能体运行时可用 set_job_origin(job_id, ...) 按工单登记来源。
+协程里用 arate_limited()，与线程里的 rate_limited() 共用同一组令牌桶和队列。
+"""
+from __future__ import annotations
+import asyncio, contextvars, heapq, itertools, json, random, threading, time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..config import RATE_LIMITS
+from ..core import tracing
+
+ORIGINS = {"interactive": 0, "batch": 1}
+PHASES = {"final": 0, "normal": 1, "exploratory": 2}
+
+_origin: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_origin", default=None)
+_phase: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_phase", default=None)
+_job_origin: Dict[str, str] = {}
+_ASYNC_POLL = 0.05   # 协程排队时检查队首的间隔（秒）
+
+
+@contextmanager
+def request_priority(origin: Optional[str] = None, phase: Optional[str] = None):
+    tokens = []
+    if origin is not None:
+        tokens.append((_origin, _origin.set(origin)))
+    if phase is not None:
+        tokens.append((_phase, _phase.set(phase)))
+    try:
+        yield
+    finally:
+        for var, tok in reversed(tokens):
+            var.reset(tok)
+
+
+def set_job_origin(job_id: str, origin: Optional[str]):
+    if origin is None:
+        _job_origin.pop(job_id, None)
+    else:
+        _job_origin[job_id] = origin
+
+
+def current_priority() -> Tuple[int, int]:
+    origin = _origin.get() or _job_origin.get(tracing.current_job.get() or "") or "interactive"
+    phase = _phase.get() or "normal"
+    return ORIGINS.get(origin, 0), PHASES.get(phase, 1)
+
+
+class _ModelBucket:
+    """单个模型的两只令牌桶 + 优先级等待队列（线程安全）"""
+    def __init__(self, rpm: Optional[float], tpm: Optional[float]):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.req = float(rpm or 0)
+        self.tok = float(tpm or 0)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.cond = threading.Condition()
+        self.heap: List[Tuple[Tuple[int, int], int]] = []
+        self.seq = itertools.count()
+
+    def _refill(self, now: float):
+        dt = now - self.updated
+        self.updated = now
+        if self.rpm:
+            self.req = min(float(self.rpm), self.req + dt * self.rpm / 60.0)
+        if self.tpm:
+            self.tok = min(float(self.tpm), self.tok + dt * self.tpm / 60.0)
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        """距离队首请求可放行还需等待的秒数；0 表示现在即可"""
+        wait = max(0.0, self.paused_until - now)
+        if self.rpm and self.req < 1:
+            wait = max(wait, (1 - self.req) * 60.0 / self.rpm)
+        if self.tpm and self.tok < tokens:
+            wait = max(wait, (tokens - self.tok) * 60.0 / self.tpm)
+        return wait
+
+    def _cap(self, tokens: int) -> int:
+        # 单个超大请求也要能放行
+        return min(tokens, int(self.tpm)) if self.tpm else tokens
+
+    def _try_take(self, entry, tokens: int) -> Optional[float]:
+        """须持有 cond。轮到 entry 且额度足够 → 扣减出队，返回 0；轮到但额度不够 → 返回需等待秒数；未轮到 → None"""
+        now = time.monotonic()
+        self._refill(now)
+        if self.heap[0] != entry:
+            return None
+        wait = self._wait_time(now, tokens)
+        if wait > 0:
+            return wait
+        heapq.heappop(self.heap)
+        if self.rpm:
+            self.req -= 1
+        if self.tpm:
+            self.tok -= tokens
+        self.cond.notify_all()
+        return 0.0
+
+    def _drop(self, entry):
+        """须持有 cond：取消排队"""
+        if entry in self.heap:
+            self.heap.remove(entry)
+            heapq.heapify(self.heap)
+            self.cond.notify_all()
+
+    def acquire(self, tokens: int, priority: Tuple[int, int]):
+        tokens = self._cap(tokens)
+        entry = (priority, next(self.seq))
+        with self.cond:
+            heapq.heappush(self.heap, entry)
+            try:
+                while True:
+                    wait = self._try_take(entry, tokens)
+                    if wait == 0:
+                        return
+                    self.cond.wait(timeout=1.0 if wait is None else wait)
+            except BaseException:
+                self._drop(entry)
+                raise
+
+    async def acquire_async(self, tokens: int, priority: Tuple[int, int]):
+        """协程版：与线程共用同一队列；不占线程，靠短间隔轮询队首"""
+        tokens = self._cap(tokens)
+        entry = (priority, next(self.seq))
+        with self.cond:
+            heapq.heappush(self.heap, entry)
+        try:
+            while True:
+                with self.cond:
+                    wait = self._try_take(entry, tokens)
+                if wait == 0:
+                    return
+                await asyncio.sleep(_ASYNC_POLL if wait is None else wait)
+        except BaseException:
+            with self.cond:
+                self._drop(entry)
+            raise
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """按实际用量修正 tpm 桶（预估多了退回，少了补扣）"""
+        if not self.tpm or actual is None:
+            return
+        with self.cond:
+            self.tok = min(float(self.tpm), self.tok + estimated - actual)
+            self.cond.notify_all()
+
+    def pause(self, seconds: float):
+        with self.cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_buckets: Dict[str, _ModelBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def _bucket(model: str) -> _ModelBucket:
+    with _buckets_lock:
+        b = _buckets.get(model)
+        if b is None:
+            cfg = RATE_LIMITS["models"].get(model) or RATE_LIMITS["default"]
+            b = _buckets[model] = _ModelBucket(cfg.get("rpm"), cfg.get("tpm"))
+        return b
+
+
+def estimate_chat_tokens(request: Dict[str, Any]) -> int:
+    """粗估：文本 ~4 字符/token，每张图按固定 token 计，再加上输出上限"""
+    chars, images = 0, 0
+    for m in request.get("messages") or []:
+        content = m.get("content") if isinstance(m, dict) else None
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if not isinstance(part, dict):
+                    continue
+                if part.get("type") == "image_url":
+                    images += 1
+                else:
+                    chars += len(json.dumps(part, ensure_ascii=False))
+    out = request.get("max_tokens") or request.get("max_completion_tokens") or RATE_LIMITS["default_output_tokens"]
+    return chars // 4 + images * RATE_LIMITS["image_input_tokens"] + int(out)
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    resp = getattr(e, "response", None)
+    headers = getattr(resp, "headers", None) or {}
+    for h in ("retry-after", "Retry-After"):
+        v = headers.get(h) if hasattr(headers, "get") else None
+        if v:
+            try:
+                return float(v)
+            except ValueError:
+                return None
+    return None
+
+
+def _is_rate_limited(e: Exception) -> bool:
+    return getattr(e, "status_code", None) == 429 or type(e).__name__ == "RateLimitError"
+
+
+def _is_transient(e: Exception) -> bool:
+    """SDK 原本会重试的瞬时错误：5xx / 408 / 409、连接错误、超时"""
+    status = getattr(e, "status_code", None)
+    if isinstance(status, int):
+        return status >= 500 or status in (408, 409)
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return True
+    return any(c.__name__ == "APIConnectionError" for c in type(e).__mro__)   # 含 APITimeoutError
+
+
+def _retry_delay(model: str, e: Exception, attempt: int, transient: int) -> Optional[Tuple[float, bool]]:
+    """
+    可重试 → (本次退避秒数, 是否暂停整个模型)；否则 None（调用方直接抛出）。
+    429 暂停该模型；瞬时错误只让本请求退避，最多 RATE_LIMITS["transient_retries"] 次（transient 为已用次数）。
+    """
+    if attempt >= RATE_LIMITS["max_retries"]:
+        return None
+    if _is_rate_limited(e):
+        delay = _retry_after(e) or min(RATE_LIMITS["max_backoff"], RATE_LIMITS["base_backoff"] * 2 ** attempt)
+        delay *= 1 + random.random() * 0.25
+        print(f"⏳ {model} 触发限流 (429)，{delay:.1f}s 后重新排队（第 {attempt + 1} 次）")
+        return delay, True
+    if _is_transient(e) and transient < RATE_LIMITS["transient_retries"]:
+        delay = min(RATE_LIMITS["max_backoff"], RATE_LIMITS["base_backoff"] * 2 ** transient)
+        delay *= 1 + random.random() * 0.25
+        print(f"⚠️ {model} 请求失败（{type(e).__name__}），{delay:.1f}s 后重试（第 {transient + 1} 次）")
+        return delay, False
+    return None
+
+
+def _record_wait(model: str, t0: float, priority: Tuple[int, int]):
+    waited = time.time() - t0
+    if waited > 0.01:
+        tracing.record(f"ratelimit.{model}", t0, waited, cat="queue", priority=list(priority))
+
+
+def _settle(bucket: _ModelBucket, tokens: int, usage: Optional[Callable[[Any], Optional[int]]], resp: Any):
+    if usage is not None:
+        try:
+            bucket.settle(tokens, usage(resp))
+        except Exception:
+            pass
+
+
+def rate_limited(model: str, fn: Callable[[], Any], tokens: int = 0,
+                 usage: Optional[Callable[[Any], Optional[int]]] = None) -> Any:
+    """
+    在模型 model 的限额内执行 fn()；排队期间阻塞当前线程。
+    429 → 暂停该模型（Retry-After 或指数退避）后按原优先级重新排队，最多 RATE_LIMITS["max_retries"] 次；
+    5xx / 连接错误 / 超时 → 本请求退避后重新排队，最多 RATE_LIMITS["transient_retries"] 次。
+    usage(resp) 返回实际 token 数时用于修正 tpm 桶。
+    """
+    bucket = _bucket(model)
+    priority = current_priority()
+    transient = 0
+    for attempt in range(RATE_LIMITS["max_retries"] + 1):
+        t0 = time.time()
+        bucket.acquire(tokens, priority)
+        _record_wait(model, t0, priority)
+        try:
+            resp = fn()
+        except Exception as e:
+            retry = _retry_delay(model, e, attempt, transient)
+            if retry is None:
+                raise
+            delay, pause_model = retry
+            if pause_model:
+                bucket.pause(delay)
+            else:
+                transient += 1
+                time.sleep(delay)
+            continue
+        _settle(bucket, tokens, usage, resp)
+        return resp
+
+
+async def arate_limited(model: str, fn: Callable[[], Awaitable[Any]], tokens: int = 0,
+                        usage: Optional[Callable[[Any], Optional[int]]] = None) -> Any:
+    """rate_limited 的协程版：fn() 返回 awaitable，排队时不阻塞事件循环；与同步调用共用限额"""
+    bucket = _bucket(model)
+    priority = current_priority()
+    transient = 0
+    for attempt in range(RATE_LIMITS["max_retries"] + 1):
+        t0 = time.time()
+        await bucket.acquire_async(tokens, priority)
+        _record_wait(model, t0, priority)
+        try:
+            resp = await fn()
+        except Exception as e:
+            retry = _retry_delay(model, e, attempt, transient)
+            if retry is None:
+                raise
+            delay, pause_model = retry
+            if pause_model:
+                bucket.pause(delay)
+            else:
+                transient += 1
+                await asyncio.sleep(delay)
+            continue
+        _settle(bucket, tokens, usage, resp)
+        return resp
+
+
+def no_sdk_retry(client):
+    """关闭 SDK 自带重试：429 与瞬时错误（5xx / 连接 / 超时）都由本模块按模型退避重排"""
+    with_options = getattr(client, "with_options", None)
+    return with_options(max_retries=0) if with_options else client
@@ -1,16 +1,24 @@
 # -*- coding: utf-8 -*-
 # SymbolGeneration/Agent/agents/reviewer_agent.py
 from __future__ import annotations
-import base64, mimetypes
+import asyncio, copy, hashlib, json, threading
+from collections import OrderedDict
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Any, Dict, Optional
-from openai import OpenAI
+from typing import Any, Dict, List, Optional
 
-from ..config import MODELS, OPENAI_API_KEY
+from ..config import MODELS, REVIEW_CACHE, REVIEW_BATCH
 from ..utils import log, save_json, extract_json
+from .clients import get_async_client, get_client
+from .llm_cache import acached_chat, cached_chat
+from .image_payload import icon_data_url
 from .spec_utils import json_to_constraints
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+
+# 评审结果缓存（进程内 LRU）与在途请求表
+_review_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_review_inflight: Dict[str, Future] = {}
+_review_lock = threading.Lock()
 
 SYSTEM_MSG = (
     "You are a rigorous cartographic reviewer for micro-map icons. "
@@ -21,6 +29,49 @@ SYSTEM_MSG = (
     "set recognizability_score <= 10 and increase structure_penalty by >= 60."
 )
 
+# 多智能体流程的两位审稿人：输出字段相同（Arbiter 融合用），各自只对自己那一侧严格打分
+STRUCTURE_SYSTEM_MSG = (
+    "You are a structural-fidelity reviewer for micro-map icons of real landmarks. "
+    "Judge ONLY whether the drawn structure matches the STRUCTURE MUST / MUST-NOT checklist and the real landmark: "
+    "structural system, span/tower/arch count, proportions and silhouette. Ignore styling and decoration. "
+    "Return ONLY a JSON object with fields: "
+    "{clarity_score:0-100, aesthetic_score:0-100, recognizability_score:0-100, "
+    "structure_penalty:0-100, violations:[], suggestions:[]} "
+    "where clarity_score rates how clearly the structure reads, recognizability_score how identifiable the landmark is, "
+    "and aesthetic_score is a rough guess only. List every structural deviation in violations. "
+    "If MUST structure (e.g., structural_system='truss') is violated (e.g., arch ribs, suspension towers, cables), "
+    "set recognizability_score <= 10 and increase structure_penalty by >= 60."
+)
+
+AESTHETIC_SYSTEM_MSG = (
+    "You are a visual-design reviewer for micro-map icons. "
+    "Judge ONLY how well the icon works as a small map symbol: legibility at 32-64 px, line weight consistency, "
+    "black/white balance, negative space, simplicity and stylistic coherence. Do not re-check engineering details. "
+    "Return ONLY a JSON object with fields: "
+    "{clarity_score:0-100, aesthetic_score:0-100, recognizability_score:0-100, "
+    "structure_penalty:0-100, violations:[], suggestions:[]} "
+    "where clarity_score rates small-size legibility, aesthetic_score the design quality, recognizability_score "
+    "whether the silhouette still reads at a glance; keep structure_penalty low unless the checklist is obviously broken. "
+    "Suggestions should be concrete styling changes."
+)
+
+_SYSTEM_MSGS = {"general": SYSTEM_MSG, "structure": STRUCTURE_SYSTEM_MSG, "aesthetic": AESTHETIC_SYSTEM_MSG}
+
+BATCH_SYSTEM_MSG = (
+    "You are a rigorous cartographic reviewer for micro-map icons. "
+    "You will receive N candidate icons, each preceded by its label 'Candidate #i'. "
+    "Review EACH candidate independently against the same checklist and return ONLY a JSON object: "
+    "{reviews:[{index:int, clarity_score:0-100, aesthetic_score:0-100, recognizability_score:0-100, "
+    "structure_penalty:0-100, violations:[], suggestions:[]}], ranking:[index, ...best first]} "
+    "If MUST structure (e.g., structural_system='truss') is violated (e.g., arch ribs, suspension towers, cables), "
+    "set that candidate's recognizability_score <= 10 and increase its structure_penalty by >= 60."
+)
+
+_PARSE_ERROR = {
+    "clarity_score": 0, "aesthetic_score": 0, "recognizability_score": 0,
+    "structure_penalty": 100, "violations": ["parse_error"], "suggestions": []
+}
+
 def _to_image_content(source: str) -> Dict[str, Any]:
     if not source:
         return {"type": "text", "text": "(no image provided)"}
@@ -29,13 +80,19 @@ def _to_image_content(source: str) -> Dict[str, Any]:
     p = Path(source)
     if not p.exists():
         return {"type": "text", "text": f"(image not found) {source}"}
-    b = p.read_bytes()
-    mime = mimetypes.guess_type(str(p))[0] or "image/png"
-    b64 = base64.b64encode(b).decode("utf-8")
-    return {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{b64}"}}
+    return {"type": "image_url", "image_url": {"url": icon_data_url(p)}}
+
+def _review_key(symbol_input: str, spec_dict: Dict[str, Any], kind: str) -> str:
+    """图像内容哈希 + 规范化结构约束 + 评审类型"""
+    p = Path(symbol_input) if symbol_input and not symbol_input.startswith(("http", "data:")) else None
+    if p is not None and p.exists():
+        img_digest = hashlib.sha256(p.read_bytes()).hexdigest()
+    else:
+        img_digest = hashlib.sha256((symbol_input or "").encode("utf-8")).hexdigest()
+    spec_norm = json.dumps(spec_dict, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(f"{kind}|{img_digest}|{spec_norm}".encode("utf-8")).hexdigest()
 
-def run_reviewer(symbol_input: str, structure_spec: Optional[Dict[str, Any] | str] = None) -> Dict[str, Any]:
-    spec_dict = structure_spec if isinstance(structure_spec, dict) else extract_json(structure_spec or "") or {}
+def _checklist_text(spec_dict: Dict[str, Any]) -> str:
     must, must_not = json_to_constraints(spec_dict)
 
     checklist = []
@@ -43,26 +100,215 @@ def run_reviewer(symbol_input: str, structure_spec: Optional[Dict[str, Any] | st
         checklist.append("STRUCTURE MUST:\n" + "\n".join(f"- {m}" for m in must))
     if must_not:
         checklist.append("STRUCTURE MUST-NOT:\n" + "\n".join(f"- {x}" for x in must_not))
-    checklist_text = "\n".join(checklist) if checklist else "STRUCTURE MUST: (none)\nSTRUCTURE MUST-NOT: (none)"
+    return "\n".join(checklist) if checklist else "STRUCTURE MUST: (none)\nSTRUCTURE MUST-NOT: (none)"
 
+def _review_request(symbol_input: str, spec_dict: Dict[str, Any], kind: str = "general") -> Dict[str, Any]:
+    checklist_text = _checklist_text(spec_dict)
     content_img = _to_image_content(symbol_input)
-
-    resp = client.chat.completions.create(
+    return dict(
         model=MODELS["LLM_MODEL"],
         response_format={"type": "json_object"},
         messages=[
-            {"role": "system", "content": SYSTEM_MSG},
+            {"role": "system", "content": _SYSTEM_MSGS.get(kind, SYSTEM_MSG)},
             {"role": "user", "content": [
                 {"type": "text", "text": f"Review this icon.\n{checklist_text}"},
                 content_img
             ]}
         ]
     )
-    raw = resp.choices[0].message.content
+
+def _parse_review(raw: str) -> Dict[str, Any]:
     log("MapReviewer_raw", raw)
-    data = extract_json(raw) or {
-        "clarity_score": 0, "aesthetic_score": 0, "recognizability_score": 0,
-        "structure_penalty": 100, "violations": ["parse_error"], "suggestions": []
-    }
+    data = extract_json(raw) or copy.deepcopy(_PARSE_ERROR)
     save_json("MapReviewer", data)
     return data
+
+def _review(symbol_input: str, spec_dict: Dict[str, Any], kind: str = "general") -> Dict[str, Any]:
+    return _parse_review(cached_chat(get_client(), **_review_request(symbol_input, spec_dict, kind)))
+
+async def _areview(symbol_input: str, spec_dict: Dict[str, Any], kind: str = "general") -> Dict[str, Any]:
+    # 读图 / 缩放编码放到线程里，不卡事件循环
+    request = await asyncio.to_thread(_review_request, symbol_input, spec_dict, kind)
+    return _parse_review(await acached_chat(get_async_client(), **request))
+
+def _spec_dict(structure_spec: Optional[Dict[str, Any] | str]) -> Dict[str, Any]:
+    return structure_spec if isinstance(structure_spec, dict) else extract_json(structure_spec or "") or {}
+
+def _claim(key: str):
+    """查缓存 / 登记在途请求：返回 (缓存结果, 在途 Future, 是否由本调用负责请求)"""
+    with _review_lock:
+        hit = _review_cache.get(key)
+        if hit is not None:
+            _review_cache.move_to_end(key)
+            return copy.deepcopy(hit), None, False
+        fut = _review_inflight.get(key)
+        owner = fut is None
+        if owner:
+            fut = _review_inflight[key] = Future()
+    return None, fut, owner
+
+def _release(key: str, fut: Future, data: Optional[Dict[str, Any]], exc: Optional[BaseException]) -> None:
+    if exc is not None:
+        fut.set_exception(exc)
+    else:
+        fut.set_result(data)
+        _cache_put(key, data)
+    with _review_lock:
+        _review_inflight.pop(key, None)
+
+def run_reviewer(symbol_input: str, structure_spec: Optional[Dict[str, Any] | str] = None,
+                 kind: str = "general") -> Dict[str, Any]:
+    """
+    kind 区分不同提示词的评审；同一 (图像内容, 结构约束, kind) 只真正请求一次：
+    已有结果直接返回，同时到达的相同请求合并为一次在途调用。
+    """
+    spec_dict = _spec_dict(structure_spec)
+    key = _review_key(symbol_input, spec_dict, kind)
+    hit, fut, owner = _claim(key)
+    if hit is not None:
+        return hit
+    if not owner:
+        return copy.deepcopy(fut.result())
+
+    try:
+        data = _review(symbol_input, spec_dict, kind)
+    except BaseException as e:
+        _release(key, fut, None, e)
+        raise
+    _release(key, fut, data, None)
+    return copy.deepcopy(data)
+
+async def arun_reviewer(symbol_input: str, structure_spec: Optional[Dict[str, Any] | str] = None,
+                        kind: str = "general") -> Dict[str, Any]:
+    """run_reviewer 的协程版；结果缓存与在途合并表和同步版共用"""
+    spec_dict = _spec_dict(structure_spec)
+    key = await asyncio.to_thread(_review_key, symbol_input, spec_dict, kind)
+    hit, fut, owner = _claim(key)
+    if hit is not None:
+        return hit
+    if not owner:
+        return copy.deepcopy(await asyncio.wrap_future(fut))
+
+    try:
+        data = await _areview(symbol_input, spec_dict, kind)
+    except BaseException as e:
+        _release(key, fut, None, e)
+        raise
+    _release(key, fut, data, None)
+    return copy.deepcopy(data)
+
+def _cache_put(key: str, data: Dict[str, Any]) -> None:
+    # 解析失败的兜底结果不缓存，下次重评
+    if "parse_error" in (data.get("violations") or []):
+        return
+    with _review_lock:
+        _review_cache[key] = data
+        while len(_review_cache) > REVIEW_CACHE["max_entries"]:
+            _review_cache.popitem(last=False)
+
+def _batch_request(symbol_inputs: List[str], spec_dict: Dict[str, Any]) -> Dict[str, Any]:
+    content: List[Dict[str, Any]] = [
+        {"type": "text", "text": f"Review these {len(symbol_inputs)} icons.\n{_checklist_text(spec_dict)}"}
+    ]
+    for i, src in enumerate(symbol_inputs):
+        content.append({"type": "text", "text": f"Candidate #{i}"})
+        content.append(_to_image_content(src))
+    return dict(
+        model=MODELS["LLM_MODEL"],
+        response_format={"type": "json_object"},
+        messages=[
+            {"role": "system", "content": BATCH_SYSTEM_MSG},
+            {"role": "user", "content": content}
+        ]
+    )
+
+def _parse_batch(raw: str, n: int) -> List[Optional[Dict[str, Any]]]:
+    """返回与输入同序的结果，模型漏掉的位置为 None"""
+    log("MapReviewer_batch_raw", raw)
+    data = extract_json(raw) or {}
+
+    results: List[Optional[Dict[str, Any]]] = [None] * n
+    for pos, r in enumerate(data.get("reviews") or []):
+        if not isinstance(r, dict):
+            continue
+        idx = r.pop("index", pos)
+        if isinstance(idx, int) and 0 <= idx < len(results) and results[idx] is None:
+            results[idx] = r
+    ranking = [i for i in (data.get("ranking") or []) if isinstance(i, int) and 0 <= i < len(results)]
+    for rank, idx in enumerate(ranking):
+        if results[idx] is not None:
+            results[idx]["batch_rank"] = rank
+    save_json("MapReviewer", [r for r in results if r is not None])
+    return results
+
+def _review_batch(symbol_inputs: List[str], spec_dict: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+    """一次视觉请求评 N 张"""
+    raw = cached_chat(get_client(), **_batch_request(symbol_inputs, spec_dict))
+    return _parse_batch(raw, len(symbol_inputs))
+
+async def _areview_batch(symbol_inputs: List[str], spec_dict: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+    request = await asyncio.to_thread(_batch_request, symbol_inputs, spec_dict)
+    return _parse_batch(await acached_chat(get_async_client(), **request), len(symbol_inputs))
+
+def _batch_plan(symbol_inputs: List[str], spec_dict: Dict[str, Any], kind: str):
+    """
+    先查缓存：返回 (keys, 已命中的结果, 需要合批请求的分块)。
+    合批结果是与同批候选比较出来的分数（还带 batch_rank），单独记在 "{kind}:batch" 下，
+    不能当作 run_reviewer 的单张评审结果复用。
+    """
+    keys = [_review_key(src, spec_dict, f"{kind}:batch") for src in symbol_inputs]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(symbol_inputs)
+    misses: List[int] = []
+    with _review_lock:
+        for i, key in enumerate(keys):
+            hit = _review_cache.get(key)
+            if hit is not None:
+                _review_cache.move_to_end(key)
+                results[i] = copy.deepcopy(hit)
+            else:
+                misses.append(i)
+    step = max(1, int(REVIEW_BATCH["max_images"]))
+    # 单张的分块直接走 run_reviewer（可与在途请求合并）
+    chunks = [c for c in (misses[s:s + step] for s in range(0, len(misses), step)) if len(c) > 1]
+    return keys, results, chunks
+
+def _merge_chunk(keys: List[str], results: List[Optional[Dict[str, Any]]], chunk: List[int],
+                 chunk_results: List[Optional[Dict[str, Any]]]) -> None:
+    for i, r in zip(chunk, chunk_results):
+        if r is not None:
+            _cache_put(keys[i], r)
+            results[i] = copy.deepcopy(r)
+
+def run_reviewer_batch(symbol_inputs: List[str], structure_spec: Optional[Dict[str, Any] | str] = None,
+                       kind: str = "general") -> List[Dict[str, Any]]:
+    """
+    批量评审：把未命中缓存的候选合并进一次（或按 REVIEW_BATCH["max_images"] 分块的几次）视觉请求。
+    返回与输入同序的结果，字段与 run_reviewer 一致（clarity_score / structure_penalty 等），
+    模型给出排名时额外带 batch_rank（0 = 最佳）。
+    批量结果缺失或解析失败的候选回退到单张 run_reviewer。
+    """
+    spec_dict = _spec_dict(structure_spec)
+    keys, results, chunks = _batch_plan(symbol_inputs, spec_dict, kind)
+    for chunk in chunks:
+        _merge_chunk(keys, results, chunk, _review_batch([symbol_inputs[i] for i in chunk], spec_dict))
+
+    for i, r in enumerate(results):
+        if r is None:
+            results[i] = run_reviewer(symbol_inputs[i], spec_dict, kind=kind)
+    return results
+
+async def arun_reviewer_batch(symbol_inputs: List[str], structure_spec: Optional[Dict[str, Any] | str] = None,
+                              kind: str = "general") -> List[Dict[str, Any]]:
+    """run_reviewer_batch 的协程版：各分块与回退的单张评审并发发出"""
+    spec_dict = _spec_dict(structure_spec)
+    keys, results, chunks = await asyncio.to_thread(_batch_plan, symbol_inputs, spec_dict, kind)
+    chunk_results = await asyncio.gather(
+        *(_areview_batch([symbol_inputs[i] for i in chunk], spec_dict) for chunk in chunks))
+    for chunk, rs in zip(chunks, chunk_results):
+        _merge_chunk(keys, results, chunk, rs)
+
+    missing = [i for i, r in enumerate(results) if r is None]
+    singles = await asyncio.gather(*(arun_reviewer(symbol_inputs[i], spec_dict, kind=kind) for i in missing))
+    for i, r in zip(missing, singles):
+        results[i] = r
+    return results
@@ -1,11 +1,11 @@
 # agents/spec_infer_agent.py
 from __future__ import annotations
 from typing import Any, Dict, Optional, List
-from openai import OpenAI
-from ..config import OPENAI_API_KEY, MODELS
+from ..config import MODELS
 from ..utils import save_json, log, extract_json
+from .clients import get_async_client, get_client
+from .llm_cache import acached_chat, cached_chat
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 SYSTEM_MSG = (
     "You are a universal spec planner for image generation. "
@@ -28,7 +28,7 @@ SYSTEM_MSG = (
     "}"
 )
 
-def infer_structure_spec(user_text: str, detector_spec: Optional[str | Dict[str, Any]] = None) -> Dict[str, Any]:
+def _request(user_text: str, detector_spec: Optional[str | Dict[str, Any]]) -> Dict[str, Any]:
     messages = [
         {"role": "system", "content": SYSTEM_MSG},
         {"role": "user", "content": [
@@ -36,14 +36,21 @@ def infer_structure_spec(user_text: str, detector_spec: Optional[str | Dict[str,
             {"type": "text", "text": f"Optional detector context:\n{detector_spec}"} if detector_spec else {"type":"text","text":"(no detector context)"}
         ]}
     ]
-    resp = client.chat.completions.create(
+    return dict(
         model=MODELS["LLM_MODEL"],
         response_format={"type": "json_object"},
         temperature=0.0,
         messages=messages,
     )
-    raw = resp.choices[0].message.content
+
+def _parse(raw: str) -> Dict[str, Any]:
     log("SpecInfer_raw", raw)
     spec = extract_json(raw) or {}
     save_json("SpecInfer", spec)
     return spec
+
+def infer_structure_spec(user_text: str, detector_spec: Optional[str | Dict[str, Any]] = None) -> Dict[str, Any]:
+    return _parse(cached_chat(get_client(), **_request(user_text, detector_spec)))
+
+async def ainfer_structure_spec(user_text: str, detector_spec: Optional[str | Dict[str, Any]] = None) -> Dict[str, Any]:
+    return _parse(await acached_chat(get_async_client(), **_request(user_text, detector_spec)))
@@ -6,16 +6,11 @@ import subprocess
 from pathlib import Path
 from typing import Optional, List
 
-import cv2
-import numpy as np
+from ..utils import lazy_module
 
-# ===== 新增：优先尝试 Python 绑定的 vtracer =====
-try:
-    import vtracer as _vtracer
-    _HAS_VTRACER_PY = True
-except Exception:
-    _HAS_VTRACER_PY = False
-# =================================================
+# cv2 / numpy / vtracer 都在第一次真正矢量化时才导入
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
 
 
 def _run_cli(cmd: List[str]) -> bool:
@@ -26,7 +21,7 @@ def _run_cli(cmd: List[str]) -> bool:
         return False
 
 
-def _estimate_bg_mask_by_border(img_bgr: np.ndarray, tol: int = 28) -> np.ndarray:
+def estimate_bg_mask_by_border(img_bgr: np.ndarray, tol: int = 28) -> np.ndarray:
     """
     用四条边像素估计背景颜色，计算颜色距离 < tol 的像素视为背景。
     返回 0/255 掩码（255=背景）。
@@ -49,7 +44,7 @@ def _prep_no_bg_png(src_png: Path, tol: int = 28) -> Path:
     img = cv2.imread(str(src_png), cv2.IMREAD_COLOR)
     if img is None:
         raise FileNotFoundError(src_png)
-    bgmask = _estimate_bg_mask_by_border(img, tol=tol)  # 255=BG
+    bgmask = estimate_bg_mask_by_border(img, tol=tol)  # 255=BG
     rgba = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
     rgba[bgmask == 255, 3] = 0
     tmp = src_png.with_name(src_png.stem + "_nobg.png")
@@ -87,7 +82,10 @@ def _try_vtracer_py(png_path: Path, out_svg: Path) -> bool:
     使用 Python 版 vtracer 进行多色分层矢量化。
     参照 vtracer_py README 的 convert_image_to_svg_py 参数。
     """
-    if not _HAS_VTRACER_PY:
+    # ===== 优先尝试 Python 绑定的 vtracer =====
+    try:
+        import vtracer as _vtracer
+    except Exception:
         return False
     try:
         _vtracer.convert_image_to_svg_py(
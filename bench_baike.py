@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+SymbolGeneration/Agent/bench_baike.py
+
+百度百科页面解析基准：对保存下来的百科 HTML 逐页比较
+  soup-full      旧实现：BeautifulSoup + html.parser 解析整页
+  soup-strained  bs4 + SoupStrainer，只建需要的子树（没装 lxml 时的路径）
+  lxml           lxml 建树 + 只遍历需要的节点（默认路径）
+的解析耗时，并校验三者提取出的 (摘要, 图片 URL) 完全一致。
+
+夹具是用 --save 抓下来的真实百科页面，随仓库提交在 fixtures/baike/ 下；
+合成页面只用来检查三种解析的输出是否一致，不代表真实页面上的耗时，须显式 --synthetic。
+
+用法：
+    cd SymbolGeneration
+    python -m Agent.bench_baike --save 兰州中山桥 白塔山 黄河母亲   # 抓取页面存为夹具（需联网）
+    python -m Agent.bench_baike                              # fixtures/baike/*.html
+    python -m Agent.bench_baike --fixtures DIR --repeat 20
+    python -m Agent.bench_baike --synthetic                  # 没有夹具时只做一致性检查
+输出不一致时退出码为 1，没有夹具（且未指定 --synthetic）时退出码为 2。
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+PKG_DIR = Path(os.path.abspath(__file__)).parent
+PKG = PKG_DIR.name
+DEFAULT_FIXTURES = PKG_DIR / "fixtures" / "baike"
+
+
+def _parsers() -> Dict[str, Callable[[str], Tuple]]:
+    import importlib
+    g = importlib.import_module(f"{PKG}.agents.grounder_agent")
+    return {
+        "soup-full": lambda html: g._parse_baike_soup(html, strain=False),
+        "soup-strained": g._parse_baike_soup,
+        "lxml": g._parse_baike_lxml,
+    }
+
+
+def synthetic_page(seed: int, n_sections: int = 60) -> str:
+    """结构仿百科词条页：大量脚本 / 导航 / 正文段落，夹带注释、实体、CRLF、嵌套标签和多值 class"""
+    rnd = random.Random(seed)
+    words = "兰州 中山桥 黄河 铁桥 白塔山 桁架 钢结构 清光绪 德国 泰来洋行 修建 全长 米 宽 桥墩 拱形 五孔".split()
+
+    def sent(n: int) -> str:
+        return "".join(rnd.choice(words) for _ in range(n)) + "。"
+
+    head = ["<!DOCTYPE html><html><head><meta charset='utf-8'>",
+            f"<meta property=\"og:title\" content=\"{sent(3)}\">"]
+    if seed % 3:
+        head.append(f"<meta property=\"og:image\" content=\"//bkimg.cdn.bcebos.com/pic/{seed:08x}\">")
+    head += [f"<script>var cfg{i} = {{a: '<div class=\"lemma-summary\">', b: {i}}};</script>" for i in range(40)]
+    head.append("<style>.lemma-summary{color:#333} .basic-info dt{width:80px}</style></head><body>")
+
+    nav = "<div class=\"header\">" + "".join(
+        f"<a href=\"/item/{i}\">{sent(2)}</a>" for i in range(200)) + "</div>"
+    summary = (
+        "<div class=\"lemma-summary J-summary\" label-module=\"lemmaSummary\">\r\n"
+        f"  <div class=\"para\">{sent(20)}<sup>[1]</sup><a href=\"/x\">{sent(3)}</a>&nbsp;&amp;{sent(15)}</div>\r\n"
+        f"  <!-- 注释不算正文 --><div class=\"para\">{sent(30)}<script>track('s')</script><b>{sent(4)}</b></div>\r\n"
+        "</div>"
+    )
+    rows = "".join(
+        f"<dt class=\"basicInfo-item name\">{sent(1)}&nbsp;{i}</dt>"
+        f"<dd class=\"basicInfo-item value\">\r\n{sent(4)}<a>{sent(1)}</a><sup>[{i}]</sup>\r\n</dd>"
+        for i in range(14))
+    basic = f"<div class=\"basic-info J-basic-info cmn-clearfix\"><dl class=\"basicInfo-block\">{rows}</dl></div>"
+    pic = f"<div class=\"summary-pic\"><a href=\"/pic\"><img src=\"/pic/{seed}.jpg\" alt=\"\"></a></div>"
+    body = "".join(
+        f"<div class=\"para-title level-2\"><h2>{sent(2)}</h2></div>"
+        + "".join(f"<div class=\"para\" label-module=\"para\">{sent(40)}<sup>[{j}]</sup></div>" for j in range(6))
+        for _ in range(n_sections))
+    foot = "".join(f"<script src=\"/static/{i}.js\"></script>" for i in range(30)) + "</body></html>"
+    return "".join(head) + nav + pic + summary + basic + body + foot
+
+
+def load_fixtures(root: Path) -> List[Tuple[str, str]]:
+    """[(名称, HTML)]"""
+    files = sorted(root.glob("*.html")) if root.is_dir() else []
+    return [(f.name, f.read_text(encoding="utf-8", errors="replace")) for f in files]
+
+
+def synthetic_fixtures(n: int = 6) -> List[Tuple[str, str]]:
+    return [(f"synthetic-{i}", synthetic_page(i)) for i in range(n)]
+
+
+def save_fixtures(names: List[str], root: Path) -> None:
+    import importlib
+    clients = importlib.import_module(f"{PKG}.agents.clients")
+    g = importlib.import_module(f"{PKG}.agents.grounder_agent")
+
+    async def fetch(name: str) -> None:
+        try:
+            resp = await clients.get_async_http().get(g.BAIDU_BAIKE.format(keyword=name),
+                                                      headers={"User-Agent": g.BROWSER_UA}, timeout=10)
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+            return
+        resp.encoding = "utf-8"
+        # 验证码 / 错误页不能当夹具
+        if resp.status_code != 200 or not g._parse_baike_soup(resp.text, strain=False)[0]:
+            print(f"❌ {name}: HTTP {resp.status_code}，不是正常的词条页，跳过")
+            return
+        path = root / f"{name}.html"
+        path.write_text(resp.text, encoding="utf-8")
+        print(f"💾 {name}: HTTP {resp.status_code}, {len(resp.text) // 1024} KB → {path}")
+
+    async def main() -> None:
+        import asyncio
+        await asyncio.gather(*(fetch(n) for n in names))
+
+    root.mkdir(parents=True, exist_ok=True)
+    clients.run_sync(main())
+
+
+def _time(fn: Callable[[str], Tuple], html: str, repeat: int) -> float:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(html)
+        runs.append(time.perf_counter() - t0)
+    return statistics.median(runs) * 1000.0
+
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description="Baidu Baike extraction benchmark")
+    ap.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES, help="*.html 夹具目录")
+    ap.add_argument("--repeat", type=int, default=10, help="每页重复次数，取中位数")
+    ap.add_argument("--save", nargs="+", metavar="NAME", help="抓取这些词条的页面存到夹具目录后退出")
+    ap.add_argument("--synthetic", action="store_true", help="用合成页面（只检查输出一致性，耗时不作数）")
+    args = ap.parse_args(argv)
+
+    if args.save:
+        save_fixtures(args.save, args.fixtures)
+        return 0
+
+    parsers = _parsers()
+    if args.synthetic:
+        fixtures = synthetic_fixtures()
+        print("⚠️ 使用合成页面：只检查输出一致性，耗时不代表真实百科页面")
+    else:
+        fixtures = load_fixtures(args.fixtures)
+        if not fixtures:
+            print(f"❌ {args.fixtures} 下没有 *.html 夹具；先用 --save 抓取真实页面（或 --synthetic 只做一致性检查）")
+            return 2
+
+    failed = False
+    totals = {name: 0.0 for name in parsers}
+    head = f"{'fixture':<28}{'KB':>6}" + "".join(f"{n:>15}" for n in parsers)
+    print(f"\n{head}\n{'-' * len(head)}")
+    for name, html in fixtures:
+        expected = parsers["soup-full"](html)
+        row = f"{name[:27]:<28}{len(html.encode('utf-8')) // 1024:>6}"
+        for pname, fn in parsers.items():
+            got = fn(html)
+            ms = _time(fn, html, max(1, args.repeat))
+            totals[pname] += ms
+            row += f"{ms:>12.2f} ms" if got == expected else f"{'MISMATCH':>15}"
+            if got != expected:
+                failed = True
+                print(f"❌ {name} [{pname}] 输出不一致:\n   expected={expected!r}\n   got     ={got!r}")
+        print(row)
+
+    base = totals["soup-full"]
+    print("-" * len(head))
+    print(f"{'total':<34}" + "".join(f"{ms:>12.2f} ms" for ms in totals.values()))
+    print(f"{'speedup vs soup-full':<34}" + "".join(f"{base / ms if ms else 0:>14.1f}x" for ms in totals.values()))
+    print("\n✅ identical output on all fixtures" if not failed else "\n❌ extraction output differs")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
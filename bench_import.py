@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+SymbolGeneration/Agent/bench_import.py
+
+冷启动回归检查：用 `python -X importtime` 导入入口模块，解析每个模块的累计导入耗时，
+并确认 cv2 / numpy / PIL / bs4 / openai / requests 等重依赖没有在导入阶段被加载。
+
+用法：
+    cd SymbolGeneration
+    python -m Agent.bench_import                 # 默认检查 orchestrator 与 run_multiagent
+    python -m Agent.bench_import --budget-ms 200 --top 15 Agent.orchestrator
+超出预算或提前加载了重依赖时退出码为 1，可直接放进 CI。
+"""
+from __future__ import annotations
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PKG_DIR = Path(os.path.abspath(__file__)).parent
+PKG = PKG_DIR.name
+
+# 这些依赖只应在真正用到时才导入
+HEAVY = ("cv2", "numpy", "PIL", "bs4", "lxml", "openai", "httpx", "requests")
+DEFAULT_TARGETS = (f"{PKG}.orchestrator", f"{PKG}.run_multiagent")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def measure(module: str) -> Tuple[Dict[str, int], int]:
+    """返回 ({模块: 累计耗时 µs}, 目标模块累计耗时 µs)"""
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "bench")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(PKG_DIR.parent), env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    cumulative: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            cumulative[m.group(4)] = int(m.group(2))
+    return cumulative, cumulative.get(module, 0)
+
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description="import-time regression check")
+    ap.add_argument("targets", nargs="*", default=list(DEFAULT_TARGETS))
+    ap.add_argument("--budget-ms", type=float, default=250.0, help="单个入口模块的累计导入耗时上限")
+    ap.add_argument("--repeat", type=int, default=3, help="重复次数，取中位数")
+    ap.add_argument("--top", type=int, default=10, help="打印最慢的前 N 个模块")
+    args = ap.parse_args(argv)
+
+    failed = False
+    for target in args.targets:
+        runs = [measure(target) for _ in range(max(1, args.repeat))]
+        total_ms = statistics.median(t for _, t in runs) / 1000.0
+        cumulative = runs[-1][0]
+        heavy = sorted({m.split(".")[0] for m in cumulative} & set(HEAVY))
+
+        print(f"\n📦 {target}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms, median of {len(runs)})")
+        for name, us in sorted(cumulative.items(), key=lambda kv: kv[1], reverse=True)[1:args.top + 1]:
+            print(f"   {us / 1000.0:8.1f} ms  {name}")
+        if heavy:
+            print(f"❌ 导入阶段加载了重依赖: {', '.join(heavy)}")
+            failed = True
+        if total_ms > args.budget_ms:
+            print(f"❌ 超出预算 {total_ms - args.budget_ms:.1f} ms")
+            failed = True
+    print("\n✅ import-time check passed" if not failed else "\n❌ import-time check failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# cache.py
+# 通用磁盘键值缓存（SQLite）：TTL 过期 + 按条数/字节数的 LRU 淘汰，线程安全
+from __future__ import annotations
+import atexit, json, sqlite3, threading, time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key        TEXT PRIMARY KEY,
+    value      TEXT NOT NULL,
+    size       INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at);
+"""
+
+_MISSING = object()
+
+class DiskCache:
+    """
+    值需可 JSON 序列化。
+    - ttl：秒；None 表示不过期（set 时可单独指定）
+    - max_entries / max_bytes：超过则按最近访问时间淘汰最旧的条目
+    条数 / 字节数在内存里维护累计值，只有超限（或每 purge_every 次写入清一次过期）时才扫表；
+    读命中的 accessed_at 先记在内存，攒够 touch_batch 条或淘汰前再一次性写回。
+    """
+    def __init__(self, path: Union[str, Path], max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None, default_ttl: Optional[float] = None,
+                 touch_batch: int = 64, purge_every: int = 256):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.touch_batch = touch_batch
+        self.purge_every = purge_every
+        self._touched: Dict[str, float] = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._n, self._size = self._totals()
+        atexit.register(self.flush)
+
+    def _totals(self) -> Tuple[int, int]:
+        return self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+    def _flush_touches(self) -> None:
+        """调用方需持有 _lock"""
+        if self._touched:
+            self._conn.executemany("UPDATE entries SET accessed_at = ? WHERE key = ?",
+                                   [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    def _delete_locked(self, key: str) -> None:
+        row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._n -= 1
+            self._size -= row[0]
+        self._touched.pop(key, None)
+
+    def flush(self) -> None:
+        """把内存里攒着的访问时间写回磁盘"""
+        with self._lock:
+            if self._touched:
+                self._flush_touches()
+                self._conn.commit()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return default
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._delete_locked(key)
+                self._conn.commit()
+                return default
+            self._touched[key] = now
+            if len(self._touched) >= self.touch_batch:
+                self._flush_touches()
+                self._conn.commit()
+        return json.loads(value)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = _MISSING) -> None:
+        ttl = self.default_ttl if ttl is _MISSING else ttl
+        now = time.time()
+        data = json.dumps(value, ensure_ascii=False)
+        expires_at = now + ttl if ttl is not None else None
+        size = len(data.encode("utf-8"))
+        with self._lock:
+            self._delete_locked(key)
+            self._conn.execute(
+                "INSERT INTO entries (key, value, size, created_at, accessed_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, data, size, now, now, expires_at))
+            self._n += 1
+            self._size += size
+            self._writes += 1
+            if self._over_limit() or (self.purge_every and self._writes % self.purge_every == 0):
+                self._evict()
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._delete_locked(key)
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self._touched.clear()
+            self._n, self._size = 0, 0
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+            self._conn.commit()
+            self._n, self._size = self._totals()
+            return cur.rowcount
+
+    def items(self, prefix: str = "") -> List[Tuple[str, Any]]:
+        """按 key 前缀列出未过期的条目（不更新访问时间）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM entries WHERE substr(key, 1, ?) = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)", (len(prefix), prefix, time.time())).fetchall()
+        return [(k, json.loads(v)) for k, v in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            n, size = self._totals()
+        return {"entries": n, "bytes": size, "path": str(self.path)}
+
+    def _over_limit(self) -> bool:
+        return ((self.max_entries is not None and self._n > self.max_entries)
+                or (self.max_bytes is not None and self._size > self.max_bytes))
+
+    def _evict(self) -> None:
+        """调用方需持有 _lock：先清过期，再按 LRU 裁到上限以内；结束后用实际值校正累计值"""
+        self._flush_touches()
+        self._conn.execute(
+            "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        # 同一文件可能被别的进程写过，累计值以表为准
+        n, size = self._totals()
+        if self.max_entries is not None and n > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)", (n - self.max_entries,))
+            n, size = self._totals()
+        if self.max_bytes is not None and size > self.max_bytes:
+            excess = size - self.max_bytes
+            victims, freed = [], 0
+            for key, sz in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at ASC"):
+                victims.append((key,))
+                freed += sz
+                if freed >= excess:
+                    break
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+            n, size = n - len(victims), size - freed
+        self._n, self._size = n, size
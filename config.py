@@ -16,15 +16,192 @@ MODELS = {
     "IMAGE_MODEL":  "gpt-image-1-mini"        # 图像生成（可改：gpt-image-1 / gpt-image-1-mini）
 }
 
+# 共享网络客户端（agents/clients.py）：OpenAI / Grounder 检索走 httpx 连接池（装了 h2 则 HTTP/2），参考图下载走 requests.Session
+CLIENTS = {
+    "http2": True,
+    "max_connections": 64,
+    "max_keepalive": 32,
+    "keepalive_expiry": 30.0,       # 秒
+    "timeout": 120.0,               # 秒，单次请求
+    "connect_timeout": 10.0,
+    "max_retries": 2,               # SDK 自带重试；经限流器的调用会关闭，改由限流器重试（RATE_LIMITS["transient_retries"]）
+    "session_pools": 16,            # requests：按 host 缓存的连接池数
+    "session_pool_size": 32,        # requests：每个 host 的连接数
+}
+
+# Grounder 知识检索（agents/grounder_agent.py）：各查询词 × 百科/维基/搜图并发发出
+# deadline: 整体截止（秒），到点取消未完成的请求；
+# 已拿到 min_snippets 条百科摘要（不超过查询词数）且有一张参考图时提前返回
+# offline: 离线部署，只用本地地名库与检索缓存，不发网络请求；环境变量 GROUNDER_OFFLINE=1 可开启
+GROUNDER = {
+    "deadline": 12.0,
+    "min_snippets": 2,
+    "offline": os.getenv("GROUNDER_OFFLINE", "0") == "1",
+}
+
+# Grounder 检索结果磁盘缓存（agents/lookup_cache.py）：key = 来源 + 规范化查询词
+# 查到 / 查无此条 / 被拦截（403、429、验证码）分别设 TTL；超时等网络异常不缓存
+# mode: on | refresh | off；环境变量 GROUNDER_CACHE 可覆盖
+# 预热：python -m Agent.agents.grounder_agent --warm 兰州中山桥 白塔山
+GROUNDER_CACHE = {
+    "mode": os.getenv("GROUNDER_CACHE", "on"),
+    "path": None,                   # None → outputs/cache/grounder_cache.sqlite
+    "ttl_hit": 30 * 24 * 3600,      # 秒
+    "ttl_miss": 3 * 24 * 3600,
+    "ttl_blocked": 30 * 60,
+    "max_entries": 20000,
+    "max_bytes": 64 * 1024 * 1024,
+}
+
+# 本地地名库（agents/gazetteer.py）：Grounder 先查这里，未命中才上网检索
+# 建库：python -m Agent.agents.gazetteer build [--manual landmarks.json]
+GAZETTEER = {
+    "enabled": True,
+    "path": None,                   # None → outputs/cache/gazetteer.sqlite
+}
+
+# 参考图存储（agents/image_store.py）：按内容 sha256 去重，URL → 文件的映射跨进程稳定
+REFERENCE_IMAGES = {
+    "dir": None,                            # None → outputs/cache/ref_images
+    "max_image_bytes": 20 * 1024 * 1024,    # 单张上限，超过即中止下载
+    "min_image_bytes": 1000,                # 更小的多半是防盗链占位图
+    "max_total_bytes": 512 * 1024 * 1024,   # 总占用上限，超过按最近使用淘汰
+    "fresh_ttl": 7 * 24 * 3600,             # 秒；期内直接用本地文件，过期后用 ETag / Last-Modified 重新验证
+    "evict_grace": 600,                     # 秒；最近这么久内用过的图不淘汰（刚返回给在途任务的路径还要读）
+    "timeout": 15,
+}
+
 # 图像尺寸（受支持：1024x1024 / 1024x1536 / 1536x1024 / "auto"）
 IMAGE_SIZE = "1024x1024"
 
 # 创意采样数量（一次生成多张，随后自动评审挑最佳）
 CREATIVE_SAMPLES = 4
 
+# 候选并发生成：同时在途的图像请求上限、单个请求超时（秒）
+# early_stop_in_flight：可提前停止的流式生成（orchestrator 边生成边评审）的在途上限，
+# 须小于 CREATIVE_SAMPLES，达标时才有还没发出的请求可取消
+GENERATION = {
+    "max_in_flight": 4,
+    "early_stop_in_flight": 2,
+    "timeout": 120,
+}
+
 # 评分阈值（orchestrator 用）
 TARGETS = {
     "clarity": 80,
     "aesthetic": 80,
     "recognizability": 80
 }
+
+# 多智能体运行时：阻塞调用的共享执行器规模
+EXECUTOR = {
+    "threads": 32,      # 预筛 / 图片编码 / 仍是同步调用的 I/O
+    "processes": 2      # 矢量化等 CPU 密集任务
+}
+
+# 每个 Agent 同时处理的消息数上限（按 Agent.name 配置，缺省取 default）
+# 业务 Worker 的 handle 直接 await 协程版 agent（不占线程），可以放得比线程池宽；真正的上游限额由 RATE_LIMITS 控制
+AGENT_CONCURRENCY = {
+    "default": 16,
+    "Planner": 64,            # Planner 的 handle 会长时间等待下游结果
+    "GeneratorWorker": 4,     # 单条消息内部已并发出多张图
+    "VectorizerWorker": 2,
+}
+
+# 常驻多智能体运行时（run_multiagent.MultiAgentRuntime）同时处理的工单上限
+MAX_CONCURRENT_JOBS = 8
+
+# Blackboard 长期记忆（core/memory_store.py）：实体最佳样式 / SVG 等
+# backend: lru（进程内）| sqlite（磁盘，进程重启后保留）
+BLACKBOARD_MEMORY = {
+    "backend": "sqlite",
+    "path": None,                   # None → outputs/cache/blackboard_memory.sqlite
+    "ttl": 90 * 24 * 3600,          # 秒；None 为不过期
+    "max_entries": 10000,
+    "max_bytes": 64 * 1024 * 1024,
+}
+
+# 样式记忆复用（core/memory_agent.recall_style）：同一实体已有新鲜且高分的最佳样式时，
+# Planner / orchestrator 直接拿来生成，跳过 Designer
+STYLE_REUSE = {
+    "enabled": True,
+    "max_age": 30 * 24 * 3600,      # 秒；超过视为过期
+    "min_score": 85,                # clarity/aesthetic/recognizability 均分下限
+}
+
+# 耗时埋点（core/tracing.py）：span 汇总表 + Chrome trace（outputs/traces/*.json，可用 ui.perfetto.dev 打开）
+TRACING = {
+    "enabled": True,
+    "max_events": 200000,           # 内存中保留的最近 span 数
+    "dir": None,                    # None → outputs/traces
+}
+
+# 按模型的请求限额（agents/rate_limiter.py）：超额请求排队，429 时整体暂停该模型后重排
+# rpm: 每分钟请求数；tpm: 每分钟 token 数（None 不限）
+RATE_LIMITS = {
+    "models": {
+        MODELS["LLM_MODEL"]:    {"rpm": 500, "tpm": 200000},
+        MODELS["VISION_MODEL"]: {"rpm": 500, "tpm": 200000},
+        MODELS["IMAGE_MODEL"]:  {"rpm": 20,  "tpm": None},
+    },
+    "default": {"rpm": 500, "tpm": 200000},
+    "default_output_tokens": 1024,  # 请求未给 max_tokens 时按此预估输出
+    "image_input_tokens": 765,      # 每张输入图片预估 token
+    "max_retries": 6,
+    "transient_retries": 2,         # 5xx / 408 / 409 / 连接错误 / 超时：只让该请求退避重试，不暂停整个模型
+    "base_backoff": 1.0,            # 秒，指数退避起点
+    "max_backoff": 60.0,
+}
+
+# Agent 内按 job_id 暂存的中间状态：收到 DONE/ERROR 即清理，
+# 超过该时长（秒）仍未结束的工单也会被回收
+JOB_STATE_TTL = 3600
+
+# Planner 等各阶段结果的超时（秒），按结果主题；生成 / 矢量化在批量负载下要排队等限流，给足时间
+# DETECT_RES 是可选结果，超时就跳过
+PLANNER_TIMEOUTS = {
+    "default": 30.0,
+    "GROUND_RES": 120.0,
+    "SPEC_RES": 120.0,
+    "DESIGN_RES": 180.0,
+    "GEN_RES": 900.0,
+    "VECTOR_RES": 600.0,
+    "DETECT_RES": 5.0,
+}
+
+# chat.completions 内容寻址缓存（agents/llm_cache.py）
+# mode: on | refresh（忽略旧结果重新请求）| off；环境变量 LLM_CACHE 可覆盖
+LLM_CACHE = {
+    "mode": os.getenv("LLM_CACHE", "on"),
+    "path": None,                   # None → outputs/cache/llm_cache.sqlite
+    "ttl": 30 * 24 * 3600,          # 秒
+    "max_entries": 50000,
+    "max_bytes": 512 * 1024 * 1024,
+}
+
+# 评审结果缓存（reviewer_agent.run_reviewer）：按图像内容+结构约束+评审类型去重
+REVIEW_CACHE = {
+    "max_entries": 1024,
+}
+
+# 批量评审（reviewer_agent.run_reviewer_batch）：单次视觉请求最多携带的候选图数量
+REVIEW_BATCH = {
+    "max_images": 4,
+}
+
+# 本地预筛（agents/prescreen_agent.py）：送视觉模型评审前先用 OpenCV/NumPy 打分
+PRESCREEN = {
+    "enabled": True,
+    "top_k": 2,                    # 每轮最多送审 k 个（GeneratorWorker 取预筛分前 k；编排器流式评审取最先可用的 k 个）；0/None 不限
+    "min_score": 0.35,             # 低于此分视为不可用
+    "max_palette_entropy": 6.0,    # 调色板熵（bits）上限，超过视为照片质感
+    "ink_range": (0.01, 0.85),     # 墨迹占比的可用区间
+}
+
+# 视觉请求的图像载荷（agents/image_payload.py）
+# mode: color | gray | binary；fmt: auto | jpeg | png
+IMAGE_PAYLOAD = {
+    "photo": {"max_edge": 1024, "mode": "color", "fmt": "jpeg", "quality": 85},   # Detector 参考照片
+    "icon":  {"max_edge": 512,  "mode": "color", "fmt": "png"},                   # Reviewer 候选图标
+    "cache_max_bytes": 64 * 1024 * 1024,                                          # data URL 缓存上限
+}
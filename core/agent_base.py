@@ -1,27 +1,91 @@
 # Agent/core/agent_base.py
-import asyncio, traceback
-from typing import List, Callable
+import asyncio, contextvars, functools, time, traceback
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Callable, Dict, Optional, Set
 from .messages import Msg
 from .blackboard import Blackboard
+from . import tracing
+from ..config import EXECUTOR, AGENT_CONCURRENCY
+
+# 全部 Agent 共享的执行器：thread 给 LLM/网络 I/O，process 给矢量化等 CPU 密集任务
+_POOLS: Dict[str, Executor] = {}
+
+def _get_pool(mode: str) -> Executor:
+    pool = _POOLS.get(mode)
+    if pool is None:
+        if mode == "process":
+            pool = ProcessPoolExecutor(max_workers=EXECUTOR["processes"])
+        else:
+            pool = ThreadPoolExecutor(max_workers=EXECUTOR["threads"], thread_name_prefix="agent")
+        _POOLS[mode] = pool
+    return pool
 
 class Agent:
-    def __init__(self, name: str, bb: Blackboard, subscriptions: List[str]):
+    """
+    execution:
+      - "inline":  在事件循环里直接调用（只适合很快的纯计算，如 merge/arbiter）
+      - "thread":  run_blocking() 把同步调用丢进共享线程池（LLM / 图像 API / 网络）
+      - "process": run_blocking() 把同步调用丢进共享进程池（矢量化等 CPU 密集任务）
+    concurrency: 该 Agent 同时处理的消息数上限（None → 取 config.AGENT_CONCURRENCY）
+    handle 里直接 await 协程版 agent（arun_* / a*，基于 AsyncOpenAI / httpx.AsyncClient）时无需 run_blocking，
+    保持默认 inline 即可；同一事件循环上可同时挂起大量模型请求而不占线程。
+    """
+    def __init__(self, name: str, bb: Blackboard, subscriptions: List[str],
+                 execution: str = "inline", concurrency: Optional[int] = None):
+        if execution not in ("inline", "thread", "process"):
+            raise ValueError(f"unknown execution mode: {execution}")
         self.name = name
         self.bb = bb
         self.subscriptions = subscriptions
+        # 构造时就登记订阅：start() 之前发布的消息也会进入各自队列
+        self._subs = {topic: bb.subscribe(topic) for topic in subscriptions}
+        self.execution = execution
+        self.concurrency = concurrency or AGENT_CONCURRENCY.get(name, AGENT_CONCURRENCY["default"])
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self._inflight: Set[asyncio.Task] = set()
 
     async def start(self):
         tasks = [asyncio.create_task(self._consume(topic)) for topic in self.subscriptions]
-        await asyncio.gather(*tasks)
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks + list(self._inflight):
+                t.cancel()
 
     async def _consume(self, topic: str):
-        async for msg in self.bb.subscribe(topic):
+        # 每条消息一个 task，task 内由信号量限流；慢消息不会堵住同一主题后面的消息
+        async for msg in self._subs[topic]:
+            task = asyncio.create_task(self._dispatch(msg))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, msg: Msg):
+        # 队列等待 = 发布（msg.ts）到开始处理（含等信号量）；处理耗时包含 run_blocking 里的模型调用
+        # job_context 随 task / run_blocking 复制到线程，下游 LLM / 图像 span 也能归到该工单
+        # 信号量在 task 内 async with：task 开跑前被取消也不会漏还名额
+        async with self._sem:
             try:
-                await self.handle(msg)
+                with tracing.job_context(msg.job_id):
+                    now = time.time()
+                    tracing.record(f"{self.name}.queue", msg.ts, now - msg.ts, cat="queue", topic=msg.topic)
+                    with tracing.span(f"{self.name}:{msg.topic}", cat="agent"):
+                        await self.handle(msg)
             except Exception as e:
                 tb = traceback.format_exc()
-                await self.bb.publish(Msg(topic="pipeline.error", job_id=msg.job_id,
-                                          sender=self.name, payload={"err": str(e), "trace": tb}))
+                # topic：出错的请求主题，Blackboard 据此让等该请求结果的 Future 立即失败
+                await self.bb.publish(Msg(topic="pipeline.error", job_id=msg.job_id, sender=self.name,
+                                          payload={"err": str(e), "trace": tb, "topic": msg.topic}))
+
+    async def run_blocking(self, fn: Callable, *args, **kwargs):
+        """按 execution 模式执行同步函数，避免阻塞 Blackboard 的事件循环"""
+        if self.execution == "inline":
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        if self.execution == "process":
+            # 进程池要求 fn 与参数可 pickle（模块级函数即可）
+            return await loop.run_in_executor(_get_pool("process"), functools.partial(fn, *args, **kwargs))
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(_get_pool("thread"), functools.partial(ctx.run, fn, *args, **kwargs))
 
     async def handle(self, msg: Msg):
         """子类实现：处理消息并 publish 新消息"""
@@ -4,7 +4,9 @@ from statistics import mean
 from typing import Dict, Any, List
 
 from .agent_base import Agent
+from .memory_store import LRUMemoryStore
 from .messages import Msg, TOPICS
+from ..config import JOB_STATE_TTL
 try:
     # 直接复用你项目里的阈值
     from ..config import TARGETS
@@ -14,14 +16,14 @@ except Exception:
 class ArbiterAgent(Agent):
     """
     仲裁器：汇总多位审稿人（structure/aesthetic）的评分，做“收敛/细化”决策。
-    订阅: REVIEW_RES
+    订阅: REVIEW_RES（DONE 用于清理该 job 未配齐的缓冲）
     产出: ARBITER_RES {decision: "stop"|"refine", review: fused_json, raw: [各审稿结果]}
     """
     def __init__(self, bb, required_kinds: List[str] = None):
-        super().__init__("Arbiter", bb, [TOPICS["REVIEW_RES"]])
+        super().__init__("Arbiter", bb, [TOPICS["REVIEW_RES"], TOPICS["DONE"]])
         self.required_kinds = required_kinds or ["structure", "aesthetic"]
-        # 缓冲：job_id -> {"structure": {...}, "aesthetic": {...}}
-        self.buf: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # 缓冲：job_id -> {"structure": {...}, "aesthetic": {...}}；只等到一半的 job 超过 JOB_STATE_TTL 回收
+        self.buf = LRUMemoryStore(max_entries=None, default_ttl=JOB_STATE_TTL)
 
     def _pass_threshold(self, r: Dict[str, Any]) -> bool:
         return (
@@ -58,6 +60,11 @@ class ArbiterAgent(Agent):
         return fused
 
     async def handle(self, msg: Msg):
+        self.buf.purge_expired()
+        if msg.topic == TOPICS["DONE"]:
+            self.buf.delete(msg.job_id)
+            return
+
         # 只处理 reviewer.result
         payload = msg.payload or {}
         kind = payload.get("kind")
@@ -67,8 +74,9 @@ class ArbiterAgent(Agent):
             return
 
         j = msg.job_id
-        slot = self.buf.setdefault(j, {})
+        slot = self.buf.get(j) or {}
         slot[kind] = res
+        self.buf.set(j, slot)
 
         # 收齐所需 reviewer 才决策
         if not all(k in slot for k in self.required_kinds):
@@ -88,4 +96,4 @@ class ArbiterAgent(Agent):
             }
         ))
         # 用完清空，避免内存涨
-        self.buf.pop(j, None)
+        self.buf.delete(j)
@@ -1,29 +1,123 @@
 # Agent/core/blackboard.py
 import asyncio
-from typing import Dict, List, AsyncIterator
-from .messages import Msg
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+from .messages import Msg, TOPICS
+from .memory_store import MemoryStore, make_memory_store
 
-class Blackboard:
-    def __init__(self):
-        self._topics: Dict[str, asyncio.Queue] = {}
-        self._memory: Dict[str, dict] = {}   # 长期记忆键值对：如 entity_key -> {"best_style":..., "svg":...}
+class PipelineError(RuntimeError):
+    """expect() 等待的请求在处理它的 Agent 里出错（该 Agent 发布了 pipeline.error）"""
+
+class Subscription:
+    """一个订阅者在某主题上的独立队列（fan-out：每条消息每个订阅者各收一份）"""
+    def __init__(self, bb: "Blackboard", topic: str):
+        self.bb = bb
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Msg:
+        return await self.queue.get()
 
-    def topic(self, name: str) -> asyncio.Queue:
-        if name not in self._topics:
-            self._topics[name] = asyncio.Queue()
-        return self._topics[name]
+    def close(self):
+        self.bb._unsubscribe(self)
+
+class Blackboard:
+    """
+    - subscribe(topic): fan-out 订阅，调用时立即登记，之后发布的消息不会丢
+    - expect(job_id, topic): 请求/响应关联，按 (job_id, topic) 索引的 Future，投递 O(1)；
+      给了 request_topic 时，处理该请求的 Agent 发布 pipeline.error 会让 Future 立即失败（PipelineError）
+    - memory: mem_get/mem_set 的后端（None → 按 config.BLACKBOARD_MEMORY 创建）
+    """
+    def __init__(self, memory: Optional[MemoryStore] = None):
+        self._subs: Dict[str, List[Subscription]] = {}
+        self._waiters: Dict[Tuple[str, str], Deque[asyncio.Future]] = {}
+        self._by_request: Dict[Tuple[str, str], Set[asyncio.Future]] = {}
+        self._memory: MemoryStore = memory if memory is not None else make_memory_store()   # 长期记忆：如 style:{entity_key} -> {"best":..., "latest_svg":...}
 
     async def publish(self, msg: Msg):
-        await self.topic(msg.topic).put(msg)
+        # ① 关联等待者：同一 (job_id, topic) 按登记顺序各取一条
+        key = (msg.job_id, msg.topic)
+        waiters = self._waiters.get(key)
+        while waiters:
+            fut = waiters.popleft()
+            if not fut.done():
+                fut.set_result(msg)
+                break
+        if waiters is not None and not waiters:
+            self._waiters.pop(key, None)
+        if msg.topic == TOPICS["ERROR"]:
+            self._fail_request(msg)
+
+        # ② 广播给该主题的所有订阅者
+        for sub in self._subs.get(msg.topic, ()):
+            sub.queue.put_nowait(msg)
 
-    async def subscribe(self, topic: str) -> AsyncIterator[Msg]:
-        q = self.topic(topic)
-        while True:
-            yield await q.get()
+    def subscribe(self, topic: str) -> Subscription:
+        sub = Subscription(self, topic)
+        self._subs.setdefault(topic, []).append(sub)
+        return sub
+
+    def _unsubscribe(self, sub: Subscription):
+        subs = self._subs.get(sub.topic, [])
+        if sub in subs:
+            subs.remove(sub)
+
+    def expect(self, job_id: str, topic: str, request_topic: Optional[str] = None) -> asyncio.Future:
+        """
+        登记对 (job_id, topic) 下一条消息的等待。
+        必须在发出请求「之前」登记，否则结果可能先于等待到达而被错过。
+        request_topic：对应的请求主题，处理它的 Agent 出错时 Future 直接失败，不用等到超时。
+        """
+        key = (job_id, topic)
+        req_key = (job_id, request_topic) if request_topic else None
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(fut)
+        if req_key:
+            self._by_request.setdefault(req_key, set()).add(fut)
+        fut.add_done_callback(lambda f: self._discard_waiter(key, f, req_key))
+        return fut
+
+    def discard(self, futs: Iterable[asyncio.Future]):
+        """放弃这些 expect() 的等待（调用方中途失败、不再需要结果时）；等待表随之清理"""
+        for fut in futs:
+            if not fut.done():
+                fut.cancel()
+
+    def _discard_waiter(self, key: Tuple[str, str], fut: asyncio.Future,
+                        req_key: Optional[Tuple[str, str]] = None):
+        # 超时/取消的 Future 及时移除，避免没人回复的 key 一直占着
+        if req_key:
+            futs = self._by_request.get(req_key)
+            if futs is not None:
+                futs.discard(fut)
+                if not futs:
+                    self._by_request.pop(req_key, None)
+        waiters = self._waiters.get(key)
+        if not waiters or fut not in waiters:
+            return
+        waiters.remove(fut)
+        if not waiters:
+            self._waiters.pop(key, None)
+
+    def _fail_request(self, msg: Msg):
+        """pipeline.error 带着出错的请求主题：让等该请求结果的 Future 失败"""
+        payload = msg.payload or {}
+        for fut in list(self._by_request.get((msg.job_id, payload.get("topic")), ())):
+            if not fut.done():
+                fut.set_exception(PipelineError(f"[{msg.sender}] {payload.get('err')}"))
+
+    async def wait_for(self, job_id: str, topic: str, timeout: Optional[float] = None) -> Msg:
+        return await asyncio.wait_for(self.expect(job_id, topic), timeout=timeout)
 
     # —— 记忆读写（给 memory_agent 用）——
     def mem_get(self, key: str, default=None):
         return self._memory.get(key, default)
 
-    def mem_set(self, key: str, value: dict):
-        self._memory[key] = value
+    def mem_set(self, key: str, value: dict, ttl: Optional[float] = None):
+        self._memory.set(key, value, ttl=ttl)
+
+    def mem_delete(self, key: str):
+        self._memory.delete(key)
@@ -0,0 +1,71 @@
+# Agent/core/journal.py
+# 按 job_id 的追加式阶段日志（JSONL，每行一条 Msg），用于崩溃后从第一个缺失阶段继续
+import json, os, threading, uuid
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+from .messages import Msg
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+def _ref_paths(refs: Any) -> Iterable[str]:
+    if isinstance(refs, dict):
+        for v in refs.values():
+            yield from _ref_paths(v)
+    elif isinstance(refs, (list, tuple)):
+        for v in refs:
+            yield from _ref_paths(v)
+    elif isinstance(refs, str) and refs:
+        yield refs
+
+class Journal:
+    """
+    outputs/journal/{job_id}.jsonl
+    - append(topic, payload, refs): 写一行并 fsync；refs 里放产物路径（png/svg/outline…）
+    - records(topic): 按写入顺序回放；refs 指向的文件已不存在的记录视为未完成
+    末尾因崩溃写了一半的行直接忽略。
+    """
+    def __init__(self, job_id: str, root: Optional[Union[str, Path]] = None, sender: str = "orchestrator"):
+        if root is None:
+            from ..utils import OUTPUT_DIR
+            root = OUTPUT_DIR / "journal"
+        self.job_id = job_id
+        self.sender = sender
+        self.path = Path(root) / f"{job_id}.jsonl"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def append(self, topic: str, payload: Dict[str, Any], refs: Optional[Dict[str, Any]] = None) -> Msg:
+        msg = Msg(topic=topic, job_id=self.job_id, sender=self.sender, payload=payload, refs=refs or {})
+        line = json.dumps(asdict(msg), ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return msg
+
+    def records(self, topic: Optional[str] = None, check_refs: bool = True) -> List[Msg]:
+        if not self.path.exists():
+            return []
+        out: List[Msg] = []
+        with self._lock, open(self.path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        for line in lines:
+            try:
+                msg = Msg(**json.loads(line))
+            except Exception:
+                continue
+            if topic is not None and msg.topic != topic:
+                continue
+            if check_refs and not all(Path(p).exists() for p in _ref_paths(msg.refs)):
+                continue
+            out.append(msg)
+        return out
+
+    def last(self, topic: str, check_refs: bool = True) -> Optional[Msg]:
+        recs = self.records(topic, check_refs=check_refs)
+        return recs[-1] if recs else None
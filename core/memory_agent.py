@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 import time
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional
 
 from .agent_base import Agent
+from .memory_store import LRUMemoryStore
 from .messages import Msg, TOPICS
+from ..config import JOB_STATE_TTL, STYLE_REUSE
 
 def _entity_key(merged_spec: Dict[str, Any]) -> str:
     ent = (merged_spec or {}).get("entity") or {}
@@ -13,6 +15,50 @@ def _entity_key(merged_spec: Dict[str, Any]) -> str:
     loc  = str(ent.get("location") or "").strip().lower()
     return f"{name}|{loc}" if (name or loc) else "unknown"
 
+def _review_score(review: Dict[str, Any]) -> Optional[float]:
+    """评审三项分数的均值；一项都没有时为 None"""
+    scores = [review.get(k) for k in ("clarity_score", "aesthetic_score", "recognizability_score")]
+    scores = [float(x) for x in scores if isinstance(x, (int, float))]
+    return sum(scores) / len(scores) if scores else None
+
+def remember_style(mem_get: Callable, mem_set: Callable, ek: str,
+                   style_json: str, review: Dict[str, Any]):
+    """把通过评审的 style_json 记为实体 ek 的“最佳样式”"""
+    record = mem_get(f"style:{ek}", {}) or {}
+    # 只在分数不低于已记住的版本、或旧版本已超过 max_age 时替换，避免好样式被较差的新结果覆盖
+    best = record.get("best") or {}
+    if best.get("style_json") and time.time() - best.get("updated_at", 0) <= STYLE_REUSE["max_age"]:
+        old, new = _review_score(best.get("review") or {}), _review_score(review)
+        if old is not None and (new is None or new < old):
+            return
+    record["best"] = {
+        "style_json": style_json,
+        "review": review,
+        "updated_at": int(time.time()),
+    }
+    mem_set(f"style:{ek}", record)
+
+def recall_style(mem_get: Callable, merged_spec: Dict[str, Any]) -> Optional[str]:
+    """
+    查该实体记住的最佳样式；足够新鲜且均分达到 STYLE_REUSE["min_score"] 才返回 style_json。
+    mem_get: bb.mem_get 或 MemoryStore.get
+    """
+    if not STYLE_REUSE.get("enabled"):
+        return None
+    ek = _entity_key(merged_spec)
+    if ek == "unknown":
+        return None
+    best = (mem_get(f"style:{ek}", {}) or {}).get("best") or {}
+    style_json = best.get("style_json")
+    if not style_json:
+        return None
+    if time.time() - best.get("updated_at", 0) > STYLE_REUSE["max_age"]:
+        return None
+    score = _review_score(best.get("review") or {})
+    if score is None or score < STYLE_REUSE["min_score"]:
+        return None
+    return style_json
+
 class MemoryAgent(Agent):
     """
     轻量“长期记忆”：
@@ -20,7 +66,8 @@ class MemoryAgent(Agent):
     - 监听 DESIGN_RES 暂存当前 style_json（job -> style）
     - 监听 ARBITER_RES 若决策 stop，则把该 job 的 style 记为该实体的“最佳样式”
     - 监听 VECTOR_RES 记录最终 SVG 路径
-    说明：不额外定义 memory.query 主题；Planner/Designer 如需复用，直接用 bb.mem_get(...)
+    - 监听 DONE 清理该 job 的暂存；未结束的 job 超过 JOB_STATE_TTL 自动回收
+    说明：不额外定义 memory.query 主题；Planner 通过 recall_style(bb.mem_get, merged) 复用
     """
     def __init__(self, bb):
         super().__init__("MemoryAgent", bb, [
@@ -28,22 +75,30 @@ class MemoryAgent(Agent):
             TOPICS["DESIGN_RES"],
             TOPICS["ARBITER_RES"],
             TOPICS["VECTOR_RES"],
+            TOPICS["DONE"],
         ])
-        self._job2entity: Dict[str, str] = {}
-        self._job2style: Dict[str, str] = {}
+        self._job2entity = LRUMemoryStore(max_entries=None, default_ttl=JOB_STATE_TTL)
+        self._job2style = LRUMemoryStore(max_entries=None, default_ttl=JOB_STATE_TTL)
 
     async def handle(self, msg: Msg):
-        if msg.topic == TOPICS["MERGE_RES"]:
+        self._job2entity.purge_expired()
+        self._job2style.purge_expired()
+
+        if msg.topic == TOPICS["DONE"]:
+            self._job2entity.delete(msg.job_id)
+            self._job2style.delete(msg.job_id)
+
+        elif msg.topic == TOPICS["MERGE_RES"]:
             merged = msg.payload.get("merged") or {}
             ek = _entity_key(merged)
-            self._job2entity[msg.job_id] = ek
+            self._job2entity.set(msg.job_id, ek)
             # 初始化实体记忆槽
             self.bb.mem_set(f"style:{ek}", self.bb.mem_get(f"style:{ek}", {}))
 
         elif msg.topic == TOPICS["DESIGN_RES"]:
             style_json = msg.payload.get("style_json")
             if style_json:
-                self._job2style[msg.job_id] = style_json
+                self._job2style.set(msg.job_id, style_json)
 
         elif msg.topic == TOPICS["ARBITER_RES"]:
             decision = (msg.payload or {}).get("decision")
@@ -55,17 +110,7 @@ class MemoryAgent(Agent):
             if not ek or not style_json:
                 return
 
-            now = int(time.time())
-            record = self.bb.mem_get(f"style:{ek}", {})
-            # 只要通过仲裁就认为是“最佳样式”的一个版本；可按分数替换/追加
-            best = {
-                "style_json": style_json,
-                "review": fused,
-                "updated_at": now,
-            }
-            # 你也可以在这里做“只保留分数更高的”策略
-            record["best"] = best
-            self.bb.mem_set(f"style:{ek}", record)
+            remember_style(self.bb.mem_get, self.bb.mem_set, ek, style_json, fused)
 
         elif msg.topic == TOPICS["VECTOR_RES"]:
             svg_path = msg.payload.get("svg_path")
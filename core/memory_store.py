@@ -0,0 +1,102 @@
+# Agent/core/memory_store.py
+# Blackboard 长期记忆的可插拔后端：进程内 LRU / SQLite 磁盘（跨进程重启保留）
+import threading, time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+from ..config import BLACKBOARD_MEMORY
+
+class MemoryStore:
+    """mem_get / mem_set 的后端接口；值需可 JSON 序列化（SQLite 后端要求）"""
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+class LRUMemoryStore(MemoryStore):
+    """进程内 LRU：max_entries 超出淘汰最久未访问的；ttl 秒后过期（None 为不过期）"""
+    def __init__(self, max_entries: Optional[int] = 10000, default_ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.default_ttl
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl is not None else None)
+            self._data.move_to_end(key)
+            while self.max_entries is not None and len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            dead = [k for k, (_, exp) in self._data.items() if exp is not None and exp <= now]
+            for k in dead:
+                del self._data[k]
+        return len(dead)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+class SQLiteMemoryStore(MemoryStore):
+    """磁盘持久化（复用 cache.DiskCache）：实体的最佳样式 / SVG 在进程重启后仍可读到"""
+    def __init__(self, path: Union[str, Path], max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None, default_ttl: Optional[float] = None):
+        from ..cache import DiskCache
+        self._cache = DiskCache(path, max_entries=max_entries, max_bytes=max_bytes, default_ttl=default_ttl)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._cache.get(key, default)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if ttl is None:
+            self._cache.set(key, value)
+        else:
+            self._cache.set(key, value, ttl=ttl)
+
+    def delete(self, key: str) -> None:
+        self._cache.delete(key)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+def make_memory_store(cfg: Optional[Dict[str, Any]] = None) -> MemoryStore:
+    """按 config.BLACKBOARD_MEMORY 创建后端；backend: "lru" | "sqlite" """
+    cfg = cfg or BLACKBOARD_MEMORY
+    backend = cfg.get("backend", "lru")
+    if backend == "lru":
+        return LRUMemoryStore(max_entries=cfg.get("max_entries"), default_ttl=cfg.get("ttl"))
+    if backend == "sqlite":
+        path = cfg.get("path")
+        if path is None:
+            from ..utils import OUTPUT_DIR
+            path = OUTPUT_DIR / "cache" / "blackboard_memory.sqlite"
+        return SQLiteMemoryStore(path, max_entries=cfg.get("max_entries"),
+                                 max_bytes=cfg.get("max_bytes"), default_ttl=cfg.get("ttl"))
+    raise ValueError(f"unknown memory backend: {backend}")
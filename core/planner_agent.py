@@ -1,19 +1,38 @@
 # Agent/core/planner_agent.py
 import asyncio
+import contextvars
+from typing import Optional, Set
 from .agent_base import Agent
+from .memory_agent import recall_style
+from .memory_store import LRUMemoryStore
 from .messages import Msg, TOPICS
+from ..config import JOB_STATE_TTL, PLANNER_TIMEOUTS
+
+# 本次 handle 已登记（bb.expect）的结果 Future；每条消息一个 task，contextvar 互不干扰
+_pending: contextvars.ContextVar[Optional[Set[asyncio.Future]]] = contextvars.ContextVar("planner_pending", default=None)
 
 class PlannerAgent(Agent):
     def __init__(self, bb, max_rounds=3):
         super().__init__("Planner", bb, [TOPICS["INTENT_REQ"], TOPICS["ARBITER_RES"]])
-        self.state = {}     # job_id -> {"round":1, "style_json":..., "spec":..., ...}
+        # job_id -> {"round":1, "style_json":..., "spec":..., ...}；DONE 时删除，中途失败的 job 超时回收
+        self.state = LRUMemoryStore(max_entries=None, default_ttl=JOB_STATE_TTL)
         self.max_rounds = max_rounds
 
     async def handle(self, msg: Msg):
-        if msg.topic == TOPICS["INTENT_REQ"]:
-            await self._kickoff(msg)
-        elif msg.topic == TOPICS["ARBITER_RES"]:
-            await self._decide_next(msg)
+        self.state.purge_expired()
+        pending: Set[asyncio.Future] = set()
+        _pending.set(pending)
+        try:
+            if msg.topic == TOPICS["INTENT_REQ"]:
+                await self._kickoff(msg)
+            elif msg.topic == TOPICS["ARBITER_RES"]:
+                await self._decide_next(msg)
+        finally:
+            # 中途超时 / 出错时，已登记但没等到的结果不再需要，别留在 Blackboard 的等待表里
+            for f in pending:
+                if f.done() and not f.cancelled():
+                    f.exception()   # 已失败但没人 await 的，标记为已取回
+            self.bb.discard(pending)
 
     async def _kickoff(self, msg: Msg):
         j = msg.job_id
@@ -22,52 +41,63 @@ class PlannerAgent(Agent):
 
         # ① 并行：Grounder + SpecInfer（有图才发 Detector）
         print("[Planner] → publish GROUND_REQ / SPEC_REQ", flush=True)
-        await self.bb.publish(Msg(topic=TOPICS["GROUND_REQ"], job_id=j, sender=self.name,
-                                  payload={"user_text": user_text}))
-        await self.bb.publish(Msg(topic=TOPICS["SPEC_REQ"], job_id=j, sender=self.name,
-                                  payload={"user_text": user_text}))
+        ground_f = await self._request(j, TOPICS["GROUND_REQ"], TOPICS["GROUND_RES"],
+                                       {"user_text": user_text})
+        spec_f = await self._request(j, TOPICS["SPEC_REQ"], TOPICS["SPEC_RES"],
+                                     {"user_text": user_text})
 
-        detect_msg = None
+        detect_f = None
         if image_path:
             print("[Planner] → publish DETECT_REQ", flush=True)
-            await self.bb.publish(Msg(topic=TOPICS["DETECT_REQ"], job_id=j, sender=self.name,
-                                      payload={"image_path": image_path, "schema": "{\"kind\":\"landmark\"}"}))
+            detect_f = await self._request(j, TOPICS["DETECT_REQ"], TOPICS["DETECT_RES"],
+                                           {"image_path": image_path, "schema": "{\"kind\":\"landmark\"}"})
 
         # ② 等结果（Detector 可选 + 有超时）
-        ground = await self._await_one(j, TOPICS["GROUND_RES"], label="GROUND_RES")
-        spec = await self._await_one(j, TOPICS["SPEC_RES"], label="SPEC_RES")
+        ground = await self._await_one(ground_f, label="GROUND_RES")
+        spec = await self._await_one(spec_f, label="SPEC_RES")
 
         detect = None
-        if image_path:
-            detect = await self._await_optional(j, TOPICS["DETECT_RES"], timeout=5.0, label="DETECT_RES(optional)")
+        if detect_f:
+            detect = await self._await_optional(detect_f, label="DETECT_RES")
 
         # ③ 合并规范
         print("[Planner] → publish MERGE_REQ", flush=True)
-        await self.bb.publish(Msg(topic=TOPICS["MERGE_REQ"], job_id=j, sender=self.name,
-                                  payload={"user_spec": spec.payload.get("spec"),
-                                           "detector_spec": (detect.payload.get("detector") if detect else {}),
-                                           "defaults": ground.payload.get("grounded")}))
-
-        merged = await self._await_one(j, TOPICS["MERGE_RES"], label="MERGE_RES")
-        self.state[j] = {"round": 1, "spec": merged.payload["merged"]}
-
-        # ④ 设计样式
-        print("[Planner] → publish DESIGN_REQ", flush=True)
-        await self.bb.publish(Msg(topic=TOPICS["DESIGN_REQ"], job_id=j, sender=self.name,
-                                  payload={"detector_spec": (detect.payload.get("detector") if detect else "{}"),
-                                           "schema": "{}", "structure_spec": merged.payload["merged"]}))
-        style = await self._await_one(j, TOPICS["DESIGN_RES"], label="DESIGN_RES")
-        self.state[j]["style_json"] = style.payload["style_json"]
+        merged_f = await self._request(j, TOPICS["MERGE_REQ"], TOPICS["MERGE_RES"],
+                                       {"user_spec": spec.payload.get("spec"),
+                                        "detector_spec": (detect.payload.get("detector") if detect else {}),
+                                        "defaults": ground.payload.get("grounded")})
+
+        merged = await self._await_one(merged_f, label="MERGE_RES")
+        st = {"round": 1, "spec": merged.payload["merged"],
+              "max_rounds": msg.payload.get("max_rounds", self.max_rounds)}
+        self.state.set(j, st)
+
+        # ④ 设计样式：该实体记有新鲜的高分样式时直接复用，跳过 Designer
+        style_json = recall_style(self.bb.mem_get, merged.payload["merged"])
+        if style_json:
+            print("[Planner] ♻ reuse remembered style, skip DESIGN_REQ", flush=True)
+            # 仍发一条 DESIGN_RES，MemoryAgent 照常记下本 job 的样式
+            await self.bb.publish(Msg(topic=TOPICS["DESIGN_RES"], job_id=j, sender=self.name,
+                                      payload={"style_json": style_json, "reused": True}))
+        else:
+            print("[Planner] → publish DESIGN_REQ", flush=True)
+            style_f = await self._request(j, TOPICS["DESIGN_REQ"], TOPICS["DESIGN_RES"],
+                                          {"detector_spec": (detect.payload.get("detector") if detect else "{}"),
+                                           "schema": "{}", "structure_spec": merged.payload["merged"]})
+            style = await self._await_one(style_f, label="DESIGN_RES")
+            style_json = style.payload["style_json"]
+        st["style_json"] = style_json
 
         # ⑤ 生成候选
         print("[Planner] → publish GEN_REQ", flush=True)
-        await self.bb.publish(Msg(topic=TOPICS["GEN_REQ"], job_id=j, sender=self.name,
-                                  payload={"style_json": style.payload["style_json"],
-                                           "user_text": user_text,
-                                           "structure_spec": merged.payload["merged"]}))
-        gen = await self._await_one(j, TOPICS["GEN_RES"], label="GEN_RES")
+        gen_f = await self._request(j, TOPICS["GEN_REQ"], TOPICS["GEN_RES"],
+                                    {"style_json": style_json,
+                                     "user_text": user_text,
+                                     "structure_spec": merged.payload["merged"],
+                                     "phase": "final" if st["max_rounds"] <= 1 else "exploratory"})
+        gen = await self._await_one(gen_f, label="GEN_RES")
         best_png = gen.payload["best_png"]
-        self.state[j]["best_png"] = best_png
+        st["best_png"] = best_png
 
         # ⑥ 并行两位审稿人
         print("[Planner] → REVIEW_STRUCT_REQ & REVIEW_AESTH_REQ")
@@ -78,53 +108,55 @@ class PlannerAgent(Agent):
 
     async def _decide_next(self, msg: Msg):
         j = msg.job_id
-        st = self.state.get(j, {"round": 1})
+        st = self.state.get(j)
+        if st is None:
+            # 状态已过期（JOB_STATE_TTL）或工单已结束：没法继续细化，按失败上报而不是 KeyError
+            print(f"[Planner] ✗ no state for job {j} (expired or finished)", flush=True)
+            await self.bb.publish(Msg(
+                topic=TOPICS["ERROR"], job_id=j, sender=self.name,
+                payload={"err": f"planner state for job {j} expired or already finished", "topic": msg.topic}
+            ))
+            return
         decision = (msg.payload or {}).get("decision")
         fused = (msg.payload or {}).get("review") or {}
 
         # ====== 收敛：触发矢量化，再 DONE ======
-        if decision == "stop" or st["round"] >= self.max_rounds:
+        if decision == "stop" or st["round"] >= st.get("max_rounds", self.max_rounds):
             best_png = st.get("best_png")  # 在 _kickoff() / 生成阶段要把 best_png 存入 state
             svg_path = None
             if best_png:
                 print("[Planner] → VECTOR_REQ", flush=True)
-                await self.bb.publish(Msg(
-                    topic=TOPICS["VECTOR_REQ"], job_id=j, sender=self.name,
-                    payload={"png_path": best_png, "method": "auto", "simplify_eps": 1.0}
-                ))
-                vec = await self._await_one(j, TOPICS["VECTOR_RES"], label="VECTOR_RES")
+                vec_f = await self._request(j, TOPICS["VECTOR_REQ"], TOPICS["VECTOR_RES"],
+                                            {"png_path": best_png, "method": "auto", "simplify_eps": 1.0})
+                vec = await self._await_one(vec_f, label="VECTOR_RES")
                 svg_path = (vec.payload or {}).get("svg_path")
 
             await self.bb.publish(Msg(
                 topic=TOPICS["DONE"], job_id=j, sender=self.name,
                 payload={"review": fused, "svg_path": svg_path}
             ))
-            self.state.pop(j, None)
+            self.state.delete(j)
             return
 
         # ====== 继续细化：Designer → Generator → 双审稿人 ======
         st["round"] += 1
-        await self.bb.publish(Msg(
-            topic=TOPICS["REFINE_REQ"], job_id=j, sender=self.name,
-            payload={
-                "prev_style_json": st["style_json"],
-                "review_json": fused,
-                "structure_spec": st["spec"]
-            }
-        ))
-        style = await self._await_one(j, TOPICS["DESIGN_RES"], label="DESIGN_RES")
+        self.state.set(j, st)   # 续期
+        style_f = await self._request(j, TOPICS["REFINE_REQ"], TOPICS["DESIGN_RES"], {
+            "prev_style_json": st["style_json"],
+            "review_json": fused,
+            "structure_spec": st["spec"]
+        })
+        style = await self._await_one(style_f, label="DESIGN_RES")
         st["style_json"] = style.payload["style_json"]
 
         # 新一轮生成
-        await self.bb.publish(Msg(
-            topic=TOPICS["GEN_REQ"], job_id=j, sender=self.name,
-            payload={
-                "style_json": st["style_json"],
-                "user_text": "reuse",
-                "structure_spec": st["spec"]
-            }
-        ))
-        gen = await self._await_one(j, TOPICS["GEN_RES"], label="GEN_RES")
+        gen_f = await self._request(j, TOPICS["GEN_REQ"], TOPICS["GEN_RES"], {
+            "style_json": st["style_json"],
+            "user_text": "reuse",
+            "structure_spec": st["spec"],
+            "phase": "final" if st["round"] >= st.get("max_rounds", self.max_rounds) else "exploratory"
+        })
+        gen = await self._await_one(gen_f, label="GEN_RES")
         best_png = gen.payload["best_png"]
         st["best_png"] = best_png  # ← 记住给收敛时矢量化用
 
@@ -139,22 +171,28 @@ class PlannerAgent(Agent):
             payload={"image_path": best_png, "structure_spec": st["spec"]}
         ))
 
-    async def _await_one(self, job_id: str, topic: str, timeout: float = 30.0, label: str = ""):
-        import time, asyncio
-        start = time.time()
-        q = self.bb.topic(topic)
-        while time.time() - start < timeout:
-            msg = await asyncio.wait_for(q.get(), timeout=timeout)
-            if msg.job_id == job_id:
-                if label: print(f"[Planner] ✓ {label}", flush=True)
-                return msg
-            # 不是我这单的消息：丢回队尾，避免“吃掉别人”的消息
-            await q.put(msg)
-        raise TimeoutError(f"wait {topic} for job {job_id} timeout")
-
-    async def _await_optional(self, job_id: str, topic: str, timeout: float = 2.0, label: str = ""):
+    async def _request(self, job_id: str, req_topic: str, res_topic: str, payload: dict) -> asyncio.Future:
+        """先登记 (job_id, res_topic) 的等待再发请求，结果按工单直接投递，不会被别的工单抢走"""
+        fut = self.bb.expect(job_id, res_topic, request_topic=req_topic)
+        pending = _pending.get()
+        if pending is not None:
+            pending.add(fut)
+        await self.bb.publish(Msg(topic=req_topic, job_id=job_id, sender=self.name, payload=payload))
+        return fut
+
+    async def _await_one(self, fut: asyncio.Future, timeout: float = None, label: str = ""):
+        if timeout is None:
+            timeout = PLANNER_TIMEOUTS.get(label, PLANNER_TIMEOUTS["default"])
+        try:
+            msg = await asyncio.wait_for(fut, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"wait {label or 'result'} timeout")
+        if label: print(f"[Planner] ✓ {label}", flush=True)
+        return msg
+
+    async def _await_optional(self, fut: asyncio.Future, timeout: float = None, label: str = ""):
         try:
-            return await self._await_one(job_id, topic, timeout=timeout, label=label)
+            return await self._await_one(fut, timeout=timeout, label=label)
         except Exception:
             print(f"[Planner] • {label} not available, continue", flush=True)
             return None
@@ -0,0 +1,89 @@
+# Agent/core/stage_dag.py
+import asyncio, inspect
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from . import tracing
+
+class StageFailed(RuntimeError):
+    pass
+
+class StageDAG:
+    """
+    小型阶段依赖图执行器：
+        dag = StageDAG()
+        dag.add("a", fn_a)
+        dag.add("b", fn_b, deps=["a"])
+        results = await dag.run()          # {"a": ..., "b": ...}
+    - fn(results) 收到「已完成阶段」的结果 dict；同步函数进线程池，async 函数直接 await
+    - 互不依赖的阶段并发执行；依赖关系只由 deps 决定
+    - optional=True 的阶段出错时结果记为 None 并继续；必需阶段出错则取消其余阶段并抛 StageFailed
+    """
+    def __init__(self):
+        self._stages: Dict[str, Tuple[Callable, List[str], bool]] = {}
+
+    def add(self, name: str, fn: Callable[[Dict[str, Any]], Any],
+            deps: Iterable[str] = (), optional: bool = False) -> "StageDAG":
+        if name in self._stages:
+            raise ValueError(f"duplicate stage: {name}")
+        self._stages[name] = (fn, list(deps), optional)
+        return self
+
+    def _check(self, done: Dict[str, Any]):
+        for name, (_, deps, _) in self._stages.items():
+            for d in deps:
+                if d not in self._stages and d not in done:
+                    raise ValueError(f"stage {name!r} depends on unknown stage {d!r}")
+        # 环检测（Kahn）
+        indeg = {n: sum(1 for d in deps if d not in done) for n, (_, deps, _) in self._stages.items()}
+        ready = [n for n, k in indeg.items() if k == 0]
+        seen = 0
+        while ready:
+            n = ready.pop()
+            seen += 1
+            for m, (_, deps, _) in self._stages.items():
+                if n in deps:
+                    indeg[m] -= 1
+                    if indeg[m] == 0:
+                        ready.append(m)
+        if seen != len(self._stages):
+            raise ValueError("stage graph has a cycle")
+
+    async def run(self, done: Optional[Dict[str, Any]] = None,
+                  on_done: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """
+        done: 已有结果的阶段（如从日志恢复），不再执行
+        on_done(name, result): 每个阶段完成后回调（如写日志）
+        """
+        results: Dict[str, Any] = dict(done or {})
+        self._check(results)
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def _run_stage(name: str):
+            fn, deps, optional = self._stages[name]
+            for d in deps:
+                if d in tasks:
+                    await tasks[d]
+            try:
+                with tracing.span(f"stage.{name}", cat="stage"):
+                    if inspect.iscoroutinefunction(fn):
+                        out = await fn(results)
+                    else:
+                        out = await asyncio.to_thread(fn, results)
+            except Exception as e:
+                if not optional:
+                    raise StageFailed(f"stage {name!r} failed: {e}") from e
+                print(f"⚠️ {name} 失败: {e}")
+                out = None
+            results[name] = out
+            if on_done is not None:
+                on_done(name, out)
+
+        for name in self._stages:
+            if name not in results:
+                tasks[name] = asyncio.ensure_future(_run_stage(name))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for t in tasks.values():
+                t.cancel()
+            raise
+        return results
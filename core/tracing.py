@@ -0,0 +1,121 @@
+# Agent/core/tracing.py
+# 轻量埋点：按 job / 阶段 / Agent / 模型调用记录耗时 span，汇总 p50/p95/p99，导出 Chrome trace（Perfetto 可直接打开）
+import contextvars, json, math, os, threading, time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Union
+from ..config import TRACING
+
+# 当前 job_id：asyncio task / run_blocking / asyncio.to_thread 都会复制 context，线程里的调用也能归到工单上
+current_job: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_job", default=None)
+
+_events: Deque[Dict[str, Any]] = deque(maxlen=TRACING.get("max_events") or None)
+_lock = threading.Lock()
+
+@contextmanager
+def job_context(job_id: Optional[str]):
+    token = current_job.set(job_id)
+    try:
+        yield
+    finally:
+        current_job.reset(token)
+
+def record(name: str, start: float, duration: float, cat: str = "stage", **args: Any):
+    """start: time.time() 秒；duration: 秒"""
+    if not TRACING.get("enabled", True):
+        return
+    ev = {
+        "name": name, "cat": cat, "start": start, "dur": max(0.0, duration),
+        "job": current_job.get(), "pid": os.getpid(), "tid": threading.get_ident(),
+        "args": args,
+    }
+    with _lock:
+        _events.append(ev)
+
+@contextmanager
+def span(name: str, cat: str = "stage", **args: Any):
+    """
+    with span("llm.gpt-4.1-mini", cat="llm", bytes_out=n) as sp:
+        ...
+        sp["cache"] = "hit"      # 可在块内补充参数
+    """
+    start, t0 = time.time(), time.perf_counter()
+    try:
+        yield args
+    except BaseException as e:
+        args["error"] = type(e).__name__
+        raise
+    finally:
+        record(name, start, time.perf_counter() - t0, cat=cat, **args)
+
+def events(job_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    with _lock:
+        evs = list(_events)
+    return [e for e in evs if job_id is None or e["job"] == job_id]
+
+def _pct(sorted_vals: List[float], q: float) -> float:
+    # nearest-rank
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(q * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+def summary(job_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """按 (cat, name) 聚合：count / total / p50 / p95 / p99 / max（秒）以及上传字节数"""
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for e in events(job_id):
+        groups.setdefault((e["cat"], e["name"]), []).append(e)
+    rows = []
+    for (cat, name), evs in groups.items():
+        d = sorted(e["dur"] for e in evs)
+        rows.append({
+            "cat": cat, "name": name, "count": len(d), "total": sum(d),
+            "p50": _pct(d, 0.50), "p95": _pct(d, 0.95), "p99": _pct(d, 0.99), "max": d[-1],
+            "bytes_out": sum(int(e["args"].get("bytes_out", 0) or 0) for e in evs),
+        })
+    rows.sort(key=lambda r: r["total"], reverse=True)
+    return rows
+
+def format_summary(job_id: Optional[str] = None, title: str = "耗时汇总") -> str:
+    rows = summary(job_id)
+    if not rows:
+        return f"⏱ {title}: (无记录)"
+    head = f"{'cat':<7}{'name':<36}{'n':>5}{'total':>9}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}{'KB out':>9}"
+    lines = [f"⏱ {title}" + (f" [{job_id}]" if job_id else ""), head, "-" * len(head)]
+    for r in rows:
+        lines.append(
+            f"{r['cat'][:6]:<7}{r['name'][:35]:<36}{r['count']:>5}{r['total']:>9.2f}"
+            f"{r['p50']:>8.2f}{r['p95']:>8.2f}{r['p99']:>8.2f}{r['max']:>8.2f}"
+            f"{(r['bytes_out'] / 1024):>9.0f}")
+    return "\n".join(lines)
+
+def print_summary(job_id: Optional[str] = None, title: str = "耗时汇总"):
+    print(format_summary(job_id, title))
+
+def export_chrome_trace(path: Optional[Union[str, Path]] = None, job_id: Optional[str] = None) -> Path:
+    """Chrome trace 事件格式（ph="X"），chrome://tracing 或 ui.perfetto.dev 打开"""
+    if path is None:
+        root = TRACING.get("dir")
+        if root is None:
+            from ..utils import OUTPUT_DIR
+            root = OUTPUT_DIR / "traces"
+        path = Path(root) / f"trace_{job_id or 'all'}_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    trace = [{
+        "name": e["name"], "cat": e["cat"], "ph": "X",
+        "ts": e["start"] * 1e6, "dur": e["dur"] * 1e6,
+        "pid": e["pid"], "tid": e["tid"],
+        "args": {"job": e["job"], **e["args"]},
+    } for e in events(job_id)]
+    path.write_text(json.dumps({"traceEvents": trace, "displayTimeUnit": "ms"}, ensure_ascii=False, default=str),
+                    encoding="utf-8")
+    return path
+
+def clear(job_id: Optional[str] = None):
+    with _lock:
+        if job_id is None:
+            _events.clear()
+            return
+        keep = [e for e in _events if e["job"] != job_id]
+        _events.clear()
+        _events.extend(keep)
@@ -1,25 +1,37 @@
 # -*- coding: utf-8 -*-
 # 文件路径: SymbolGeneration/Agent/orchestrator.py
 from __future__ import annotations
+import asyncio
+import contextvars
 import os
-import requests
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
 from typing import Optional, Union, Dict, Any, List, Tuple
 
 # --- Agents ---
-from .agents.interpreter_agent import run_interpreter
-from .agents.detector_agent import run_detector
+from .agents.interpreter_agent import arun_interpreter, landmark_name
+from .agents.detector_agent import arun_detector
 from .agents.extractor_agent import run_extractor
 from .agents.designer_agent import run_designer, refine_designer
-from .agents.generator_agent import run_generator
+from .agents.generator_agent import start_generation
 from .agents.reviewer_agent import run_reviewer
+from .agents.prescreen_agent import score_image
 
-from .agents.grounder_agent import ground_entity_to_spec, _search_baidu_image  # <--- 引入百度搜图
+from .agents.grounder_agent import aground_entity_to_spec, _asearch_baidu_image  # <--- 引入百度搜图
 from .agents.spec_utils import merge_specs, normalize_spec
-from .agents.spec_infer_agent import infer_structure_spec
+from .agents.spec_infer_agent import ainfer_structure_spec
 from .agents.vectorizer_agent import png_to_svg
 from .agents.photo_symbol_agent import photo_to_symbol
-from .config import TARGETS
+from .agents.clients import run_sync
+from .agents.image_store import fetch_reference_image
+from .agents.rate_limiter import request_priority
+from .config import TARGETS, CREATIVE_SAMPLES, PRESCREEN
+from .core.memory_agent import _entity_key, recall_style, remember_style
+from .core.memory_store import MemoryStore, make_memory_store
+from .core import tracing
+from .core.journal import Journal, new_job_id
+from .core.stage_dag import StageDAG
+from .utils import save_json
 
 
 def pass_threshold(r: dict) -> bool:
@@ -31,6 +43,87 @@ def pass_threshold(r: dict) -> bool:
     )
 
 
+def total_score(r: Dict[str, Any]) -> float:
+    return (
+            float(r.get("clarity_score", 0)) +
+            float(r.get("aesthetic_score", 0)) +
+            float(r.get("recognizability_score", 0)) -
+            0.5 * float(r.get("structure_penalty", 0))
+    )
+
+
+def _generate_and_review(
+        outline_path: Optional[str],
+        style_json: str,
+        user_text: str,
+        structure_spec: Dict[str, Any],
+) -> Tuple[List[Tuple[str, Dict[str, Any]]], bool, Dict[str, Dict[str, Any]]]:
+    """
+    流式生成+评审：每张候选一落盘先做本地预筛，可用的立刻送审，不等整轮生成结束；
+    送审数与 GeneratorWorker 一样受 PRESCREEN["top_k"] 限制，名额用完就取消剩余的生成。
+    一旦有候选达到 pass_threshold，取消仍在排队的生成/评审并提前结束本轮。
+    全部被预筛挡下时，仍把预筛分最高的一张送审。
+    返回 (已评审的 [(png, review)], 是否提前达标, {png: 预筛指标})。
+    """
+    batch = start_generation(
+        outline_path=outline_path,
+        style_json=style_json,
+        user_text=user_text,
+        structure_spec=structure_spec,
+    )
+    review_pool = ThreadPoolExecutor(max_workers=max(1, int(CREATIVE_SAMPLES)), thread_name_prefix="review")
+    gen_pending = set(batch.futures)
+    review_pending: Dict[Future, str] = {}
+    scored: List[Tuple[str, Dict[str, Any]]] = []
+    screens: Dict[str, Dict[str, Any]] = {}
+    screened_out: List[str] = []
+    passed = False
+    top_k = PRESCREEN["top_k"] if PRESCREEN["enabled"] else None
+    submitted = 0
+
+    def _submit_review(path: str):
+        nonlocal submitted
+        rf = review_pool.submit(contextvars.copy_context().run,
+                                run_reviewer, path, structure_spec=structure_spec)
+        review_pending[rf] = path
+        submitted += 1
+        if top_k and submitted >= top_k and gen_pending:
+            # 送审名额已满，剩下的候选生成出来也不会评审
+            print(f"✂️ 已送审 {submitted} 张（top_k），取消本轮剩余的生成")
+            batch.cancel()
+            gen_pending.clear()
+
+    try:
+        while (gen_pending or review_pending) and not passed:
+            done, _ = wait(gen_pending | set(review_pending), return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut in gen_pending:
+                    gen_pending.discard(fut)
+                    path = fut.result()
+                    if not isinstance(path, str) or path.startswith("http"):
+                        continue
+                    if PRESCREEN["enabled"]:
+                        screens[path] = score_image(path)
+                        if not screens[path]["usable"]:
+                            print(f"🧹 预筛淘汰 ({screens[path]['reason']}): {path}")
+                            screened_out.append(path)
+                            continue
+                    _submit_review(path)
+                elif fut in review_pending:
+                    path = review_pending.pop(fut)
+                    review = fut.result()
+                    scored.append((path, review))
+                    passed = passed or pass_threshold(review)
+            if not gen_pending and not review_pending and not scored and screened_out:
+                _submit_review(max(screened_out, key=lambda x: screens[x]["score"]))
+    finally:
+        batch.cancel()
+        review_pool.shutdown(wait=False, cancel_futures=True)
+    if screens:
+        save_json("Prescreen", list(screens.values()))
+    return scored, passed, screens
+
+
 def _is_bridge(user_text: str, *specs) -> bool:
     txt = (user_text or "").lower()
     if ("桥" in txt) or ("bridge" in txt):
@@ -41,164 +134,149 @@ def _is_bridge(user_text: str, *specs) -> bool:
     return False
 
 
-# [修复版] 下载函数：必须加 Referer
-def _download_temp_image(url: str) -> Optional[str]:
-    print(f"⬇️ 正在下载参考图: {url[:50]}...")
-    try:
-        from .utils import BASE_DIR
-        out_dir = BASE_DIR / "outputs" / "temp_downloads"
-        out_dir.mkdir(parents=True, exist_ok=True)
-
-        fname = "auto_ref_" + str(hash(url))[:8] + ".jpg"
-        local_path = out_dir / fname
-
-        # [核心] 破解百度防盗链的 Headers
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Referer": "https://image.baidu.com/"
-        }
-
-        # 增加 verify=False 可选，防止 SSL 报错
-        resp = requests.get(url, headers=headers, timeout=15)
-
-        if resp.status_code == 200:
-            if len(resp.content) < 1000:
-                print("⚠️ 下载图片过小，可能是防盗链占位图")
-                return None
-            local_path.write_bytes(resp.content)
-            print(f"✅ 参考图下载完成: {local_path}")
-            return str(local_path)
-        else:
-            print(f"⚠️ 下载失败，状态码: {resp.status_code}")
-    except Exception as e:
-        print(f"⚠️ 下载异常: {e}")
-    return None
+_memory: Optional[MemoryStore] = None
 
 
-def run_micromap_experiment(
-        image_path: Optional[str],
-        user_text: str,
-        user_structure_spec: Optional[Union[Dict[str, Any], str]] = None,
-        max_rounds: int = 3,
-        force_entity_type: Optional[str] = None,
-) -> Dict[str, Any]:
-    print("\n🚀 启动 Multi-Agent MicroMap-Agent 实验流程")
-    print("📌 文本描述:", user_text)
-    if image_path:
-        print("📷 引用参考图像:", image_path)
+def _memory_store() -> MemoryStore:
+    """与 Blackboard 同一个持久化记忆（config.BLACKBOARD_MEMORY），两条流程互相复用样式"""
+    global _memory
+    if _memory is None:
+        _memory = make_memory_store()
+    return _memory
 
-    # 1. Interpreter
-    schema = run_interpreter(user_text)
-    print("✅ Interpreter 完成")
 
-    # [新增] 从 Schema 中提取精准的地标名称
-    target_landmark_name = None
-    try:
-        import json
-        if schema:
-            schema_data = json.loads(schema)
-            # 获取 entity.name (例如 "兰州白塔山")
-            target_landmark_name = schema_data.get("entity", {}).get("name")
-            print(f"🎯 提取到精准地标名称: {target_landmark_name}")
-    except Exception:
-        pass
-
-    # 2. Detector (如果一开始就有图)
-    detector_spec: Optional[str] = None
-    outline_path: Optional[str] = None
-    if image_path:
-        try:
-            detector_spec = run_detector(image_path, schema)
-            print("✅ Detector 完成")
-        except Exception as e:
-            print(f"⚠️ Detector 失败: {e}")
+def _build_stages(image_path: Optional[str], user_text: str) -> StageDAG:
+    """
+    前置阶段的依赖图（同层阶段并发执行）：
+        interpreter ──> grounder ──┐
+                                   ├─> reference ──> detector ──> spec_infer
+        (已有 image_path 时 reference 无依赖)   └──> extractor
+    有参考图时 Detector / Extractor 立即启动，与 Interpreter、Grounder 并行；
+    没有时需等 Grounder 给出参考图链接（或兜底搜图）后再跑。
+    模型 / 检索阶段是协程（AsyncOpenAI / httpx），在 DAG 的事件循环上直接并发；轮廓提取等同步阶段走线程。
+    """
+    dag = StageDAG()
+
+    async def interpreter(_):
+        schema = await arun_interpreter(user_text)
+        print("✅ Interpreter 完成")
+        return schema
+
+    async def grounder(res):
+        target_landmark_name = landmark_name(res["interpreter"])
+        print(f"🎯 提取到精准地标名称: {target_landmark_name}")
         try:
-            outline_path = run_extractor(image_path)
-            print(f"✅ Outline 提取完成")
+            spec = await aground_entity_to_spec(user_text, search_focus=target_landmark_name)
+            print("✅ Grounder 完成")
+            return spec
         except Exception as e:
-            print(f"⚠️ Outline 提取失败: {e}")
-
-    # 3. Grounder
-    grounder_spec: Optional[Dict[str, Any]] = None
-    try:
-        # [关键修改] 把提取到的名字传进去！
-        grounder_spec = ground_entity_to_spec(user_text, search_focus=target_landmark_name)
-        print("✅ Grounder 完成")
-    except Exception as e:
-        print(f"⚠️ Grounder 失败: {e}")
-        grounder_spec = None
-
-    # === 自主视觉检索增强 ===
-    if not image_path:
+            print(f"⚠️ Grounder 失败: {e}")
+            return None
+
+    async def reference(res):
+        if image_path:
+            return image_path
+        # === 自主视觉检索增强 ===
+        grounder_spec = res.get("grounder")
         auto_url = None
         if grounder_spec and grounder_spec.get("reference_image_url"):
             auto_url = grounder_spec["reference_image_url"]
             print(f"🤖 [Auto-Visual] Grounder 提供了参考图链接")
         else:
-            # [关键修改] 兜底时也用精准名字搜！
+            target_landmark_name = landmark_name(res.get("interpreter"))
             search_query = target_landmark_name if target_landmark_name else user_text
             print(f"🔎 [Auto-Visual] 尝试自主搜图 (关键词: {search_query})...")
             try:
-                auto_url = _search_baidu_image(search_query)
+                auto_url = await _asearch_baidu_image(search_query)
             except Exception as e:
                 print(f"⚠️ 兜底搜图失败: {e}")
+        if auto_url and os.path.isfile(auto_url):
+            downloaded_path = auto_url   # 本地地名库给的是本地文件
+        else:
+            downloaded_path = await asyncio.to_thread(fetch_reference_image, auto_url) if auto_url else None
+        if downloaded_path:
+            print(f"📷 视觉参考已就绪: {downloaded_path}")
+        else:
+            print("⚠️ 警告: 未能获取参考图，系统将仅依赖文本生成")
+        return downloaded_path
 
-        # 如果拿到了 URL，就下载并强行注入 image_path
-        if auto_url:
-            downloaded_path = _download_temp_image(auto_url)
-            if downloaded_path:
-                image_path = downloaded_path
-                print(f"📷 视觉参考已就绪: {image_path}")
-
-                # 补跑 Detector
-                if not detector_spec:
-                    print("🕵️ 启动 Detector (基于自动检索图)...")
-                    try:
-                        detector_spec = run_detector(image_path, schema)
-                        print("✅ Detector 补跑完成")
-                    except Exception as e:
-                        print(f"⚠️ Detector 补跑失败: {e}")
-
-                # 补跑 Outline
-                if not outline_path:
-                    try:
-                        outline_path = run_extractor(image_path)
-                        print(f"✅ Outline 补跑完成")
-                    except Exception as e:
-                        print(f"⚠️ Outline 补跑失败: {e}")
-
-    if not image_path:
-        print("⚠️ 警告: 未能获取参考图，系统将仅依赖文本生成")
-    # ==========================================
-
-    # 4. SpecInfer
-    infer_spec: Optional[Dict[str, Any]] = None
-    try:
-        infer_spec = infer_structure_spec(user_text, detector_spec)
-        print("✅ SpecInfer 完成")
-    except Exception as e:
-        print(f"⚠️ SpecInfer 失败: {e}")
-        infer_spec = None
-
-    # 5. Merge Specs
-    merged: Dict[str, Any] = {}
-    if grounder_spec: merged = merge_specs(defaults=grounder_spec)
-    if infer_spec: merged = merge_specs(user_spec=merged, detector_spec=infer_spec)
-    if detector_spec: merged = merge_specs(user_spec=merged, detector_spec=detector_spec)
-    if user_structure_spec: merged = merge_specs(user_spec=user_structure_spec, detector_spec=merged)
-
-    structure_spec = normalize_spec(merged or {})
-    if force_entity_type: structure_spec["entity_type"] = force_entity_type
-    is_bridge = _is_bridge(user_text, structure_spec, infer_spec, grounder_spec)
+    async def detector(res):
+        if not res["reference"]:
+            return None
+        try:
+            # run_detector 不使用 schema，因此无需等待 Interpreter
+            spec = await arun_detector(res["reference"])
+            print("✅ Detector 完成")
+            return spec
+        except Exception as e:
+            print(f"⚠️ Detector 失败: {e}")
+            return None
 
-    print("📐 最终结构约束:", structure_spec)
+    def extractor(res):
+        if not res["reference"]:
+            return None
+        try:
+            outline_path = run_extractor(res["reference"])
+            print(f"✅ Outline 提取完成")
+            return outline_path
+        except Exception as e:
+            print(f"⚠️ Outline 提取失败: {e}")
+            return None
 
-    # 6. Designer
-    landmark_json = detector_spec or schema
-    style_json = run_designer(landmark_json=landmark_json, schema=schema, structure_spec=structure_spec)
-    print("🎨 初始样式 JSON 已生成")
+    async def spec_infer(res):
+        try:
+            spec = await ainfer_structure_spec(user_text, res["detector"])
+            print("✅ SpecInfer 完成")
+            return spec
+        except Exception as e:
+            print(f"⚠️ SpecInfer 失败: {e}")
+            return None
+
+    dag.add("interpreter", interpreter)
+    dag.add("grounder", grounder, deps=["interpreter"])
+    dag.add("reference", reference, deps=[] if image_path else ["interpreter", "grounder"])
+    dag.add("detector", detector, deps=["reference"])
+    dag.add("extractor", extractor, deps=["reference"])
+    dag.add("spec_infer", spec_infer, deps=["detector"])
+    return dag
+
+
+def _design_and_iterate(
+        schema: Optional[str],
+        detector_spec: Optional[Dict[str, Any]],
+        outline_path: Optional[str],
+        user_text: str,
+        structure_spec: Dict[str, Any],
+        max_rounds: int,
+        journal: Journal,
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Designer → 生成/评审/精修循环 → Vectorizer，返回 (best_png, best_svg)。
+    每步结果写入 journal；日志里已有的样式 / 轮次 / 精修 / SVG 直接回放，不再重复调用。
+    """
+    memory = _memory_store()
+    ek = _entity_key(structure_spec)
+
+    # 6. Designer（该实体记有新鲜的高分样式时直接复用，跳过 Designer）
+    rec = journal.last("stage.designer")
+    if rec:
+        style_json = rec.payload["style_json"]
+        print("↩️ 从日志恢复初始样式 JSON")
+    else:
+        style_json = recall_style(memory.get, structure_spec)
+        reused = bool(style_json)
+        if reused:
+            print(f"♻️ 复用实体 [{ek}] 记忆中的最佳样式，跳过 Designer")
+        else:
+            landmark_json = detector_spec or schema
+            with tracing.span("stage.designer", cat="stage"):
+                style_json = run_designer(landmark_json=landmark_json, schema=schema, structure_spec=structure_spec)
+            print("🎨 初始样式 JSON 已生成")
+        journal.append("stage.designer", {"style_json": style_json, "reused": reused})
 
     # 7. Generator Loop
+    done_rounds = {m.payload["round"]: m.payload for m in journal.records("round")}
+    refined = {m.payload["round"]: m.payload["style_json"] for m in journal.records("refine")}
     history: List[Dict[str, Any]] = []
     best_png: Optional[str] = None
     best_review: Optional[Dict[str, Any]] = None
@@ -206,39 +284,44 @@ def run_micromap_experiment(
 
     for round_id in range(1, max_rounds + 1):
         print(f"\n===== 🌀 Round {round_id} / {max_rounds} =====")
-        candidate_paths = run_generator(
-            outline_path=outline_path,
-            style_json=style_json,
-            user_text=user_text,
-            structure_spec=structure_spec,
-        )
-        candidate_paths = [p for p in candidate_paths if isinstance(p, str) and not p.startswith("http")]
-
-        if not candidate_paths:
-            print("⚠️ 本轮未生成候选图片，终止循环。")
-            break
-
-        scored: List[Tuple[str, Dict[str, Any]]] = []
-        for path in candidate_paths:
-            review = run_reviewer(path, structure_spec=structure_spec)
-            scored.append((path, review))
-
-        def total_score(r: Dict[str, Any]) -> float:
-            return (
-                    float(r.get("clarity_score", 0)) +
-                    float(r.get("aesthetic_score", 0)) +
-                    float(r.get("recognizability_score", 0)) -
-                    0.5 * float(r.get("structure_penalty", 0))
-            )
-
-        best_path, round_best_review = max(scored, key=lambda x: total_score(x[1]))
+        replay = done_rounds.get(round_id)
+        if replay and replay.get("style_json") == style_json:
+            print("↩️ 本轮候选与评审从日志恢复")
+            scored = [(c["png"], c["review"]) for c in replay["candidates"]]
+            screens = {c["png"]: c.get("prescreen") for c in replay["candidates"]}
+        else:
+            # 最后一轮的生成/评审优先于前面的探索性采样
+            phase = "final" if round_id == max_rounds else "exploratory"
+            with tracing.span(f"round.{round_id}", cat="round"), request_priority(phase=phase):
+                scored, early_pass, screens = _generate_and_review(
+                    outline_path=outline_path,
+                    style_json=style_json,
+                    user_text=user_text,
+                    structure_spec=structure_spec,
+                )
+            if scored:
+                journal.append("round", {
+                    "round": round_id,
+                    "style_json": style_json,
+                    "candidates": [{"png": p, "review": r, "prescreen": screens.get(p)} for (p, r) in scored],
+                }, refs={"png": [p for p, _ in scored]})
+
+            if not scored:
+                print("⚠️ 本轮未生成候选图片，终止循环。")
+                break
+            if early_pass:
+                print("⚡ 已有候选达标，取消本轮剩余的生成/评审。")
+
+        # 有达标候选时只在达标者里挑总分最高的
+        passing = [x for x in scored if pass_threshold(x[1])]
+        best_path, round_best_review = max(passing or scored, key=lambda x: total_score(x[1]))
         print("⭐ 本轮最佳:", best_path)
         print("   分数:", {k: round_best_review.get(k) for k in
                            ["clarity_score", "aesthetic_score", "recognizability_score", "structure_penalty"]})
 
         history.append({
             "round": round_id,
-            "candidates": [{"png": p, "review": r} for (p, r) in scored],
+            "candidates": [{"png": p, "review": r, "prescreen": screens.get(p)} for (p, r) in scored],
             "best_png": best_path,
             "best_review": round_best_review,
         })
@@ -247,31 +330,160 @@ def run_micromap_experiment(
 
         if pass_threshold(round_best_review):
             print("✅ 达到目标阈值，提前收敛。")
+            if ek != "unknown":
+                remember_style(memory.get, memory.set, ek, style_json, round_best_review)
             break
 
         if round_id < max_rounds:
-            print("🔁 未达标，调用 refine_designer 调整样式 JSON")
-            style_json = refine_designer(prev_style_json=style_json, review_data=round_best_review,
-                                         structure_spec=structure_spec)
+            if round_id in refined and replay:
+                print("↩️ 精修后的样式 JSON 从日志恢复")
+                style_json = refined[round_id]
+            else:
+                print("🔁 未达标，调用 refine_designer 调整样式 JSON")
+                with tracing.span("stage.refine", cat="stage"):
+                    style_json = refine_designer(prev_style_json=style_json, review_data=round_best_review,
+                                                 structure_spec=structure_spec)
+                journal.append("refine", {"round": round_id, "style_json": style_json})
         else:
             print("⏹ 已到最大轮数，停止迭代。")
 
     # 8. Vectorizer
-    if best_png:
+    rec = journal.last("stage.vectorizer")
+    if rec and rec.payload.get("best_png") == best_png:
+        best_svg = rec.payload["best_svg"]
+        print(f"↩️ 矢量化结果从日志恢复: {best_svg}")
+    elif best_png:
         try:
-            best_svg = png_to_svg(input_png=best_png, out_svg=None, method="auto", threshold=180, simplify_eps=1.0)
+            with tracing.span("stage.vectorizer", cat="stage"):
+                best_svg = png_to_svg(input_png=best_png, out_svg=None, method="auto", threshold=180,
+                                      simplify_eps=1.0)
             print(f"✅ 矢量化完成: {best_svg}")
+            journal.append("stage.vectorizer", {"best_png": best_png, "best_svg": best_svg},
+                           refs={"png": best_png, "svg": best_svg})
         except Exception as e:
             print(f"⚠️ SVG 矢量化失败: {e}")
+    if best_svg and ek != "unknown":
+        record = memory.get(f"style:{ek}", {}) or {}
+        record["latest_svg"] = best_svg
+        memory.set(f"style:{ek}", record)
+    return best_png, best_svg
+
+
+# 产物是文件路径的阶段：journal refs 里登记，文件被清掉时恢复会重跑该阶段
+_PATH_STAGES = {"reference", "extractor"}
+
+
+async def run_micromap_experiment_async(
+        image_path: Optional[str],
+        user_text: str,
+        user_structure_spec: Optional[Union[Dict[str, Any], str]] = None,
+        max_rounds: int = 3,
+        force_entity_type: Optional[str] = None,
+        job_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    job_id: 日志 outputs/journal/{job_id}.jsonl；已存在时回放已完成的阶段，从第一个缺失的阶段继续。
+    """
+    job_id = job_id or new_job_id()
+    journal = Journal(job_id)
+    done = journal.last("job.done")
+    if done:
+        print(f"↩️ 工单 {job_id} 已完成，直接返回日志中的结果")
+        return done.payload
+    if not journal.last("job.start", check_refs=False):
+        journal.append("job.start", {
+            "image_path": image_path,
+            "user_text": user_text,
+            "user_structure_spec": user_structure_spec,
+            "max_rounds": max_rounds,
+            "force_entity_type": force_entity_type,
+        })
+
+    print("\n🚀 启动 Multi-Agent MicroMap-Agent 实验流程")
+    print(f"🧾 工单 job_id: {job_id}")
+    print("📌 文本描述:", user_text)
+    if image_path:
+        print("📷 引用参考图像:", image_path)
+
+    # 1–4. Interpreter / Grounder / Auto-Visual / Detector / Extractor / SpecInfer（按依赖并发）
+    replayed = {m.topic[len("stage."):]: m.payload["result"]
+                for m in journal.records() if m.topic.startswith("stage.") and "result" in m.payload}
+    if replayed:
+        print("↩️ 从日志恢复阶段:", ", ".join(sorted(replayed)))
+
+    def _record(name: str, result: Any):
+        if result is None:
+            return   # 失败/跳过的阶段不记，恢复时重试
+        journal.append(f"stage.{name}", {"result": result},
+                       refs={"path": result} if name in _PATH_STAGES else None)
+
+    with tracing.job_context(job_id):
+        res = await _build_stages(image_path, user_text).run(done=replayed, on_done=_record)
+    schema = res["interpreter"]
+    grounder_spec = res["grounder"]
+    detector_spec = res["detector"]
+    infer_spec = res["spec_infer"]
+    image_path = res["reference"]
+
+    # 5. Merge Specs（顺序固定：grounder → spec_infer → detector → 用户）
+    merged: Dict[str, Any] = {}
+    if grounder_spec: merged = merge_specs(defaults=grounder_spec)
+    if infer_spec: merged = merge_specs(user_spec=merged, detector_spec=infer_spec)
+    if detector_spec: merged = merge_specs(user_spec=merged, detector_spec=detector_spec)
+    if user_structure_spec: merged = merge_specs(user_spec=user_structure_spec, detector_spec=merged)
+
+    structure_spec = normalize_spec(merged or {})
+    if force_entity_type: structure_spec["entity_type"] = force_entity_type
+    is_bridge = _is_bridge(user_text, structure_spec, infer_spec, grounder_spec)
+
+    print("📐 最终结构约束:", structure_spec)
+
+    # 6–8. Designer / Generator Loop / Vectorizer
+    with tracing.job_context(job_id):
+        best_png, best_svg = await asyncio.to_thread(
+            _design_and_iterate, schema, detector_spec, res["extractor"], user_text, structure_spec, max_rounds,
+            journal)
 
     print("\n✅ 实验结束。所有输出已在 Agent/outputs 下生成。")
+    tracing.print_summary(job_id)
+    print("🧭 Chrome trace:", tracing.export_chrome_trace(job_id=job_id))
 
-    return {
+    result = {
+        "job_id": job_id,
         "user_text": user_text,
         "image_path": image_path,
         "best_png": best_png,
         "best_svg": best_svg,
     }
+    journal.append("job.done", result)
+    return result
+
+
+def run_micromap_experiment(
+        image_path: Optional[str],
+        user_text: str,
+        user_structure_spec: Optional[Union[Dict[str, Any], str]] = None,
+        max_rounds: int = 3,
+        force_entity_type: Optional[str] = None,
+        job_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """run_micromap_experiment_async 的同步入口（结束时关闭本次事件循环上的异步客户端）"""
+    return run_sync(run_micromap_experiment_async(
+        image_path=image_path,
+        user_text=user_text,
+        user_structure_spec=user_structure_spec,
+        max_rounds=max_rounds,
+        force_entity_type=force_entity_type,
+        job_id=job_id,
+    ))
+
+
+def resume_micromap_experiment(job_id: str) -> Dict[str, Any]:
+    """按日志里记录的原始参数续跑中断的工单"""
+    start = Journal(job_id).last("job.start", check_refs=False)
+    if start is None:
+        raise FileNotFoundError(f"no journal for job {job_id}")
+    return run_micromap_experiment(**start.payload, job_id=job_id)
 
 
 if __name__ == "__main__":
@@ -9,22 +9,34 @@ SymbolGeneration/Agent/run_experiments.py
 用法：
     cd SymbolGeneration
     # 先配置好 OPENAI_API_KEY
-    python -m Agent.run_experiments
+    python -m Agent.run_experiments                     # 默认 4 条样例并发（同一事件循环）
+    python -m Agent.run_experiments --workers 16 --mode process
+    # 中断后直接重跑即可续跑（RUN_ID 记在 outputs/last_run_id，跨午夜也不变；也可用 EXPERIMENT_RUN_ID 指定）：
+    #   已完成的样例按 outputs/experiment_results_{RUN_ID}.jsonl 跳过，
+    #   未完成的样例从 outputs/journal 回放已完成的阶段
 """
 
 from __future__ import annotations
+import argparse
+import asyncio
 import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, List, Optional
 
-from SymbolGeneration.Agent.agents.generator_agent import run_generator
-from SymbolGeneration.Agent.orchestrator import run_micromap_experiment
+from SymbolGeneration.Agent.agents.clients import run_sync
+from SymbolGeneration.Agent.agents.generator_agent import arun_generator, run_generator, sample_index
+from SymbolGeneration.Agent.agents.rate_limiter import request_priority
+from SymbolGeneration.Agent.orchestrator import run_micromap_experiment_async
 
 BASE_DIR = Path(__file__).resolve().parent
 OUT_DIR = BASE_DIR / "outputs"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 RESULT_PATH = OUT_DIR / "experiment_results.json"
+LAST_RUN_ID_PATH = OUT_DIR / "last_run_id"
 
 # ====== 实验样例（先给你示范几条，按论文需要自行扩展到 20–40 条） ======
 EXPERIMENTS: List[Dict[str, Any]] = [
@@ -65,54 +77,201 @@ def run_baseline(user_text: str) -> str:
     if not candidates:
         raise RuntimeError("Baseline generation failed: no images returned")
     # 如需更严谨，可以在此加 Reviewer 挑最优，这里先取第一张保证流程简单可复现
-    return candidates[0]
+    # （并发生成按完成顺序返回，按样本序号取第一张，否则每次取到的是最先返回的那张）
+    return min(candidates, key=sample_index)
 
-def main():
-    all_results: List[Dict[str, Any]] = []
+async def arun_baseline(user_text: str) -> str:
+    """run_baseline 的协程版"""
+    candidates = await arun_generator(
+        outline_path=None,
+        style_json="{}",
+        user_text=user_text,
+        structure_spec=None,
+        base_image=None,
+        mask_image=None,
+    )
+    if not candidates:
+        raise RuntimeError("Baseline generation failed: no images returned")
+    return min(candidates, key=sample_index)
+
+def results_path(run_id: str) -> Path:
+    """每完成一条样例追加一行；重跑时跳过其中 ok 的 id"""
+    return OUT_DIR / f"experiment_results_{run_id}.jsonl"
+
+def load_results(path: Path) -> Dict[str, Dict[str, Any]]:
+    """按 id 取最后一条记录；中断时写了一半的行忽略"""
+    rows: Dict[str, Dict[str, Any]] = {}
+    if not path.exists():
+        return rows
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            row = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(row, dict) and "id" in row:
+            rows[row["id"]] = row
+    return rows
+
+def append_result(row: Dict[str, Any], path: Path) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def _resolve_run_id() -> str:
+    """
+    EXPERIMENT_RUN_ID 优先；否则沿用 outputs/last_run_id 里还有样例没跑完的那次运行，
+    全部完成了才开新的。只在 main() 里调用一次，结果写回 last_run_id；子进程由参数拿到同一个 run_id。
+    """
+    run_id = os.getenv("EXPERIMENT_RUN_ID")
+    if not run_id and LAST_RUN_ID_PATH.exists():
+        last = LAST_RUN_ID_PATH.read_text(encoding="utf-8").strip()
+        rows = load_results(results_path(last)) if last else {}
+        if last and not all(rows.get(it["id"], {}).get("ok") for it in EXPERIMENTS):
+            run_id = last
+    run_id = run_id or time.strftime("%Y%m%d-%H%M%S")
+    LAST_RUN_ID_PATH.write_text(run_id, encoding="utf-8")
+    return run_id
 
-    for item in EXPERIMENTS:
-        exp_id = item["id"]
-        text = item["text"]
+async def arun_one(item: Dict[str, Any], run_id: str, prev: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    跑一条样例（Baseline + Multi-Agent），返回一行结果（含各阶段耗时，秒）。
+    run_id 决定 Multi-Agent 的 job_id：同一 run_id 下重跑会按 outputs/journal 续跑中断的样例。
+    prev 为上次未完成的记录：Baseline 图片仍在时直接复用；Multi-Agent 由 journal 续跑。
+    """
+    exp_id = item["id"]
+    text = item["text"]
 
-        print("\n" + "=" * 80)
-        print(f"🧪 实验样例: {exp_id}")
-        print(f"说明: {text}")
+    print("\n" + "=" * 80)
+    print(f"🧪 实验样例: {exp_id}")
+    print(f"说明: {text}")
 
-        # 1) Baseline
+    timings: Dict[str, float] = {}
+    errors: Dict[str, str] = {}
+    t0 = time.perf_counter()
+
+    # 1) Baseline
+    baseline_png = (prev or {}).get("baseline_png")
+    if baseline_png and Path(baseline_png).exists():
+        print(f"↩️ [{exp_id}] 复用已有 Baseline: {baseline_png}")
+        # 本次没花时间在 Baseline 上；记 0 而不是缺省，汇总时各行字段一致
+        timings["baseline"] = 0.0
+    else:
         try:
-            baseline_png = run_baseline(text)
-            print(f"✅ Baseline 完成: {baseline_png}")
+            baseline_png = await arun_baseline(text)
+            print(f"✅ [{exp_id}] Baseline 完成: {baseline_png}")
         except Exception as e:
-            print(f"⚠️ Baseline 失败: {e}")
+            print(f"⚠️ [{exp_id}] Baseline 失败: {e}")
             baseline_png = None
+            errors["baseline"] = str(e)
+        timings["baseline"] = round(time.perf_counter() - t0, 3)
 
-        # 2) Multi-Agent 完整框架
-        try:
-            full_res = run_micromap_experiment(
-                image_path=None,
-                user_text=text,
-                user_structure_spec=None,
-                max_rounds=3,
-                force_entity_type=None,
-            )
-            print(f"✅ Multi-Agent 完成: best_png={full_res.get('best_png')}")
-        except Exception as e:
-            print(f"⚠️ Multi-Agent 流程失败: {e}")
-            full_res = None
+    # 2) Multi-Agent 完整框架
+    t1 = time.perf_counter()
+    try:
+        full_res = await run_micromap_experiment_async(
+            image_path=None,
+            user_text=text,
+            user_structure_spec=None,
+            max_rounds=3,
+            force_entity_type=None,
+            job_id=f"exp_{run_id}_{exp_id}",
+        )
+        print(f"✅ [{exp_id}] Multi-Agent 完成: best_png={full_res.get('best_png')}")
+    except Exception as e:
+        print(f"⚠️ [{exp_id}] Multi-Agent 流程失败: {e}")
+        full_res = None
+        errors["multi_agent"] = str(e)
+    timings["multi_agent"] = round(time.perf_counter() - t1, 3)
+    timings["total"] = round(time.perf_counter() - t0, 3)
+
+    return _make_row(item, run_id, baseline_png, full_res, timings, errors)
+
+def _make_row(item: Dict[str, Any], run_id: str, baseline_png: Optional[str], full_res: Optional[Dict[str, Any]],
+              timings: Dict[str, float], errors: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        "id": item["id"],
+        "text": item["text"],
+        "baseline_png": baseline_png,
+        "multi_agent": full_res,
+        "ok": bool(baseline_png) and full_res is not None,
+        "timings": timings,
+        "errors": errors,
+        "run_id": run_id,
+        "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+def _run_one_in_process(item: Dict[str, Any], run_id: str, prev: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # 子进程里没有父进程的 contextvar，重新标记为批量请求
+    with request_priority(origin="batch"):
+        return run_sync(arun_one(item, run_id, prev))
+
+async def _arun_all(items: List[Dict[str, Any]], done: Dict[str, Dict[str, Any]], workers: int, run_id: str,
+                    on_result: Callable[[Dict[str, Any]], None]) -> None:
+    sem = asyncio.Semaphore(workers)
+
+    async def _one(item: Dict[str, Any]):
+        async with sem:
+            try:
+                row = await arun_one(item, run_id, done.get(item["id"]))
+            except Exception as e:
+                row = _make_row(item, run_id, None, None, {}, {"runner": str(e)})
+            on_result(row)
+
+    await asyncio.gather(*(_one(it) for it in items))
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="批量运行 Baseline / Multi-Agent 实验")
+    ap.add_argument("--workers", type=int, default=4, help="同时运行的样例数")
+    ap.add_argument("--mode", choices=("async", "process"), default="async",
+                    help="async: 同一事件循环并发；process: 每条样例一个子进程")
+    ap.add_argument("--rerun", action="store_true", help="忽略已完成记录，全部重跑")
+    args = ap.parse_args(argv)
+    workers = max(1, args.workers)
+
+    run_id = _resolve_run_id()
+    results_jsonl = results_path(run_id)
+    done = {} if args.rerun else load_results(results_jsonl)
+    todo = [it for it in EXPERIMENTS if not done.get(it["id"], {}).get("ok")]
+    skipped = len(EXPERIMENTS) - len(todo)
+    print(f"🧾 RUN_ID={run_id}：共 {len(EXPERIMENTS)} 条，跳过已完成 {skipped} 条，"
+          f"待运行 {len(todo)} 条（{args.mode} × {workers}）")
+
+    finished = 0
+
+    def _record(row: Dict[str, Any]):
+        nonlocal finished
+        append_result(row, results_jsonl)
+        finished += 1
+        status = "✅" if row["ok"] else "⚠️"
+        print(f"{status} [{finished}/{len(todo)}] {row['id']} 用时 {row['timings'].get('total', 0):.1f}s")
 
-        all_results.append({
-            "id": exp_id,
-            "text": text,
-            "baseline_png": baseline_png,
-            "multi_agent": full_res,
-        })
+    t0 = time.perf_counter()
+    if args.mode == "process":
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futs = {pool.submit(_run_one_in_process, it, run_id, done.get(it["id"])): it for it in todo}
+            for fut in as_completed(futs):
+                try:
+                    row = fut.result()
+                except Exception as e:
+                    row = _make_row(futs[fut], run_id, None, None, {}, {"runner": str(e)})
+                _record(row)
+    else:
+        run_sync(_arun_all(todo, done, workers, run_id, _record))
+    wall = time.perf_counter() - t0
 
-    # 写入 JSON，供后续 CLIP / 统计分析使用
+    # 汇总写入 JSON（按 EXPERIMENTS 顺序），供后续 CLIP / 统计分析使用
+    rows = load_results(results_jsonl)
+    all_results = [rows[it["id"]] for it in EXPERIMENTS if it["id"] in rows]
     RESULT_PATH.write_text(
         json.dumps(all_results, ensure_ascii=False, indent=2),
         encoding="utf-8"
     )
-    print("\n✅ 所有实验完成，结果已保存到:", RESULT_PATH)
+    serial = sum(rows[it["id"]]["timings"].get("total", 0) for it in todo if it["id"] in rows)
+    print(f"\n⏱ 本次 {len(todo)} 条：墙钟 {wall:.1f}s，逐条耗时合计 {serial:.1f}s")
+    print("✅ 所有实验完成，结果已保存到:", RESULT_PATH)
 
 if __name__ == "__main__":
-    main()
+    # 批量实验的模型请求让位于交互式任务
+    with request_priority(origin="batch"):
+        main()
@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 import asyncio, uuid
+from typing import Iterable
+from Agent.config import MAX_CONCURRENT_JOBS
+from Agent.core import tracing
 from Agent.core.blackboard import Blackboard
+from Agent.agents.clients import aclose_async_clients
+from Agent.agents.rate_limiter import set_job_origin
 from Agent.core.messages import Msg, TOPICS
 
 # —— 中枢 Agent ——
@@ -18,60 +23,143 @@ from Agent.wrappers.reviewer_workers import StructureReviewer, AestheticReviewer
 from Agent.wrappers.vectorizer_worker import VectorizerWorker
 from Agent.wrappers.detector_worker import DetectorWorker  # 仅在传入 image 时才会用
 
-async def _watch_errors(bb: Blackboard):
-    async for e in bb.subscribe(TOPICS["ERROR"]):
-        print("\n[PIPELINE.ERROR]", e.payload.get("err"))
-        tr = e.payload.get("trace", "")
-        if tr:
-            print(tr[:2000])
+# 这些 Agent 出错不致命（Planner 对 Detector 结果是可选等待）
+OPTIONAL_SENDERS = {"DetectorWorker"}
 
-async def _run_job(user_text: str, image_path: str | None = None, rounds: int = 3):
-    bb = Blackboard()
-
-    # 启动所有 Agent（并发）
-    agents = [
-        PlannerAgent(bb, max_rounds=rounds),
-        ArbiterAgent(bb),
-        MemoryAgent(bb),
-
-        GrounderWorker(bb),
-        SpecInferWorker(bb),
-        MergeWorker(bb),
-        DesignerWorker(bb),
-        GeneratorWorker(bb),
-        StructureReviewer(bb),
-        AestheticReviewer(bb),
-        VectorizerWorker(bb),
-    ]
-    # 仅当提供了图片时才启用 DetectorWorker
-    if image_path:
-        agents.append(DetectorWorker(bb))
-
-    tasks = [asyncio.create_task(a.start()) for a in agents]
-    tasks.append(asyncio.create_task(_watch_errors(bb)))
-
-    # 发起一条工单
-    job_id = str(uuid.uuid4())
-    payload = {"user_text": user_text}
-    if image_path:
-        payload["image_path"] = image_path
-
-    await bb.publish(Msg(topic=TOPICS["INTENT_REQ"], job_id=job_id, sender="CLI", payload=payload))
-
-    # 等待 DONE（同一个 job_id）
-    async for m in bb.subscribe(TOPICS["DONE"]):
-        if m.job_id == job_id:
-            print("\n✅ DONE")
+class MultiAgentRuntime:
+    """
+    常驻运行时：一套 Blackboard + Agent（及本事件循环上的 AsyncOpenAI / httpx 连接池）服务多条工单。
+    max_jobs 为全局并发上限，超出的工单排队等待。
+
+        rt = MultiAgentRuntime(rounds=3, max_jobs=8)
+        await rt.start()
+        fut = rt.submit("兰州中山桥图标")          # -> asyncio.Future[dict]
+        results = await rt.run_batch(["...", ("...", "photo.jpg")])
+        await rt.stop()
+    """
+    def __init__(self, rounds: int = 3, max_jobs: int | None = None):
+        self.bb = Blackboard()
+        self.rounds = rounds
+        self.max_jobs = max_jobs or MAX_CONCURRENT_JOBS
+        self._slots: asyncio.Semaphore | None = None
+        self._pending: dict[str, asyncio.Future] = {}    # job_id -> DONE future
+        self._tasks: list[asyncio.Task] = []
+
+        self.agents = [
+            PlannerAgent(self.bb, max_rounds=rounds),
+            ArbiterAgent(self.bb),
+            MemoryAgent(self.bb),
+
+            GrounderWorker(self.bb),
+            SpecInferWorker(self.bb),
+            MergeWorker(self.bb),
+            DesignerWorker(self.bb),
+            GeneratorWorker(self.bb),
+            StructureReviewer(self.bb),
+            AestheticReviewer(self.bb),
+            VectorizerWorker(self.bb),
+            DetectorWorker(self.bb),     # 只有带图的工单才会发 DETECT_REQ
+        ]
+        self._errors = self.bb.subscribe(TOPICS["ERROR"])
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._slots = asyncio.Semaphore(self.max_jobs)
+        self._tasks = [asyncio.create_task(a.start()) for a in self.agents]
+        self._tasks.append(asyncio.create_task(self._watch_errors()))
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await aclose_async_clients()
+        if self._tasks and tracing.events():
+            print("🧭 Chrome trace:", tracing.export_chrome_trace())
+        self._tasks = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _watch_errors(self):
+        async for e in self._errors:
+            print("\n[PIPELINE.ERROR]", e.payload.get("err"))
+            tr = e.payload.get("trace", "")
+            if tr:
+                print(tr[:2000])
+            # 非可选 Agent 出错：该工单不会再有 DONE，直接让对应 Future 失败
+            done_f = self._pending.get(e.job_id)
+            if done_f and not done_f.done() and e.sender not in OPTIONAL_SENDERS:
+                done_f.set_exception(RuntimeError(f"[{e.sender}] {e.payload.get('err')}"))
+
+    def submit(self, user_text: str, image_path: str | None = None, rounds: int | None = None,
+               origin: str = "interactive") -> asyncio.Future:
+        """
+        提交一条工单，立即返回 Future；结果为 DONE 的 payload（附 job_id）。
+        origin: interactive | batch，模型请求排队时交互工单优先
+        """
+        if not self._tasks:
+            raise RuntimeError("MultiAgentRuntime not started")
+        return asyncio.ensure_future(self._run_job(user_text, image_path, rounds, origin))
+
+    async def run_batch(self, items: Iterable[str | tuple | dict]) -> list:
+        """
+        批量提交并等待全部完成，结果与输入同序；单条失败返回异常对象而不是中断整批。
+        批量工单按 origin="batch" 排队，让位于交互工单。
+        item 可为 user_text / (user_text, image_path) / {"user_text":..., "image_path":..., "rounds":...}
+        """
+        futs = []
+        for it in items:
+            if isinstance(it, dict):
+                futs.append(self.submit(it["user_text"], it.get("image_path"), it.get("rounds"), origin="batch"))
+            elif isinstance(it, (tuple, list)):
+                futs.append(self.submit(*it, origin="batch"))
+            else:
+                futs.append(self.submit(it, origin="batch"))
+        return await asyncio.gather(*futs, return_exceptions=True)
+
+    async def _run_job(self, user_text: str, image_path: str | None, rounds: int | None,
+                       origin: str = "interactive") -> dict:
+        async with self._slots:
+            job_id = str(uuid.uuid4())
+            payload = {"user_text": user_text, "max_rounds": rounds or self.rounds}
+            if image_path:
+                payload["image_path"] = image_path
+
+            done_f = self.bb.expect(job_id, TOPICS["DONE"])
+            self._pending[job_id] = done_f
+            set_job_origin(job_id, origin)
+            try:
+                await self.bb.publish(Msg(topic=TOPICS["INTENT_REQ"], job_id=job_id, sender="CLI", payload=payload))
+                m = await done_f
+            finally:
+                self._pending.pop(job_id, None)
+                set_job_origin(job_id, None)
+
+            print(f"\n✅ DONE [{job_id[:8]}]")
             print("决策综评：", m.payload.get("review"))
-            break
+            tracing.print_summary(job_id)
+            return {"job_id": job_id, **(m.payload or {})}
+
+async def _run_job(user_text: str, image_path: str | None = None, rounds: int = 3):
+    async with MultiAgentRuntime(rounds=rounds, max_jobs=1) as rt:
+        return await rt.submit(user_text, image_path)
 
-    # 优雅退出
-    for t in tasks:
-        t.cancel()
+async def _run_batch(items, rounds: int = 3, max_jobs: int | None = None):
+    async with MultiAgentRuntime(rounds=rounds, max_jobs=max_jobs) as rt:
+        return await rt.run_batch(items)
 
 def run(user_text: str, image_path: str | None = None, rounds: int = 3):
     """对外同步入口，便于像 orchestrator 一样直接调用"""
-    asyncio.run(_run_job(user_text, image_path, rounds))
+    return asyncio.run(_run_job(user_text, image_path, rounds))
+
+def run_batch(items: Iterable[str | tuple | dict], rounds: int = 3, max_jobs: int | None = None) -> list:
+    """同步批量入口：共享一套 Agent 并发处理多条工单"""
+    return asyncio.run(_run_batch(items, rounds, max_jobs))
 
 if __name__ == "__main__":
     # ===== 像 orchestrator.py 一样在这里改默认参数 =====
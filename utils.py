@@ -1,5 +1,5 @@
 # utils.py（替换）
-import os, time, json, re
+import importlib, os, time, json, re
 from pathlib import Path
 
 # 把输出目录固定为 utils.py 所在目录下的 outputs/
@@ -21,6 +21,26 @@ def save_json(agent_name, data):
         json.dump(data, f, indent=2, ensure_ascii=False)
     print(f"✅ [{agent_name}] JSON结果已保存到 {path}")
 
+class lazy_module:
+    """
+    延迟导入：cv2 = lazy_module("cv2") 在第一次访问属性时才真正 import，
+    让不做矢量化/图像处理的命令行调用不必为 cv2/numpy 付启动时间。
+    """
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_mod"] = None
+
+    def __getattr__(self, attr):
+        mod = self.__dict__["_mod"]
+        if mod is None:
+            mod = self.__dict__["_mod"] = importlib.import_module(self.__dict__["_name"])
+        value = getattr(mod, attr)
+        self.__dict__[attr] = value   # 之后直接命中实例属性
+        return value
+
+    def __repr__(self):
+        return f"<lazy module {self.__dict__['_name']!r}>"
+
 def extract_json(text: str):
     if not text:
         return {}
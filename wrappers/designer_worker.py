@@ -1,19 +1,20 @@
 from ..core.agent_base import Agent
 from ..core.messages import Msg, TOPICS
-from ..agents.designer_agent import run_designer, refine_designer
+from ..agents.designer_agent import arun_designer, arefine_designer
 
 class DesignerWorker(Agent):
-    def __init__(self, bb):
-        super().__init__("DesignerWorker", bb, [TOPICS["DESIGN_REQ"], TOPICS["REFINE_REQ"]])
+    def __init__(self, bb, concurrency=None):
+        super().__init__("DesignerWorker", bb, [TOPICS["DESIGN_REQ"], TOPICS["REFINE_REQ"]],
+                         concurrency=concurrency)
 
     async def handle(self, msg: Msg):
         if msg.topic == TOPICS["DESIGN_REQ"]:
-            sj = run_designer(
+            sj = await arun_designer(
                 landmark_json=msg.payload.get("detector_spec","{}"),
                 schema=msg.payload.get("schema","{}"),
                 structure_spec=msg.payload.get("structure_spec"))
         else:
-            sj = refine_designer(
+            sj = await arefine_designer(
                 prev_style_json=msg.payload["prev_style_json"],
                 review_data=msg.payload["review_json"],
                 structure_spec=msg.payload.get("structure_spec"))
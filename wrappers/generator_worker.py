@@ -1,27 +1,44 @@
+import asyncio
+
 from ..core.agent_base import Agent
 from ..core.messages import Msg, TOPICS
-from ..agents.generator_agent import run_generator
-from ..agents.reviewer_agent import run_reviewer  # 新增：用它快速预评
+from ..agents.generator_agent import arun_generator
+from ..agents.reviewer_agent import arun_reviewer_batch  # 新增：用它快速预评
+from ..agents.prescreen_agent import prescreen_candidates
+from ..agents.rate_limiter import request_priority
+from ..config import PRESCREEN
 
 class GeneratorWorker(Agent):
-    def __init__(self, bb):
-        super().__init__("GeneratorWorker", bb, [TOPICS["GEN_REQ"]])
+    def __init__(self, bb, concurrency=None):
+        super().__init__("GeneratorWorker", bb, [TOPICS["GEN_REQ"]], concurrency=concurrency)
 
     async def handle(self, msg: Msg):
         spec = msg.payload["structure_spec"]
-        paths = run_generator(
-            outline_path=msg.payload.get("outline_path"),
-            style_json=msg.payload["style_json"],
-            user_text=msg.payload.get("user_text",""),
-            structure_spec=spec,
-            base_image=msg.payload.get("base_image"),
-            mask_image=msg.payload.get("mask_image"),
-        )
+        # phase 由 Planner 给出（最后一轮为 final），经 contextvar 传到限流器
+        with request_priority(phase=msg.payload.get("phase")):
+            paths = await arun_generator(
+                outline_path=msg.payload.get("outline_path"),
+                style_json=msg.payload["style_json"],
+                user_text=msg.payload.get("user_text",""),
+                structure_spec=spec,
+                base_image=msg.payload.get("base_image"),
+                mask_image=msg.payload.get("mask_image"),
+            )
+
+        # —— 本地预筛：只把前 top_k 个可用候选送视觉模型 —— #
+        screens = {}
+        to_review = paths
+        if PRESCREEN["enabled"]:
+            # 本地图像打分是 CPU 活，放到线程里
+            ranked = await asyncio.to_thread(prescreen_candidates, paths)
+            screens = dict(ranked)
+            to_review = [p for p, _ in ranked]
 
         # —— 新增：对所有候选做一次快速结构感知打分，选最优 —— #
+        # 多张候选合并成一次视觉请求
+        reviews = await arun_reviewer_batch(to_review, structure_spec=spec)
         scored = []
-        for p in paths:
-            r = run_reviewer(p, structure_spec=spec)
+        for p, r in zip(to_review, reviews):
             score = (r.get("clarity_score",0)
                      + r.get("aesthetic_score",0)
                      + r.get("recognizability_score",0)
@@ -34,6 +51,7 @@ class GeneratorWorker(Agent):
             payload={
                 "candidates": paths,
                 "best_png": best_path,        # ← 不再是 paths[0]，而是模型评出来“最好”的
-                "best_review": best_review
+                "best_review": best_review,
+                "prescreen": screens
             }
         ))
@@ -1,12 +1,21 @@
 from ..core.agent_base import Agent
 from ..core.messages import Msg, TOPICS
-from ..agents.grounder_agent import ground_entity_to_spec
+from ..agents.grounder_agent import aground_entity_to_spec
+from ..agents.interpreter_agent import arun_interpreter, landmark_name
 
 class GrounderWorker(Agent):
-    def __init__(self, bb):
-        super().__init__("GrounderWorker", bb, [TOPICS["GROUND_REQ"]])
+    def __init__(self, bb, concurrency=None):
+        super().__init__("GrounderWorker", bb, [TOPICS["GROUND_REQ"]], concurrency=concurrency)
 
     async def handle(self, msg: Msg):
-        spec = ground_entity_to_spec(msg.payload["user_text"])
+        user_text = msg.payload["user_text"]
+        # 同 orchestrator：先由 Interpreter 提取精准地标名，地名库和检索都优先用它
+        search_focus = msg.payload.get("search_focus")
+        if not search_focus:
+            try:
+                search_focus = landmark_name(await arun_interpreter(user_text))
+            except Exception as e:
+                print(f"⚠️ [GrounderWorker] 提取地标名失败，按原句检索: {e}")
+        spec = await aground_entity_to_spec(user_text, search_focus=search_focus)
         await self.bb.publish(Msg(topic=TOPICS["GROUND_RES"], job_id=msg.job_id,
                                   sender=self.name, payload={"grounded": spec}))
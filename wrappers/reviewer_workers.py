@@ -1,21 +1,26 @@
 from ..core.messages import Msg, TOPICS
 from ..core.agent_base import Agent
-from ..agents.reviewer_agent import run_reviewer
+from ..agents.reviewer_agent import arun_reviewer
+
+# 两位审稿人各用自己的提示词（kind="structure" / "aesthetic"），给 Arbiter 两路独立的评分；
+# 结果缓存按 kind 区分，同一张图每位审稿人只请求一次视觉模型
 
 class StructureReviewer(Agent):
-    def __init__(self, bb):
-        super().__init__("StructureReviewer", bb, [TOPICS["REVIEW_STRUCT_REQ"]])
+    def __init__(self, bb, concurrency=None):
+        super().__init__("StructureReviewer", bb, [TOPICS["REVIEW_STRUCT_REQ"]],
+                         concurrency=concurrency)
 
     async def handle(self, msg: Msg):
-        r = run_reviewer(msg.payload["image_path"], msg.payload.get("structure_spec"))
+        r = await arun_reviewer(msg.payload["image_path"], msg.payload.get("structure_spec"), kind="structure")
         await self.bb.publish(Msg(topic=TOPICS["REVIEW_RES"], job_id=msg.job_id,
                                   sender=self.name, payload={"kind":"structure","result": r}))
 
 class AestheticReviewer(Agent):
-    def __init__(self, bb):
-        super().__init__("AestheticReviewer", bb, [TOPICS["REVIEW_AESTH_REQ"]])
+    def __init__(self, bb, concurrency=None):
+        super().__init__("AestheticReviewer", bb, [TOPICS["REVIEW_AESTH_REQ"]],
+                         concurrency=concurrency)
 
     async def handle(self, msg: Msg):
-        r = run_reviewer(msg.payload["image_path"], msg.payload.get("structure_spec"))
+        r = await arun_reviewer(msg.payload["image_path"], msg.payload.get("structure_spec"), kind="aesthetic")
         await self.bb.publish(Msg(topic=TOPICS["REVIEW_RES"], job_id=msg.job_id,
                                   sender=self.name, payload={"kind":"aesthetic","result": r}))
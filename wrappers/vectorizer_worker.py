@@ -3,11 +3,13 @@ from ..core.messages import Msg, TOPICS
 from ..agents.vectorizer_agent import png_to_svg
 
 class VectorizerWorker(Agent):
-    def __init__(self, bb):
-        super().__init__("VectorizerWorker", bb, [TOPICS["VECTOR_REQ"]])
+    def __init__(self, bb, concurrency=None):
+        super().__init__("VectorizerWorker", bb, [TOPICS["VECTOR_REQ"]],
+                         execution="process", concurrency=concurrency)
 
     async def handle(self, msg: Msg):
-        svg = png_to_svg(
+        svg = await self.run_blocking(
+            png_to_svg,
             input_png=msg.payload["png_path"],
             out_svg=msg.payload.get("out_svg"),
             method=msg.payload.get("method","auto"),